@@ -0,0 +1,201 @@
+import asyncio
+
+import botocore
+
+from scaling_policy import ScalingState
+from utilities.clock import get_clock
+from utilities.registration import (
+    EXPIRED, REGISTERED, REGISTRATION_TIMEOUT, RegistrationJob, registration_slots
+)
+
+POLL_INTERVAL = 1
+
+
+class AsyncScalingController:
+    """
+    asyncio version of the horizontal scaling control loop.
+
+    Monitoring, the scaling decision, instance launches and LG registration
+    run as separate tasks connected by queues:
+
+        monitor --samples--> decider --launches--> launcher(s)
+                                                       |
+                                                       v
+                                    registrar <--booted instances--
+
+    The monitor keeps polling the log while instances boot. As in the
+    sequential loop, the policy is only asked for a batch once the cooldown
+    the LG enforces between two registrations has passed, so both loops
+    make the same decisions, and a batch is never larger than the number of
+    registrations the LG accepts while it boots. Up to max_in_flight batches
+    can be booting or registering at the same time.
+    """
+
+    def __init__(self, launch_fn, lg_client, log_tail, is_complete_fn, policy,
+                 cooldown, max_in_flight,
+                 registration_timeout=REGISTRATION_TIMEOUT):
+        """
+        :param launch_fn: blocking function launching a batch of `count` WS
+            instances and returning the running ones
+        :param lg_client: LGClient of the load generator
+        :param log_tail: LogTail following the test log
+        :param is_complete_fn: blocking function polling the log tail
+        :param policy: ScalingPolicy deciding the size of each batch
+        :param cooldown: minimum seconds between two scaling decisions
+        :param max_in_flight: maximum number of batches booting or registering
+        :param registration_timeout: seconds after which a WS the LG keeps
+            rejecting is given up on
+        """
+        self.launch_fn = launch_fn
+        self.lg_client = lg_client
+        self.log_tail = log_tail
+        self.is_complete_fn = is_complete_fn
+        self.policy = policy
+        self.cooldown = cooldown
+        self.max_in_flight = max_in_flight
+        self.registration_timeout = registration_timeout
+
+        self.instances = []
+        self.registered = 1
+        self.pending = 0
+        self.batches_in_flight = 0
+        self.launches_blocked = False
+        # Seconds the last batch took to run, 0 until one was launched
+        self.boot_time = 0.0
+        self.next_slot = None
+        self.finished = None
+        self.samples = None
+        self.launches = None
+        self.booted = None
+        self.launch_tasks = set()
+        self.error = None
+
+    async def run(self, last_registration_wall_time):
+        """
+        Drive the test until the LG reports it finished
+        :param last_registration_wall_time: clock time of the last WS registration
+        :return: every WS instance launched by the controller
+        """
+        clock = get_clock()
+        # Work on the monotonic clock so that the cooldown does not drift
+        last_registration = clock.monotonic() - (clock.time() - last_registration_wall_time)
+        self.next_slot = last_registration + self.cooldown
+        self.finished = asyncio.Event()
+        self.samples = asyncio.Queue()
+        self.launches = asyncio.Queue()
+        self.booted = asyncio.Queue()
+
+        workers = [
+            asyncio.create_task(self.monitor()),
+            asyncio.create_task(self.decider()),
+            asyncio.create_task(self.launcher()),
+            asyncio.create_task(self.registrar())
+        ]
+        await self.finished.wait()
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        # Launches cannot be interrupted half way; wait for them so that
+        # every instance is known and can be terminated by the caller
+        await asyncio.gather(*self.launch_tasks, return_exceptions=True)
+        if self.error is not None:
+            raise self.error
+        return self.instances
+
+    async def monitor(self):
+        while True:
+            complete = await get_clock().to_thread(self.is_complete_fn, self.log_tail)
+            if complete:
+                self.finished.set()
+                return
+            await self.samples.put(self.log_tail.rps)
+            await get_clock().async_sleep(POLL_INTERVAL)
+
+    async def decider(self):
+        clock = get_clock()
+        while True:
+            await self.samples.get()
+            if self.launches_blocked or self.batches_in_flight >= self.max_in_flight:
+                continue
+            # Decide only once the cooldown has passed, as the sequential loop does
+            if clock.monotonic() < self.next_slot:
+                continue
+            state = ScalingState(
+                self.log_tail.minute,
+                self.log_tail.rps,
+                self.log_tail.instance_rps,
+                self.registered,
+                self.pending,
+                registration_slots(self.boot_time, self.cooldown)
+            )
+            count = self.policy.decide(state)
+            if count <= 0:
+                continue
+            print(f"Current RPS: {state.rps:.2f} < {self.policy.target_rps}. "
+                  f"Launching {count} new WS...")
+            self.next_slot = clock.monotonic() + self.cooldown
+            self.pending += count
+            self.batches_in_flight += 1
+            await self.launches.put(count)
+
+    async def launcher(self):
+        while True:
+            count = await self.launches.get()
+            task = asyncio.create_task(self.launch_batch(count))
+            self.launch_tasks.add(task)
+            task.add_done_callback(self.launch_tasks.discard)
+
+    async def launch_batch(self, count):
+        instances = []
+        clock = get_clock()
+        try:
+            launch_start = clock.monotonic()
+            instances = await clock.to_thread(self.launch_fn, count)
+            self.boot_time = clock.monotonic() - launch_start
+        except botocore.exceptions.ClientError as e:
+            if 'VcpuLimitExceeded' in str(e):
+                print("WARNING: vCPU limit reached. Cannot add more instances.")
+                self.launches_blocked = True
+            else:
+                print(f"WARNING: launching {count} WS failed: {e}")
+        except botocore.exceptions.WaiterError as e:
+            print(f"WARNING: {count} WS did not reach running: {e}")
+        except Exception as e:
+            # Not an AWS failure: stop the loop and raise it from run()
+            self.error = e
+            self.finished.set()
+        finally:
+            self.batches_in_flight -= 1
+            # Instances not started, or not running, are no longer on the way
+            self.pending -= count - len(instances)
+        if not instances:
+            return
+        self.instances.extend(instances)
+        for instance in instances:
+            print("New WS launched. id={}, dns={}".format(
+                instance.instance_id, instance.public_dns_name))
+        await self.booted.put(instances)
+
+    async def registrar(self):
+        while True:
+            instances = await self.booted.get()
+            # The instances of a batch are registered concurrently
+            await asyncio.gather(*(self.register(instance) for instance in instances))
+
+    async def register(self, instance):
+        # The job stops by itself once the monitor sees the test finished
+        job = RegistrationJob(self.lg_client, instance, self.log_tail,
+                              self.registration_timeout)
+        state = await get_clock().to_thread(job.run)
+        self.pending -= 1
+        if state == REGISTERED:
+            self.registered += 1
+            # The cooldown runs from the last registration, as in the sequential loop
+            clock = get_clock()
+            self.next_slot = max(self.next_slot,
+                                 clock.monotonic() - (clock.time() - job.registered_at)
+                                 + self.cooldown)
+            print(f"New WS submitted to LG. Total WS registered: {self.registered}")
+        elif state == EXPIRED:
+            print(f"WARNING: LG did not accept WS {instance.instance_id} "
+                  f"within {self.registration_timeout} s")
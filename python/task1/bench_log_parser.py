@@ -0,0 +1,111 @@
+import argparse
+import configparser
+import io
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from utilities.log_parser import parse_file, CurrentRps
+
+
+def synthetic_log(minutes, instances):
+    """
+    Build a horizontal scaling log in the MSB format
+    :param minutes: number of [Minute N] blocks
+    :param instances: number of web services reporting every minute
+    :return: log text
+    """
+    rng = random.Random(0)
+    hosts = ['ec2-10-0-{}-{}.compute-1.amazonaws.com'.format(i // 250, i % 250)
+             for i in range(instances)]
+    out = io.StringIO()
+    out.write('; 2025-09-08T16:43:50+00:00\n'
+              '; Horizontal Scaling Test\n'
+              '[Test]\n'
+              'type=horizontal\n'
+              'testId=1757349830540\n'
+              'testFile=test.1757349830540.log\n'
+              'startTime=2025-09-08T16:43:50+00:00\n\n')
+    for minute in range(1, minutes + 1):
+        out.write('[Minute {}]\n'.format(minute))
+        total = 0.0
+        for host in hosts:
+            rps = rng.uniform(8, 15)
+            total += rps
+            out.write('{}={:.2f}\n'.format(host, rps))
+        out.write('[Current rps={:.2f}]\n\n'.format(total))
+    out.write('[Test End]\nendTime=2025-09-08T16:52:53+00:00\n'
+              'rps=65.72\npass=true\n[Test finished]\n')
+    return out.getvalue()
+
+
+def configparser_rps(path):
+    """
+    The original get_rps() implementation, which holds the whole log
+    """
+    with open(path) as f:
+        text = f.read()
+    config = configparser.ConfigParser(strict=False)
+    config.read_string(text)
+    sections = config.sections()
+    sections.reverse()
+    rps = 0
+    for sec in sections:
+        if 'Current rps=' in sec:
+            rps = float(sec[len('Current rps='):])
+            break
+    return rps
+
+
+def streaming_rps(path):
+    rps = 0
+    for event in parse_file(path):
+        if isinstance(event, CurrentRps):
+            rps = event.rps
+    return rps
+
+
+def measure(fn, path, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(path)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    fn(path)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, best, peak
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(
+        description='Compare configparser with the streaming log parser')
+    arg_parser.add_argument('--minutes', type=int, nargs='+',
+                            default=[30, 300, 3000])
+    arg_parser.add_argument('--instances', type=int, default=10)
+    arg_parser.add_argument('--repeat', type=int, default=5)
+    args = arg_parser.parse_args()
+
+    print('{:>8} {:>10} {:>14} {:>14} {:>9} {:>12} {:>12}'.format(
+        'minutes', 'size KiB', 'configparser', 'streaming', 'speedup',
+        'cp peak KiB', 'st peak KiB'))
+    for minutes in args.minutes:
+        text = synthetic_log(minutes, args.instances)
+        with tempfile.NamedTemporaryFile('w', suffix='.log', delete=False) as f:
+            f.write(text)
+        try:
+            cp_rps, cp_time, cp_peak = measure(configparser_rps, f.name, args.repeat)
+            st_rps, st_time, st_peak = measure(streaming_rps, f.name, args.repeat)
+        finally:
+            os.remove(f.name)
+        assert cp_rps == st_rps, (cp_rps, st_rps)
+        print('{:>8} {:>10.0f} {:>12.1f}ms {:>12.1f}ms {:>8.1f}x {:>12.0f} {:>12.0f}'.format(
+            minutes, len(text) / 1024, cp_time * 1000, st_time * 1000,
+            cp_time / st_time, cp_peak / 1024, st_peak / 1024))
+
+
+if __name__ == '__main__':
+    main()
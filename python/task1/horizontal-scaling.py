@@ -1,14 +1,21 @@
 
-import boto3
 import botocore
 import requests
-import time
 import json
-import configparser
 import re
-from datetime import datetime
 from dateutil.parser import parse
 
+from async_controller import AsyncScalingController
+from scaling_policy import ScalingState, build_policy
+from utilities import aws, tracing
+from utilities.clock import ScaledClock, get_clock, set_clock
+from utilities.lg_client import LGClient
+from utilities.log_mirror import LogMirror
+from utilities.log_tail import LogTail
+from utilities.provisioning import Provisioner
+from utilities.registration import EXPIRED, REGISTERED, Registrar, registration_slots
+from utilities.warm_pool import WarmPool
+
 
 ########################################
 # Constants
@@ -19,6 +26,26 @@ with open('horizontal-scaling-config.json') as file:
 LOAD_GENERATOR_AMI = configuration['load_generator_ami']
 WEB_SERVICE_AMI = configuration['web_service_ami']
 INSTANCE_TYPE = configuration['instance_type']
+ASYNC_CONTROLLER = configuration['async_controller']
+MAX_LAUNCHES_IN_FLIGHT = configuration['max_launches_in_flight']
+SCALING_POLICY = configuration['scaling_policy']
+# Seconds after which a WS the LG keeps rejecting is given up on; the LG
+# accepts one WS per LAUNCH_COOLDOWN, so it must cover a whole batch
+REGISTRATION_TIMEOUT = configuration['registration_timeout']
+# Stopped, pre-booted WS kept ready for scale-outs, 0 to always cold launch
+WARM_POOL_SIZE = configuration['warm_pool_size']
+# Run the controller this many times faster than real time (offline runs)
+CLOCK_SPEEDUP = configuration['clock_speedup']
+# Seconds between two fsyncs of the local log mirror
+LOG_FSYNC_INTERVAL = configuration['log_fsync_interval']
+# "binary" or "parquet" to write the parsed samples next to the mirror, null for none
+LOG_SIDECAR = configuration['log_sidecar']
+# JSONL file the phase/call trace is exported to at exit, null to skip
+TRACE_FILE = configuration['trace_file']
+
+# Test rules enforced by the load generator
+TARGET_RPS = 50
+LAUNCH_COOLDOWN = 100
 
 ########################################
 # Tags
@@ -35,6 +62,7 @@ TEST_NAME_REGEX = r'name=(.*log)'
 ########################################
 
 
+@tracing.traced()
 def create_instance(ami, sg_id):
     """
     Given AMI, create and return an AWS EC2 instance object
@@ -42,65 +70,192 @@ def create_instance(ami, sg_id):
     :param sg_id: ID of the security group to be attached to instance
     :return: instance object
     """
-    ec2 = boto3.resource('ec2', region_name='us-east-1')
-    
-    # Get default subnet for availability zone
-    ec2_client = boto3.client('ec2', region_name='us-east-1')
-    subnets = ec2_client.describe_subnets(
-        Filters=[{'Name': 'default-for-az', 'Values': ['true']}]
-    )
-    subnet_id = subnets['Subnets'][0]['SubnetId']
-    
-    # Launch instance
-    instances = ec2.create_instances(
-        ImageId=ami,
-        InstanceType=INSTANCE_TYPE,
-        SecurityGroupIds=[sg_id],
-        SubnetId=subnet_id,
-        MaxCount=1,
-        MinCount=1,
-        TagSpecifications=[
-            {
-                'ResourceType': 'instance',
-                'Tags': TAGS
-            },
-            {
-                'ResourceType': 'volume',
-                'Tags': TAGS
-            },
-            {
-                'ResourceType': 'network-interface',
-                'Tags': TAGS
-            }
-        ]
-    )
-    instance = instances[0]
-    
-    # Wait for instance to be running
-    instance.wait_until_running()
-    instance.reload()
-    
-    return instance
+    return create_instances(ami, sg_id, 1)[0]
+
+
+class AwsEc2:
+    """
+    EC2 calls the script makes. simulate.py installs a stand-in with the
+    same methods backed by the LG simulator.
+    """
+
+    def create_security_group(self, name, description):
+        """
+        Create a security group allowing HTTP in, or reuse the existing one
+        :param name: group name
+        :param description: group description
+        :return: security group id
+        """
+        ec2_client = aws.get_client('ec2')
+        try:
+            response = ec2_client.create_security_group(
+                GroupName=name,
+                Description=description,
+                VpcId=aws.default_vpc_id(),
+                TagSpecifications=[{'ResourceType': 'security-group', 'Tags': TAGS}]
+            )
+            sg_id = response['GroupId']
+            # Add HTTP ingress rule (port 80 incoming traffic)
+            ec2_client.authorize_security_group_ingress(
+                GroupId=sg_id,
+                IpPermissions=[{
+                    'IpProtocol': 'tcp',
+                    'FromPort': 80,
+                    'ToPort': 80,
+                    'IpRanges': [{'CidrIp': '0.0.0.0/0'}]
+                }]
+            )
+            # Note: AWS automatically allows all outbound traffic by default
+            print(f"Created {name}: {sg_id}")
+            return sg_id
+        except botocore.exceptions.ClientError as e:
+            if e.response['Error']['Code'] == 'InvalidGroup.Duplicate':
+                sg_id = aws.security_group_id(name)
+                print(f"Using existing {name}: {sg_id}")
+                return sg_id
+            raise e
+
+    def create_instances(self, ami, sg_id, count):
+        """
+        Launch up to `count` instances in one create_instances call and wait
+        for all of them with one waiter
+        :param ami: AMI image name to launch the instances with
+        :param sg_id: ID of the security group to be attached to the instances
+        :param count: number of instances wanted
+        :return: list of running instance objects, possibly fewer than count
+        """
+        ec2 = aws.get_resource('ec2')
+
+        # Get default subnet for availability zone
+        subnet_id = aws.default_subnet_id()
+
+        # Launch instances; MinCount=1 lets EC2 start part of the batch when
+        # it cannot start all of it
+        instances = ec2.create_instances(
+            ImageId=ami,
+            InstanceType=INSTANCE_TYPE,
+            SecurityGroupIds=[sg_id],
+            SubnetId=subnet_id,
+            MaxCount=count,
+            MinCount=1,
+            TagSpecifications=[
+                {
+                    'ResourceType': 'instance',
+                    'Tags': TAGS
+                },
+                {
+                    'ResourceType': 'volume',
+                    'Tags': TAGS
+                },
+                {
+                    'ResourceType': 'network-interface',
+                    'Tags': TAGS
+                }
+            ]
+        )
+        instance_ids = [instance.instance_id for instance in instances]
+
+        # Wait for the whole batch to be running with one polling loop
+        try:
+            aws.wait_for(aws.get_client('ec2'), 'instance_running', InstanceIds=instance_ids)
+        except botocore.exceptions.WaiterError:
+            for instance in instances:
+                instance.terminate()
+            raise
+
+        # One describe_instances call loads the DNS names of the batch
+        running = {instance.instance_id: instance
+                   for instance in ec2.instances.filter(InstanceIds=instance_ids)}
+        return [running[instance_id] for instance_id in instance_ids]
+
+    def stop_instances(self, instances):
+        """
+        Stop running instances with one stop_instances call and one waiter
+        :param instances: running instance objects
+        :return: None
+        """
+        instance_ids = [instance.instance_id for instance in instances]
+        ec2_client = aws.get_client('ec2')
+        ec2_client.stop_instances(InstanceIds=instance_ids)
+        aws.wait_for(ec2_client, 'instance_stopped', InstanceIds=instance_ids)
+
+    def start_instances(self, instances):
+        """
+        Start stopped instances with one start_instances call and one waiter
+        :param instances: stopped instance objects
+        :return: list of running instance objects
+        """
+        instance_ids = [instance.instance_id for instance in instances]
+        ec2_client = aws.get_client('ec2')
+        ec2_client.start_instances(InstanceIds=instance_ids)
+        aws.wait_for(ec2_client, 'instance_running', InstanceIds=instance_ids)
+        running = {instance.instance_id: instance
+                   for instance in aws.get_resource('ec2').instances.filter(
+                       InstanceIds=instance_ids)}
+        return [running[instance_id] for instance_id in instance_ids]
+
+
+# Backend of the instance functions below
+EC2_BACKEND = AwsEc2()
+
+
+@tracing.traced()
+def create_instances(ami, sg_id, count):
+    """
+    Launch up to `count` instances in one call and wait for all of them, so
+    a batch costs one API round-trip and one boot time
+    :param ami: AMI image name to launch the instances with
+    :param sg_id: ID of the security group to be attached to the instances
+    :param count: number of instances wanted
+    :return: list of running instance objects, possibly fewer than count
+    """
+    return EC2_BACKEND.create_instances(ami, sg_id, count)
+
+
+@tracing.traced()
+def stop_instances(instances):
+    """
+    Stop running instances and wait until they are stopped
+    :param instances: running instance objects
+    :return: None
+    """
+    EC2_BACKEND.stop_instances(instances)
+
+
+@tracing.traced()
+def start_instances(instances):
+    """
+    Start stopped instances and wait until they are running
+    :param instances: stopped instance objects
+    :return: list of running instance objects; their public DNS names
+        change on every start
+    """
+    return EC2_BACKEND.start_instances(instances)
+
+
+def launch_web_services(sg2_id, count, warm_pool=None):
+    """
+    Get `count` running WS instances, from the warm pool first
+    :param sg2_id: id of WS security group
+    :param count: number of instances wanted
+    :param warm_pool: WarmPool to take instances from, None to always cold launch
+    :return: list of running instance objects
+    """
+    instances = warm_pool.take(count) if warm_pool else []
+    if len(instances) < count:
+        instances += create_instances(WEB_SERVICE_AMI, sg2_id, count - len(instances))
+    return instances
 
 
-def initialize_test(lg_dns, first_web_service_dns):
+@tracing.traced()
+def initialize_test(lg_client, first_web_service_dns):
     """
     Start the horizontal scaling test
-    :param lg_dns: Load Generator DNS
+    :param lg_client: LGClient of the Load Generator
     :param first_web_service_dns: Web service DNS
     :return: Log file name
     """
-
-    add_ws_string = 'http://{}/test/horizontal?dns={}'.format(
-        lg_dns, first_web_service_dns
-    )
-    response = None
-    while not response or response.status_code != 200:
-        try:
-            response = requests.get(add_ws_string)
-        except requests.exceptions.ConnectionError:
-            time.sleep(1)
-            pass 
+    response = lg_client.start_horizontal_test(first_web_service_dns)
 
     # Extract test log name from response
     log_name = get_test_id(response)
@@ -109,11 +264,13 @@ def initialize_test(lg_dns, first_web_service_dns):
 
 def print_section(msg):
     """
-    Print a section separator including given message
+    Print a section separator including given message and start the
+    trace phase of that name
     :param msg: message
     :return: None
     """
     print(('#' * 40) + '\n# ' + msg + '\n' + ('#' * 40))
+    tracing.phase(msg)
 
 
 def get_test_id(response):
@@ -129,89 +286,224 @@ def get_test_id(response):
     return regexpr.findall(response_text)[0]
 
 
-def is_test_complete(lg_dns, log_name):
+def mirror_log(log_tail):
     """
-    Check if the horizontal scaling test has finished
-    :param lg_dns: load generator DNS
-    :param log_name: name of the log file
-    :return: True if Horizontal Scaling test is complete and False otherwise.
+    Keep a local copy of the test log for submission and monitoring
+    :param log_tail: LogTail of the test, before its first poll
+    :return: LogMirror appending to a file named after the log
     """
+    return LogMirror(log_tail.log_name, LOG_FSYNC_INTERVAL,
+                     LOG_SIDECAR).attach(log_tail)
 
-    log_string = 'http://{}/log?name={}'.format(lg_dns, log_name)
 
-    # creates a log file for submission and monitoring
-    f = open(log_name + ".log", "w")
-    log_text = requests.get(log_string).text
-    f.write(log_text)
-    f.close()
+@tracing.traced('poll')
+def is_test_complete(log_tail):
+    """
+    Check if the horizontal scaling test has finished
+    :param log_tail: LogTail following the test log
+    :return: True if Horizontal Scaling test is complete and False otherwise.
+    """
+    try:
+        log_tail.poll()
+    except (requests.exceptions.ConnectionError,
+            requests.exceptions.Timeout,
+            requests.exceptions.HTTPError) as e:
+        # A slow, unreachable or failing LG must not kill the control loop
+        print(f"Log poll failed, retrying next tick: {e}")
+        return log_tail.finished
 
-    return '[Test finished]' in log_text
+    return log_tail.finished
 
 
-def add_web_service_instance(lg_dns, sg2_id, log_name):
+@tracing.traced()
+def add_web_service_instances(lg_client, sg2_id, log_tail, count, warm_pool=None,
+                              registrar=None):
     """
-    Launch a new WS (Web Server) instance and add to the test
-    :param lg_dns: load generator DNS
+    Launch a batch of WS instances together and add them to the test
+    :param lg_client: LGClient of the load generator
     :param sg2_id: id of WS security group
-    :param log_name: name of the log file
-    :return: the created instance object
+    :param log_tail: LogTail following the test log
+    :param count: number of instances to add
+    :param warm_pool: WarmPool to take instances from, None to always cold launch
+    :param registrar: Registrar to register the instances in the background,
+        None to wait for their registration
+    :return: list of the created instance objects
     """
-    ins = create_instance(WEB_SERVICE_AMI, sg2_id)
-    print("New WS launched. id={}, dns={}".format(
-        ins.instance_id,
-        ins.public_dns_name)
-    )
-    add_req = 'http://{}/test/horizontal/add?dns={}'.format(
-        lg_dns,
-        ins.public_dns_name
-    )
-    while True:
-        if requests.get(add_req).status_code == 200:
-            print("New WS submitted to LG.")
-            break
-        elif is_test_complete(lg_dns, log_name):
-            print("New WS not submitted because test already completed.")
-            break
-    return ins
+    instances = launch_web_services(sg2_id, count, warm_pool)
+    for ins in instances:
+        print("New WS launched. id={}, dns={}".format(
+            ins.instance_id,
+            ins.public_dns_name)
+        )
+    if registrar is None:
+        register_web_services(lg_client, instances, log_tail)
+    else:
+        for ins in instances:
+            registrar.submit(ins)
+    return instances
+
+
+@tracing.traced()
+def register_web_services(lg_client, instances, log_tail):
+    """
+    Add running WS instances to the test and wait until each one is
+    registered, expired or the test finished. The registrations run
+    concurrently in the background while this thread keeps the log tail
+    they watch up to date.
+    :param lg_client: LGClient of the load generator
+    :param instances: running WS instance objects
+    :param log_tail: LogTail following the test log
+    :return: list of the instances the LG accepted
+    """
+    registrar = Registrar(lg_client, log_tail, REGISTRATION_TIMEOUT)
+    try:
+        for ins in instances:
+            registrar.submit(ins)
+        while registrar.pending() and not is_test_complete(log_tail):
+            get_clock().sleep(1)
+    finally:
+        registrar.shutdown()
+    jobs = registrar.collect()
+    report_registrations(jobs)
+    return [job.instance for job in jobs if job.state == REGISTERED]
 
 
-def get_rps(lg_dns, log_name):
+def report_registrations(jobs):
+    """
+    Print the outcome of finished registration jobs
+    :param jobs: finished RegistrationJobs
+    :return: None
+    """
+    for job in jobs:
+        if job.state == REGISTERED:
+            print("New WS submitted to LG. id={} after {} attempt(s)".format(
+                job.instance.instance_id, job.attempts))
+        elif job.state == EXPIRED:
+            print("WARNING: LG did not accept WS {} within {} s".format(
+                job.instance.instance_id, REGISTRATION_TIMEOUT))
+        else:
+            print("New WS {} not submitted because test already completed.".format(
+                job.instance.instance_id))
+
+
+def get_rps(log_tail):
     """
     Return the current RPS as a floating point number
-    :param lg_dns: LG DNS
-    :param log_name: name of log file
+    :param log_tail: LogTail following the test log
     :return: latest RPS value
     """
+    return log_tail.rps
 
-    log_string = 'http://{}/log?name={}'.format(lg_dns, log_name)
-    config = configparser.ConfigParser(strict=False)
-    config.read_string(requests.get(log_string).text)
-    sections = config.sections()
-    sections.reverse()
-    rps = 0
-    for sec in sections:
-        if 'Current rps=' in sec:
-            rps = float(sec[len('Current rps='):])
-            break
-    return rps
 
-
-def get_test_start_time(lg_dns, log_name):
+def get_test_start_time(log_tail):
     """
     Return the test start time in UTC
-    :param lg_dns: LG DNS
-    :param log_name: name of log file
+    :param log_tail: LogTail following the test log
     :return: datetime object of the start time in UTC
     """
-    log_string = 'http://{}/log?name={}'.format(lg_dns, log_name)
-    start_time = None
-    while start_time is None:
-        config = configparser.ConfigParser(strict=False)
-        config.read_string(requests.get(log_string).text)
-        # By default, options names in a section are converted
-        # to lower case by configparser
-        start_time = dict(config.items('Test')).get('starttime', None)
-    return parse(start_time)
+    while log_tail.start_time is None:
+        # is_test_complete polls the log, riding out LG errors
+        is_test_complete(log_tail)
+        if log_tail.start_time is None:
+            get_clock().sleep(1)
+    return parse(log_tail.start_time)
+
+
+def run_controller(lg_client, log_tail, sg2_id, last_launch_time, all_instances, policy,
+                   warm_pool=None):
+    """
+    Sequential control loop: poll, ask the policy and launch a batch. The
+    batch is registered in the background, so polling goes on while the LG
+    is not accepting it yet
+    :param lg_client: LGClient of the load generator
+    :param log_tail: LogTail following the test log
+    :param sg2_id: id of WS security group
+    :param last_launch_time: datetime of the last WS registration
+    :param all_instances: list every launched instance is appended to
+    :param policy: ScalingPolicy deciding the size of each batch
+    :param warm_pool: WarmPool to take instances from, None to always cold launch
+    :return: None
+    """
+    registrar = Registrar(lg_client, log_tail, REGISTRATION_TIMEOUT)
+    last_launch = last_launch_time.timestamp()
+    # Seconds the last batch took to run, 0 until one was launched so the
+    # first batch is a single WS
+    boot_time = 0.0
+    try:
+        while not is_test_complete(log_tail):
+            # Get current RPS
+            current_rps = get_rps(log_tail)
+            current_time = get_clock().time()
+
+            for job in registrar.collect():
+                report_registrations([job])
+                if job.state == REGISTERED:
+                    last_launch = max(last_launch, job.registered_at)
+
+            # Check if cooldown period has passed (100 seconds)
+            time_since_last_launch = current_time - last_launch
+            if time_since_last_launch >= LAUNCH_COOLDOWN:
+                pending = registrar.pending()
+                state = ScalingState(
+                    log_tail.minute,
+                    current_rps,
+                    log_tail.instance_rps,
+                    len(all_instances) - 1 - pending,
+                    pending,
+                    registration_slots(boot_time, LAUNCH_COOLDOWN)
+                )
+                count = policy.decide(state)
+                if count > 0:
+                    print(f"Current RPS: {current_rps:.2f} < {TARGET_RPS}. Adding {count} new WS instance(s)...")
+                    launch_start = get_clock().monotonic()
+                    try:
+                        new_instances = add_web_service_instances(
+                            lg_client, sg2_id, log_tail, count, warm_pool, registrar)
+                        boot_time = get_clock().monotonic() - launch_start
+                    except botocore.exceptions.ClientError as e:
+                        if 'VcpuLimitExceeded' not in str(e):
+                            raise e
+                        print(f"WARNING: vCPU limit reached. Cannot add more instances.")
+                        print(f"Continuing with current instances. RPS: {current_rps:.2f}")
+                        new_instances = []
+                    all_instances.extend(new_instances)
+                    if new_instances:
+                        last_launch = get_clock().time()
+                        print(f"New WS added. Total instances: {len(all_instances) - 1} WS + 1 LG")
+
+            get_clock().sleep(1)
+    finally:
+        registrar.shutdown()
+        report_registrations(registrar.collect())
+
+
+def run_async_controller(lg_client, log_tail, sg2_id, last_launch_time, all_instances,
+                         policy, warm_pool=None):
+    """
+    asyncio control loop: monitoring keeps running while WS instances boot
+    :param lg_client: LGClient of the load generator
+    :param log_tail: LogTail following the test log
+    :param sg2_id: id of WS security group
+    :param last_launch_time: datetime of the last WS registration
+    :param all_instances: list every launched instance is appended to
+    :param policy: ScalingPolicy deciding the size of each batch
+    :param warm_pool: WarmPool to take instances from, None to always cold launch
+    :return: None
+    """
+    controller = AsyncScalingController(
+        launch_fn=lambda count: launch_web_services(sg2_id, count, warm_pool),
+        lg_client=lg_client,
+        log_tail=log_tail,
+        is_complete_fn=is_test_complete,
+        policy=policy,
+        cooldown=LAUNCH_COOLDOWN,
+        max_in_flight=MAX_LAUNCHES_IN_FLIGHT,
+        registration_timeout=REGISTRATION_TIMEOUT
+    )
+    try:
+        get_clock().run_async(controller.run(last_launch_time.timestamp()))
+    finally:
+        all_instances.extend(controller.instances)
 
 
 ########################################
@@ -226,113 +518,96 @@ def main():
     #   - Add Web Service instances to Load Generator
     #   - Terminate resources
 
+    if CLOCK_SPEEDUP != 1:
+        set_clock(ScaledClock(CLOCK_SPEEDUP))
+
     print_section('1 - create two security groups')
     
-    # Create EC2 client
-    ec2_client = boto3.client('ec2', region_name='us-east-1')
-    
-    # Get the default VPC
-    vpcs = ec2_client.describe_vpcs(Filters=[{'Name': 'is-default', 'Values': ['true']}])
-    vpc_id = vpcs['Vpcs'][0]['VpcId']
-    
-    # Create or get security groups
-    def create_security_group(name, description):
-        try:
-            response = ec2_client.create_security_group(
-                GroupName=name,
-                Description=description,
-                VpcId=vpc_id,
-                TagSpecifications=[{'ResourceType': 'security-group', 'Tags': TAGS}]
-            )
-            sg_id = response['GroupId']
-            # Add HTTP ingress rule (port 80 incoming traffic)
-            ec2_client.authorize_security_group_ingress(
-                GroupId=sg_id,
-                IpPermissions=[{
-                    'IpProtocol': 'tcp',
-                    'FromPort': 80,
-                    'ToPort': 80,
-                    'IpRanges': [{'CidrIp': '0.0.0.0/0'}]
-                }]
-            )
-            # Note: AWS automatically allows all outbound traffic by default
-            print(f"Created {name}: {sg_id}")
-            return sg_id
-        except botocore.exceptions.ClientError as e:
-            if e.response['Error']['Code'] == 'InvalidGroup.Duplicate':
-                sgs = ec2_client.describe_security_groups(
-                    Filters=[{'Name': 'group-name', 'Values': [name]}]
-                )
-                sg_id = sgs['SecurityGroups'][0]['GroupId']
-                print(f"Using existing {name}: {sg_id}")
-                return sg_id
-            raise e
-    
-    sg1_id = create_security_group('LGSecGroup', 'Load Generator security group')
-    sg2_id = create_security_group('WSSecGroup', 'Web Service security group')
-
-    print_section('2 - create LG')
-
-    # Create Load Generator instance
-    lg = create_instance(LOAD_GENERATOR_AMI, sg1_id)
+    sg1_id = EC2_BACKEND.create_security_group('LGSecGroup', 'Load Generator security group')
+    sg2_id = EC2_BACKEND.create_security_group('WSSecGroup', 'Web Service security group')
+
+    print_section('2 - create LG and first WS in parallel')
+
+    # The LG and the first WS do not depend on each other, so boot them
+    # at the same time instead of paying for two boot times in a row
+    provisioner = Provisioner()
+    warm_pool = None
+    if WARM_POOL_SIZE:
+        # Boot the pool alongside the LG; it is ready well before the
+        # first scale-out, which the LG only allows after its cooldown
+        warm_pool = WarmPool(
+            lambda count: create_instances(WEB_SERVICE_AMI, sg2_id, count),
+            start_instances, stop_instances, WARM_POOL_SIZE, provisioner
+        )
+        warm_pool.replenish()
+    launches = [
+        provisioner.launch(create_instance, LOAD_GENERATOR_AMI, sg1_id),
+        provisioner.launch(create_instance, WEB_SERVICE_AMI, sg2_id)
+    ]
+    # Track all instances for cleanup
+    all_instances, errors = provisioner.wait_all(launches)
+    if errors:
+        for instance in all_instances:
+            instance.terminate()
+            print(f"Terminated instance: {instance.instance_id}")
+        provisioner.shutdown()
+        if warm_pool:
+            warm_pool.terminate()
+        raise errors[0]
+
+    lg, ws = all_instances
     lg_id = lg.instance_id
     lg_dns = lg.public_dns_name
     print("Load Generator running: id={} dns={}".format(lg_id, lg_dns))
 
-    print_section('3 - create first WS')
-    
-    # Create First Web Service Instance
-    ws = create_instance(WEB_SERVICE_AMI, sg2_id)
     web_service_dns = ws.public_dns_name
     print("First Web Service running: id={} dns={}".format(ws.instance_id, web_service_dns))
 
-    # Track all instances for cleanup
-    all_instances = [lg, ws]
-    
+    mirror = None
     try:
         print_section('3. Submit the first WS instance DNS to LG, starting test.')
-        log_name = initialize_test(lg_dns, web_service_dns)
-        last_launch_time = get_test_start_time(lg_dns, log_name)
+        lg_client = LGClient(lg_dns)
+        log_name = initialize_test(lg_client, web_service_dns)
+        # One incremental fetch per tick serves both the RPS and the
+        # test-finished check
+        log_tail = LogTail(lg_client, log_name)
+        mirror = mirror_log(log_tail)
+        last_launch_time = get_test_start_time(log_tail)
         
-        while not is_test_complete(lg_dns, log_name):
-            # Get current RPS
-            current_rps = get_rps(lg_dns, log_name)
-            current_time = time.time()
-            
-            # Check if we need to add more instances
-            if current_rps < 50:
-                # Check if cooldown period has passed (100 seconds)
-                time_since_last_launch = current_time - last_launch_time.timestamp()
-                if time_since_last_launch >= 100:
-                    try:
-                        print(f"Current RPS: {current_rps:.2f} < 50. Adding new WS instance...")
-                        # FIXED: Don't create instance twice - add_web_service_instance creates it
-                        new_ws = add_web_service_instance(lg_dns, sg2_id, log_name)
-                        all_instances.append(new_ws)
-                        last_launch_time = datetime.now()
-                        print(f"New WS added. Total instances: {len(all_instances) - 1} WS + 1 LG")
-                    except botocore.exceptions.ClientError as e:
-                        if 'VcpuLimitExceeded' in str(e):
-                            print(f"WARNING: vCPU limit reached. Cannot add more instances.")
-                            print(f"Continuing with current instances. RPS: {current_rps:.2f}")
-                        else:
-                            raise
-            
-            time.sleep(1)
+        policy = build_policy(SCALING_POLICY, TARGET_RPS)
+        if ASYNC_CONTROLLER:
+            run_async_controller(lg_client, log_tail, sg2_id, last_launch_time, all_instances,
+                                 policy, warm_pool)
+        else:
+            run_controller(lg_client, log_tail, sg2_id, last_launch_time, all_instances,
+                           policy, warm_pool)
 
         print_section('End Test')
+        lg_client.print_stats()
+        if warm_pool:
+            warm_pool.report()
         
     finally:
+        if mirror:
+            mirror.close()
+        provisioner.shutdown()
         # Always terminate all instances, even if there was an error
+        tracing.phase('Terminate instances')
         print("Terminating all instances...")
-        ec2 = boto3.resource('ec2', region_name='us-east-1')
+        if warm_pool:
+            try:
+                warm_pool.terminate()
+            except Exception as e:
+                print(f"Error terminating the warm pool: {e}")
         for instance in all_instances:
             try:
-                instance.terminate()
+                with tracing.span('terminate', instance_id=instance.instance_id):
+                    instance.terminate()
                 print(f"Terminated instance: {instance.instance_id}")
             except Exception as e:
                 print(f"Error terminating {instance.instance_id}: {e}")
         print("All instances terminated.")
+        tracing.finish(TRACE_FILE)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,187 @@
+import math
+from collections import deque
+from typing import NamedTuple
+
+from utilities.clock import get_clock
+
+# Per-instance RPS assumed before the log has reported any sample
+DEFAULT_INSTANCE_RPS = 12.0
+
+
+class ScalingState(NamedTuple):
+    """What a policy sees when it is asked for a decision."""
+    minute: int
+    rps: float
+    instance_rps: dict
+    web_services: int
+    pending: int
+    # Web services the LG can accept until a batch launched now is running,
+    # see utilities.registration.registration_slots(); None for no limit
+    registration_slots: int = None
+
+
+class ScalingPolicy:
+    """
+    Decide how many web services to launch in the current cooldown window.
+    """
+
+    def __init__(self, target_rps, max_batch=1):
+        """
+        :param target_rps: RPS the test has to reach
+        :param max_batch: maximum number of instances launched in one decision
+        """
+        self.target_rps = target_rps
+        self.max_batch = max_batch
+
+    def decide(self, state):
+        """
+        :param state: ScalingState of the test
+        :return: number of web services to launch now, possibly 0
+        """
+        if state.rps >= self.target_rps:
+            return 0
+        batch = min(self.max_batch, self.wanted(state))
+        if state.registration_slots is not None:
+            # Pending web services take the first slots; an instance booted
+            # ahead of its slot is billed while it waits for it
+            batch = min(batch, state.registration_slots)
+        return max(0, batch - state.pending)
+
+    def wanted(self, state):
+        raise NotImplementedError
+
+
+class ThresholdPolicy(ScalingPolicy):
+    """
+    The original rule: add one web service while below the target.
+    """
+
+    def wanted(self, state):
+        return 1
+
+
+class StepPolicy(ScalingPolicy):
+    """
+    Launch more instances the further the RPS is below the target.
+    Steps are (deficit fraction, instances) pairs; the largest fraction not
+    above the current deficit wins.
+    """
+
+    def __init__(self, target_rps, steps, max_batch=1):
+        super().__init__(target_rps, max_batch)
+        self.steps = sorted((float(f), int(n)) for f, n in steps)
+
+    def wanted(self, state):
+        deficit = (self.target_rps - state.rps) / self.target_rps
+        count = 1
+        for fraction, instances in self.steps:
+            if deficit >= fraction:
+                count = instances
+        return count
+
+
+class ThroughputPolicy(ScalingPolicy):
+    """
+    Estimate what one web service delivers from the per-instance RPS of the
+    last few minutes and launch enough of them in one batch to cover the gap:
+    ceil((target - rps) / per_instance_rps).
+    """
+
+    def __init__(self, target_rps, window_minutes=3, max_batch=4):
+        super().__init__(target_rps, max_batch)
+        self.samples = deque(maxlen=window_minutes)
+        self.last_minute = None
+
+    def per_instance_rps(self):
+        # Instances serving nothing (test start, unhealthy LB) say nothing
+        # about their throughput
+        values = [rps for minute in self.samples for rps in minute if rps > 0]
+        if not values:
+            return DEFAULT_INSTANCE_RPS
+        return sum(values) / len(values)
+
+    def observe(self, state):
+        if state.minute != self.last_minute and state.instance_rps:
+            self.samples.append(list(state.instance_rps.values()))
+            self.last_minute = state.minute
+
+    def wanted(self, state):
+        return math.ceil((self.target_rps - state.rps) / self.per_instance_rps())
+
+    def decide(self, state):
+        self.observe(state)
+        return super().decide(state)
+
+
+class PidPolicy(ThroughputPolicy):
+    """
+    PID controller on the RPS error. The output, in RPS, is converted to
+    instances with the measured per-instance throughput.
+
+    The integral and derivative terms are taken over the clock time elapsed
+    between two decisions, so they do not depend on how often the loop asks
+    for one. The integral is clamped to +/- integral_limit RPS-seconds; by
+    default that limit lets the integral term ask for at most max_batch
+    instances on its own.
+    """
+
+    def __init__(self, target_rps, kp=1.0, ki=0.0, kd=0.0,
+                 window_minutes=3, max_batch=4, integral_limit=None):
+        super().__init__(target_rps, window_minutes, max_batch)
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        if integral_limit is None:
+            integral_limit = max_batch * DEFAULT_INSTANCE_RPS / ki if ki else math.inf
+        self.integral_limit = integral_limit
+        self.integral = 0.0
+        self.last_error = None
+        self.last_time = None
+        self.derivative = 0.0
+
+    def update(self, state):
+        """
+        Integrate the error over the time since the previous decision,
+        including decisions taken above the target so the integral unwinds
+        """
+        now = get_clock().monotonic()
+        error = self.target_rps - state.rps
+        self.derivative = 0.0
+        if self.last_time is not None:
+            elapsed = now - self.last_time
+            self.integral = max(-self.integral_limit,
+                                min(self.integral_limit, self.integral + error * elapsed))
+            if elapsed > 0:
+                self.derivative = (error - self.last_error) / elapsed
+        self.last_error = error
+        self.last_time = now
+
+    def wanted(self, state):
+        output = self.kp * self.last_error + self.ki * self.integral + self.kd * self.derivative
+        return math.ceil(output / self.per_instance_rps())
+
+    def decide(self, state):
+        self.update(state)
+        return super().decide(state)
+
+
+POLICIES = {
+    'threshold': ThresholdPolicy,
+    'step': StepPolicy,
+    'throughput': ThroughputPolicy,
+    'pid': PidPolicy,
+}
+
+
+def build_policy(policy_config, target_rps):
+    """
+    Create the policy described by the scaling_policy section of the config
+    :param policy_config: dict with a 'strategy' key plus strategy parameters
+    :param target_rps: RPS the test has to reach
+    :return: ScalingPolicy
+    """
+    params = dict(policy_config)
+    strategy = params.pop('strategy')
+    if strategy not in POLICIES:
+        raise ValueError('Unknown scaling strategy: {}'.format(strategy))
+    return POLICIES[strategy](target_rps, **params)
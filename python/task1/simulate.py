@@ -0,0 +1,96 @@
+"""
+Run horizontal-scaling.py end to end against the LG simulator on a
+simulated clock, so a 30 minute test finishes in seconds.
+
+    python simulate.py --capacity 12 --boot-delay 60
+"""
+import argparse
+import importlib.util
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+from utilities.clock import SimulatedClock, set_clock
+from utilities.lg_simulator import LoadGeneratorSimulator, SimulatedEc2, make_handler
+
+
+def load_script(path, module_name):
+    """
+    Import a script whose file name is not a valid module name
+    :param path: path of the script
+    :param module_name: name to register the module under
+    :return: the loaded module
+    """
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def start_simulator(**kwargs):
+    """
+    Serve a LoadGeneratorSimulator on a free local port in a background thread
+    :return: (simulator, server)
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', 0), None)
+    address = '127.0.0.1:{}'.format(server.server_address[1])
+    simulator = LoadGeneratorSimulator(address=address, **kwargs)
+    server.RequestHandlerClass = make_handler(simulator)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return simulator, server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--capacity', type=float, default=12.0)
+    parser.add_argument('--jitter', type=float, default=0.15)
+    parser.add_argument('--boot-delay', type=float, default=60)
+    parser.add_argument('--start-delay', type=float, default=15,
+                        help='seconds a stopped web service takes to serve again')
+    parser.add_argument('--warm-pool', type=int,
+                        help='override "warm_pool_size" of the config')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--lg-address',
+                        help='host:port of a simulator started with "python -m '
+                             'utilities.lg_simulator" to run against in real time')
+    parser.add_argument('--speedup', type=float, default=1,
+                        help='--speedup the --lg-address simulator runs at')
+    args = parser.parse_args()
+
+    script = load_script('horizontal-scaling.py', 'horizontal_scaling')
+    if args.warm_pool is not None:
+        script.WARM_POOL_SIZE = args.warm_pool
+    if args.lg_address:
+        script.EC2_BACKEND = SimulatedEc2(args.lg_address, script.LOAD_GENERATOR_AMI)
+        script.CLOCK_SPEEDUP = args.speedup
+        script.main()
+        return
+
+    clock = SimulatedClock()
+    set_clock(clock)
+    simulator, server = start_simulator(
+        instance_capacity=args.capacity,
+        capacity_jitter=args.jitter,
+        boot_delay=args.boot_delay,
+        start_delay=args.start_delay,
+        seed=args.seed
+    )
+    script.EC2_BACKEND = SimulatedEc2(simulator.address, script.LOAD_GENERATOR_AMI)
+    script.CLOCK_SPEEDUP = 1
+
+    real_start = time.monotonic()
+    try:
+        # The script drives the simulation: time only moves while it, and
+        # every thread it hands work to, is waiting on the clock
+        with clock.actor():
+            script.main()
+    finally:
+        server.shutdown()
+    real = time.monotonic() - real_start
+    virtual = clock.monotonic()
+    print('Simulated {:.0f} s in {:.1f} s of real time ({:.0f}x)'.format(
+        virtual, real, virtual / real))
+
+if __name__ == '__main__':
+    main()
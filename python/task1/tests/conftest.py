@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+TASK_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TASK_DIR)
+
+from utilities.clock import RealClock, ScaledClock, set_clock  # noqa: E402
+
+
+@pytest.fixture
+def fast_clock():
+    """
+    Run the test on a clock 200 times faster than real time
+    """
+    clock = ScaledClock(200)
+    set_clock(clock)
+    yield clock
+    set_clock(RealClock())
@@ -0,0 +1,57 @@
+import asyncio
+from types import SimpleNamespace
+
+from async_controller import AsyncScalingController
+from scaling_policy import ScalingPolicy
+
+COOLDOWN = 100
+
+
+class RecordingPolicy(ScalingPolicy):
+    """
+    Ask for one WS every time, recording when it was asked
+    """
+
+    def __init__(self, clock):
+        super().__init__(target_rps=50)
+        self.clock = clock
+        self.calls = []
+
+    def decide(self, state):
+        self.calls.append(self.clock.monotonic())
+        return 1
+
+
+class AcceptingLG:
+    def add_web_service(self, dns):
+        return SimpleNamespace(status_code=200)
+
+
+def test_decisions_wait_for_the_cooldown(fast_clock):
+    start = fast_clock.monotonic()
+    log_tail = SimpleNamespace(minute=1, rps=10.0, instance_rps={}, finished=False)
+
+    def is_complete(tail):
+        tail.finished = fast_clock.monotonic() - start >= 3.5 * COOLDOWN
+        return tail.finished
+
+    launched = []
+
+    def launch(count):
+        instances = [SimpleNamespace(instance_id='i-{}'.format(len(launched) + n),
+                                     public_dns_name='ws') for n in range(count)]
+        launched.extend(instances)
+        return instances
+
+    policy = RecordingPolicy(fast_clock)
+    controller = AsyncScalingController(launch, AcceptingLG(), log_tail, is_complete, policy,
+                                        cooldown=COOLDOWN, max_in_flight=2)
+    asyncio.run(controller.run(fast_clock.time()))
+
+    # Once per cooldown, not on every sample
+    assert len(policy.calls) == 3
+    previous = start
+    for call in policy.calls:
+        assert call - previous >= COOLDOWN
+        previous = call
+    assert controller.instances == launched and controller.registered == 4
@@ -0,0 +1,88 @@
+import concurrent.futures
+import threading
+import time
+
+from utilities.clock import SimulatedClock
+
+
+def test_time_jumps_to_the_earliest_wakeup():
+    clock = SimulatedClock(start=1000)
+    with clock.actor():
+        clock.sleep(100)
+        assert clock.time() == 1100
+        assert clock.monotonic() == 100
+
+
+def test_time_holds_while_an_actor_is_busy():
+    clock = SimulatedClock(start=0)
+    release = threading.Event()
+    seen = []
+
+    def busy():
+        # e.g. waiting for an HTTP response
+        release.wait()
+        seen.append(clock.time())
+
+    def sleeper():
+        clock.sleep(50)
+        seen.append(clock.time())
+
+    with clock.actor(), concurrent.futures.ThreadPoolExecutor() as executor:
+        future = clock.submit(executor, busy)
+        # Not an actor: it neither holds nor drives the clock
+        thread = threading.Thread(target=sleeper)
+        thread.start()
+        time.sleep(0.05)
+        assert clock.time() == 0
+        release.set()
+        clock.wait([future])
+        assert seen == [0]
+        clock.sleep(60)
+        assert clock.time() == 60
+    thread.join()
+    # It woke up once its time had passed, but did not stop the clock there
+    assert seen[0] == 0 and 50 <= seen[1] <= 60
+
+
+def test_actors_wake_in_order_of_their_wakeups():
+    clock = SimulatedClock(start=0)
+    order = []
+
+    def nap(name, seconds):
+        clock.sleep(seconds)
+        order.append((name, clock.time()))
+        clock.sleep(seconds)
+        order.append((name, clock.time()))
+
+    with clock.actor(), concurrent.futures.ThreadPoolExecutor() as executor:
+        futures = [clock.submit(executor, nap, 'a', 30), clock.submit(executor, nap, 'b', 45)]
+        clock.wait(futures)
+    assert order == [('a', 30), ('b', 45), ('a', 60), ('b', 90)]
+
+
+def test_wait_for_the_first_task():
+    clock = SimulatedClock(start=0)
+    with clock.actor(), concurrent.futures.ThreadPoolExecutor() as executor:
+        slow = clock.submit(executor, clock.sleep, 100)
+        fast = clock.submit(executor, clock.sleep, 10)
+        done, pending = clock.wait([slow, fast], concurrent.futures.FIRST_COMPLETED)
+        assert done == {fast} and pending == {slow}
+        assert clock.time() == 10
+        clock.wait([slow])
+        assert clock.time() == 100
+
+
+def test_event_loop_sleeps_and_threads_share_the_clock():
+    clock = SimulatedClock(start=0)
+    seen = []
+
+    async def coroutine():
+        await clock.async_sleep(5)
+        seen.append(clock.time())
+        await clock.to_thread(clock.sleep, 20)
+        seen.append(clock.time())
+        await clock.async_sleep(1)
+        return clock.time()
+
+    assert clock.run_async(coroutine()) == 26
+    assert seen == [5, 25]
@@ -0,0 +1,93 @@
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+from utilities.clock import RealClock, SimulatedClock, set_clock
+from utilities.registration import (
+    CANCELLED, EXPIRED, PENDING, REGISTERED, Registrar, RegistrationJob, registration_slots
+)
+
+
+class StubLG:
+    """
+    LG rejecting every web service until `accept_at`, as it does during the
+    cooldown between two registrations
+    """
+
+    def __init__(self, clock, accept_at):
+        self.clock = clock
+        self.accept_at = accept_at
+        self.added = []
+
+    def add_web_service(self, dns):
+        if self.clock.time() < self.accept_at:
+            return SimpleNamespace(status_code=400)
+        self.added.append(dns)
+        return SimpleNamespace(status_code=200)
+
+
+class UnreachableLG:
+    def add_web_service(self, dns):
+        raise requests.exceptions.ConnectionError()
+
+
+def web_service(name):
+    return SimpleNamespace(instance_id=name, public_dns_name=name + '.example')
+
+
+@pytest.fixture
+def clock():
+    clock = SimulatedClock(start=0)
+    set_clock(clock)
+    with clock.actor():
+        yield clock
+    set_clock(RealClock())
+
+
+def test_registration_slots_follow_the_boot_time():
+    assert registration_slots(0, 100) == 1
+    assert registration_slots(60, 100) == 1
+    assert registration_slots(250, 100) == 3
+
+
+def test_job_retries_until_the_lg_accepts(clock):
+    lg = StubLG(clock, accept_at=45)
+    job = RegistrationJob(lg, web_service('ws-2'), SimpleNamespace(finished=False), timeout=600)
+    assert job.run() == REGISTERED
+    assert lg.added == ['ws-2.example']
+    assert job.attempts > 1 and job.registered_at >= 45
+
+
+def test_job_expires_at_its_deadline(clock):
+    job = RegistrationJob(UnreachableLG(), web_service('ws-2'),
+                          SimpleNamespace(finished=False), timeout=30)
+    assert job.run() == EXPIRED
+    assert clock.time() <= 30
+
+
+def test_job_stops_once_the_test_finished(clock):
+    log_tail = SimpleNamespace(finished=True)
+    job = RegistrationJob(UnreachableLG(), web_service('ws-2'), log_tail)
+    assert job.run() == CANCELLED and job.attempts == 0
+
+
+def test_registrar_registers_in_the_background(clock):
+    lg = StubLG(clock, accept_at=20)
+    registrar = Registrar(lg, SimpleNamespace(finished=False), timeout=600)
+    jobs = [registrar.submit(web_service('ws-2')), registrar.submit(web_service('ws-3'))]
+    # The caller goes on while the LG rejects the web services
+    assert registrar.pending() == 2 and registrar.collect() == []
+    clock.sleep(100)
+    assert registrar.collect() == jobs
+    assert registrar.collect() == []
+    assert sorted(lg.added) == ['ws-2.example', 'ws-3.example']
+    registrar.shutdown()
+
+
+def test_registrar_shutdown_cancels_pending_jobs(clock):
+    registrar = Registrar(StubLG(clock, accept_at=10 ** 9), SimpleNamespace(finished=False))
+    job = registrar.submit(web_service('ws-2'))
+    assert job.state == PENDING
+    registrar.shutdown()
+    assert job.state == CANCELLED
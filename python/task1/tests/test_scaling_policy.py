@@ -0,0 +1,87 @@
+import pytest
+
+from scaling_policy import (
+    DEFAULT_INSTANCE_RPS, PidPolicy, ScalingState, StepPolicy, ThresholdPolicy, build_policy
+)
+from utilities.clock import RealClock, set_clock
+
+
+class ManualClock(RealClock):
+    """
+    Clock that only moves when the test says so
+    """
+
+    def __init__(self):
+        self.current = 0.0
+
+    def monotonic(self):
+        return self.current
+
+
+@pytest.fixture
+def clock():
+    clock = ManualClock()
+    set_clock(clock)
+    yield clock
+    set_clock(RealClock())
+
+
+def state(rps, pending=0, minute=1, instance_rps=None, registration_slots=None):
+    return ScalingState(minute, rps, instance_rps or {}, 1, pending, registration_slots)
+
+
+def test_threshold_policy_adds_one_below_the_target():
+    policy = ThresholdPolicy(50)
+    assert policy.decide(state(30)) == 1
+    assert policy.decide(state(30, pending=1)) == 0
+    assert policy.decide(state(50)) == 0
+
+
+def test_step_policy_grows_with_the_deficit():
+    policy = StepPolicy(50, [(0.2, 2), (0.5, 3)], max_batch=4)
+    assert policy.decide(state(45)) == 1
+    assert policy.decide(state(35)) == 2
+    assert policy.decide(state(10)) == 3
+
+
+def test_throughput_policy_covers_the_gap_with_measured_rps():
+    policy = build_policy({'strategy': 'throughput', 'max_batch': 4}, 50)
+    # 20 RPS missing at 8 RPS per instance
+    assert policy.decide(state(30, instance_rps={'ws-1': 8.0, 'ws-2': 0.0})) == 3
+    assert policy.decide(state(30, pending=2)) == 1
+
+
+def test_batches_are_capped_by_the_registration_slots():
+    policy = build_policy({'strategy': 'throughput', 'max_batch': 4}, 50)
+    # 40 RPS missing would take 4 WS, but the LG accepts one while they boot
+    assert policy.decide(state(10, registration_slots=1)) == 1
+    assert policy.decide(state(10, registration_slots=3)) == 3
+    # Pending WS take the first slots
+    assert policy.decide(state(10, pending=1, registration_slots=3)) == 2
+    assert policy.decide(state(10, pending=1, registration_slots=1)) == 0
+
+
+def test_pid_integral_follows_elapsed_time(clock):
+    policy = PidPolicy(50, kp=0.0, ki=0.01, max_batch=10, integral_limit=1e6)
+    policy.decide(state(40))
+    # Asking more often in the same time must not grow the integral
+    for _ in range(100):
+        policy.decide(state(40))
+    assert policy.integral == 0
+    clock.current += 100
+    policy.decide(state(40))
+    assert policy.integral == pytest.approx(10 * 100)
+
+
+def test_pid_integral_is_clamped(clock):
+    policy = PidPolicy(50, kp=0.0, ki=0.1, max_batch=4)
+    for _ in range(50):
+        policy.decide(state(0))
+        clock.current += 100
+    assert policy.integral == pytest.approx(4 * DEFAULT_INSTANCE_RPS / 0.1)
+    # The integral term alone asks for at most one batch
+    assert policy.ki * policy.integral / DEFAULT_INSTANCE_RPS == pytest.approx(4)
+    # and unwinds as soon as the target is passed
+    clock.current += 100
+    policy.decide(state(60))
+    assert policy.integral < 4 * DEFAULT_INSTANCE_RPS / 0.1
@@ -0,0 +1,3 @@
+"""
+Helpers shared by the scaling scripts.
+"""
@@ -0,0 +1,362 @@
+"""
+Clock service all controller timing goes through.
+
+Scripts call clock.get_clock().sleep()/time()/now() instead of the time and
+datetime modules, so that a run can be executed on a faster-than-real-time
+clock by installing one with set_clock() before it starts.
+
+Work handed to other threads goes through the clock too (submit()/wait(),
+to_thread() and run_async()), so that a SimulatedClock knows which threads
+are still busy.
+"""
+import asyncio
+import concurrent.futures
+import contextlib
+import heapq
+import itertools
+import selectors
+import threading
+import time
+from datetime import datetime, timezone
+
+
+class RealClock:
+    """
+    Wall clock time; sleeping really sleeps.
+    """
+
+    def time(self):
+        return time.time()
+
+    def monotonic(self):
+        return time.monotonic()
+
+    def now(self):
+        return datetime.fromtimestamp(self.time(), timezone.utc)
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    async def async_sleep(self, seconds):
+        await asyncio.sleep(seconds)
+
+    def actor(self):
+        """
+        :return: context manager running its body as an actor of the clock,
+            nothing to do for a real clock
+        """
+        return contextlib.nullcontext()
+
+    def submit(self, executor, fn, *args, **kwargs):
+        """
+        Run fn on an executor
+        :return: concurrent.futures.Future
+        """
+        return executor.submit(fn, *args, **kwargs)
+
+    def wait(self, futures, return_when=concurrent.futures.ALL_COMPLETED):
+        """
+        Block until futures returned by submit() are done
+        :return: (done, not_done) sets, as concurrent.futures.wait()
+        """
+        return concurrent.futures.wait(futures, return_when=return_when)
+
+    async def to_thread(self, fn, *args, **kwargs):
+        return await asyncio.to_thread(fn, *args, **kwargs)
+
+    def run_async(self, coroutine):
+        """
+        Run a coroutine on a new event loop
+        :return: what the coroutine returns
+        """
+        return asyncio.run(coroutine)
+
+
+class ScaledClock(RealClock):
+    """
+    Wall clock running `speedup` times faster than real time. Processes
+    sharing the same speedup (e.g. a script and the LG simulator) stay
+    roughly in step with each other.
+    """
+
+    def __init__(self, speedup=1.0, epoch=None):
+        self.speedup = speedup
+        self.epoch = time.time() if epoch is None else epoch
+        self.real_start = time.monotonic()
+
+    def time(self):
+        return self.epoch + (time.monotonic() - self.real_start) * self.speedup
+
+    def monotonic(self):
+        return self.time() - self.epoch
+
+    def sleep(self, seconds):
+        time.sleep(max(0, seconds) / self.speedup)
+
+    async def async_sleep(self, seconds):
+        await asyncio.sleep(max(0, seconds) / self.speedup)
+
+
+class SimulatedClock(RealClock):
+    """
+    Discrete-event clock for in-process simulations.
+
+    The threads taking part in the simulation are actors: the thread driving
+    it runs inside `with clock.actor():`, and work it hands to other threads
+    goes through submit() or to_thread(), which register the worker as an
+    actor before the hand-off. Time only moves once every actor is blocked
+    in sleep() or wait(); it then jumps straight to the earliest wake-up. An
+    actor doing anything else, e.g. waiting for an HTTP response, holds the
+    clock, so cooldowns and waiter polling cost no real time and real work
+    costs no virtual time. Threads that are not actors never hold the clock.
+
+    run_async() runs an event loop whose thread counts as blocked while no
+    coroutine is ready to run.
+    """
+
+    def __init__(self, start=None):
+        """
+        :param start: virtual epoch time to start from, now by default
+        """
+        self.start = time.time() if start is None else start
+        self.current = self.start
+        # Reentrant: wake-up callbacks run while time is being advanced
+        self.condition = threading.Condition(threading.RLock())
+        # (time, sequence, callback run under the lock once time reaches it)
+        self.wakeups = []
+        self.sequence = itertools.count()
+        # (done, callback) of the threads blocked in wait()
+        self.waiting = []
+        # Actors that are not blocked
+        self.running = 0
+        self.local = threading.local()
+        # Actor count of the event loop thread while run_async() waits for events
+        self.loop_blocked = None
+
+    def time(self):
+        with self.condition:
+            return self.current
+
+    def monotonic(self):
+        return self.time() - self.start
+
+    def actor(self):
+        return Actor(self)
+
+    def depth(self):
+        """
+        :return: number of actors the current thread is running
+        """
+        return getattr(self.local, 'depth', 0)
+
+    def sleep(self, seconds):
+        with self.condition:
+            self.block_until(self.current + max(0, seconds))
+
+    def block_until(self, wake, done=None):
+        """
+        Block the current thread until time reaches `wake` or done() is true
+        once woken by notify_done(). Must be called with the lock held.
+        """
+        depth = self.depth()
+        woken = []
+
+        def wake_up():
+            if not woken:
+                woken.append(True)
+                self.running += depth
+
+        if wake is not None:
+            heapq.heappush(self.wakeups, (wake, next(self.sequence), wake_up))
+        if done is not None:
+            self.waiting.append((done, wake_up))
+        self.running -= depth
+        self.advance()
+        while not woken:
+            self.condition.wait()
+
+    def notify_done(self):
+        """
+        Wake the threads in wait() whose futures are done; called by a
+        finished worker before it stops holding the clock
+        """
+        with self.condition:
+            still_waiting = []
+            for done, wake_up in self.waiting:
+                if done():
+                    wake_up()
+                else:
+                    still_waiting.append((done, wake_up))
+            self.waiting = still_waiting
+            self.condition.notify_all()
+
+    def advance(self):
+        """
+        Jump to the earliest wake-up while every actor is blocked. Must be
+        called with the lock held.
+        """
+        while self.running == 0 and self.wakeups:
+            self.current = max(self.current, self.wakeups[0][0])
+            while self.wakeups and self.wakeups[0][0] <= self.current:
+                _, _, wake_up = heapq.heappop(self.wakeups)
+                wake_up()
+            self.condition.notify_all()
+
+    def release(self, count):
+        with self.condition:
+            self.running -= count
+            self.advance()
+
+    def submit(self, executor, fn, *args, **kwargs):
+        actor = self.actor()
+        task = SimulatedTask(self, actor, fn, args, kwargs)
+        future = executor.submit(task.run)
+        future.task = task
+        return future
+
+    def wait(self, futures, return_when=concurrent.futures.ALL_COMPLETED):
+        tasks = [future.task for future in futures]
+        if return_when == concurrent.futures.FIRST_COMPLETED:
+            def done():
+                return any(task.finished for task in tasks)
+        else:
+            def done():
+                return all(task.finished for task in tasks)
+        with self.condition:
+            if not done():
+                self.block_until(None, done)
+        # The tasks are finished, their futures are only being set
+        return concurrent.futures.wait(futures, return_when=return_when)
+
+    async def async_sleep(self, seconds):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def wake_up():
+            # Count the loop as busy before time can move on
+            self.wake_loop()
+            loop.call_soon_threadsafe(resolve, future)
+
+        with self.condition:
+            heapq.heappush(self.wakeups, (self.current + max(0, seconds),
+                                          next(self.sequence), wake_up))
+        await future
+
+    async def to_thread(self, fn, *args, **kwargs):
+        actor = self.actor()
+
+        def run():
+            with actor:
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    # The loop picks the result up before time moves on
+                    self.wake_loop()
+        return await asyncio.to_thread(run)
+
+    def run_async(self, coroutine):
+        loop = asyncio.SelectorEventLoop(IdleSelector(self))
+        try:
+            with self.actor():
+                return loop.run_until_complete(coroutine)
+        finally:
+            loop.run_until_complete(loop.shutdown_default_executor())
+            loop.close()
+
+    def block_loop(self):
+        with self.condition:
+            self.loop_blocked = self.depth()
+            self.release(self.loop_blocked)
+
+    def wake_loop(self):
+        with self.condition:
+            if self.loop_blocked is not None:
+                self.running += self.loop_blocked
+                self.loop_blocked = None
+
+
+class Actor:
+    """
+    Registration of a thread with a SimulatedClock: it holds the clock from
+    its creation, possibly on another thread, until the `with` block ends.
+    """
+
+    def __init__(self, clock):
+        self.clock = clock
+        with clock.condition:
+            clock.running += 1
+
+    def __enter__(self):
+        self.clock.local.depth = self.clock.depth() + 1
+        return self
+
+    def __exit__(self, *exc_info):
+        self.clock.local.depth -= 1
+        self.clock.release(1)
+
+
+class SimulatedTask:
+    """
+    Work submitted to an executor by an actor of a SimulatedClock.
+    """
+
+    def __init__(self, clock, actor, fn, args, kwargs):
+        self.clock = clock
+        self.actor = actor
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.finished = False
+
+    def run(self):
+        with self.actor:
+            try:
+                return self.fn(*self.args, **self.kwargs)
+            finally:
+                self.finished = True
+                self.clock.notify_done()
+
+
+class IdleSelector(selectors.DefaultSelector):
+    """
+    Selector of a SimulatedClock event loop: the loop thread is blocked
+    while it waits for events with no timeout, i.e. nothing is ready to run.
+    """
+
+    def __init__(self, clock):
+        super().__init__()
+        self.clock = clock
+
+    def select(self, timeout=None):
+        if timeout is not None:
+            return super().select(timeout)
+        self.clock.block_loop()
+        try:
+            return super().select(timeout)
+        finally:
+            self.clock.wake_loop()
+
+
+def resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+_clock = RealClock()
+
+
+def get_clock():
+    """
+    :return: the clock currently in use
+    """
+    return _clock
+
+
+def set_clock(clock):
+    """
+    Install the clock used by every caller of get_clock()
+    :param clock: RealClock, ScaledClock or SimulatedClock
+    :return: None
+    """
+    global _clock
+    _clock = clock
@@ -0,0 +1,153 @@
+import random
+import threading
+import time
+from collections import defaultdict
+
+import requests
+
+from utilities import tracing
+from utilities.clock import get_clock
+
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT = 10
+
+# Jittered exponential backoff used while the LG is not ready yet
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 10
+
+
+class LatencyStats:
+    """
+    Running count / total / max of request latencies for one endpoint.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, elapsed, ok):
+        self.count += 1
+        self.total += elapsed
+        self.max = max(self.max, elapsed)
+        if not ok:
+            self.errors += 1
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+
+class LGClient:
+    """
+    Client for the load generator HTTP API.
+
+    All calls go through one keep-alive requests.Session with connect and
+    read timeouts, so polling reuses a single TCP connection and a stalled
+    LG raises instead of hanging the controller. Latencies are tracked per
+    endpoint.
+    """
+
+    def __init__(self, lg_dns, connect_timeout=CONNECT_TIMEOUT,
+                 read_timeout=READ_TIMEOUT, session=None):
+        """
+        :param lg_dns: load generator DNS
+        :param connect_timeout: seconds to wait for the TCP connection
+        :param read_timeout: seconds to wait for the response
+        :param session: requests.Session to use, a new one by default
+        """
+        self.lg_dns = lg_dns
+        self.base_url = 'http://{}'.format(lg_dns)
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = session or requests.Session()
+        self.stats = defaultdict(LatencyStats)
+        self.stats_lock = threading.Lock()
+
+    def get(self, path, params=None, headers=None):
+        """
+        Send one GET request to the LG
+        :param path: endpoint path, e.g. '/log'
+        :param params: query string parameters
+        :param headers: extra request headers
+        :return: requests.Response
+        """
+        start = time.perf_counter()
+        ok = False
+        with tracing.span('http ' + path) as span:
+            try:
+                response = self.session.get(
+                    self.base_url + path,
+                    params=params,
+                    headers=headers,
+                    timeout=self.timeout
+                )
+                span.attributes['status'] = response.status_code
+                ok = response.status_code < 500
+                return response
+            finally:
+                with self.stats_lock:
+                    self.stats[path].record(time.perf_counter() - start, ok)
+
+    def get_with_retry(self, path, params=None, deadline=None):
+        """
+        GET an endpoint until it answers 200, backing off between attempts
+        :param path: endpoint path
+        :param params: query string parameters
+        :param deadline: clock time after which to give up, None to retry forever
+        :return: requests.Response with status 200
+        """
+        attempt = 0
+        while True:
+            try:
+                response = self.get(path, params=params)
+                if response.status_code == 200:
+                    return response
+            except (requests.exceptions.ConnectionError,
+                    requests.exceptions.Timeout):
+                pass
+            delay = backoff_delay(attempt)
+            if deadline is not None and get_clock().time() + delay > deadline:
+                raise TimeoutError('LG did not answer {} in time'.format(path))
+            get_clock().sleep(delay)
+            attempt += 1
+
+    ########################################
+    # Endpoints
+    ########################################
+    def start_horizontal_test(self, web_service_dns):
+        return self.get_with_retry('/test/horizontal', {'dns': web_service_dns})
+
+    def add_web_service(self, web_service_dns):
+        return self.get('/test/horizontal/add', {'dns': web_service_dns})
+
+    def start_warmup(self, load_balancer_dns):
+        return self.get_with_retry('/warmup', {'dns': load_balancer_dns})
+
+    def start_autoscaling_test(self, load_balancer_dns):
+        return self.get_with_retry('/autoscaling', {'dns': load_balancer_dns})
+
+    def log(self, log_name, headers=None):
+        return self.get('/log', {'name': log_name}, headers=headers)
+
+    def print_stats(self):
+        """
+        Print the per-endpoint latency table
+        :return: None
+        """
+        print('{:<24} {:>7} {:>7} {:>10} {:>10}'.format(
+            'endpoint', 'calls', 'errors', 'mean ms', 'max ms'))
+        with self.stats_lock:
+            for path, stats in sorted(self.stats.items()):
+                print('{:<24} {:>7} {:>7} {:>10.1f} {:>10.1f}'.format(
+                    path, stats.count, stats.errors,
+                    stats.mean * 1000, stats.max * 1000))
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_CAP):
+    """
+    Full-jitter exponential backoff delay
+    :param attempt: number of failed attempts so far
+    :return: seconds to sleep
+    """
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
@@ -0,0 +1,176 @@
+"""
+Local copy of a test log, kept in step with a LogTail.
+
+Only the bytes each poll appended are written, so mirroring a run costs
+O(log size) writes instead of rewriting the whole file every second. The
+file is flushed after every poll and fsynced every `fsync_interval`
+seconds and when the test finishes. If the LG replaces the log, the
+mirror so far is kept as a .bak file and a new one is started.
+
+Optionally the parsed per-minute samples are also written to a compact
+sidecar, either binary (a magic header followed by one fixed-size record
+per minute) or Parquet when pyarrow is installed, so analysis does not
+have to re-parse the text log.
+"""
+import importlib.util
+import os
+import struct
+from typing import NamedTuple
+
+from utilities.clock import get_clock
+from utilities.log_parser import CurrentRps, MinuteSample
+
+SIDECAR_MAGIC = b'MSBSAMP1'
+# minute, RPS, number of web services reported for that minute
+SAMPLE_RECORD = struct.Struct('<IdI')
+
+BINARY = 'binary'
+PARQUET = 'parquet'
+SIDECAR_SUFFIXES = {BINARY: '.samples.bin', PARQUET: '.samples.parquet'}
+BACKUP_SUFFIX = '.bak'
+
+
+class Sample(NamedTuple):
+    minute: int
+    rps: float
+    web_services: int
+
+
+class LogMirror:
+    """
+    Append-only local mirror of a test log.
+    """
+
+    def __init__(self, path, fsync_interval=5, sidecar_format=None):
+        """
+        :param path: file the log is mirrored to
+        :param fsync_interval: seconds between two fsyncs of the mirror
+        :param sidecar_format: "binary" or "parquet" to also write the parsed
+            samples next to the mirror, None for no sidecar
+        """
+        if sidecar_format == PARQUET and importlib.util.find_spec('pyarrow') is None:
+            # Fail before the test rather than when writing at its end
+            raise ImportError('The parquet sidecar needs pyarrow')
+        self.path = path
+        self.fsync_interval = fsync_interval
+        self.file = open(path, 'wb')
+        self.last_fsync = get_clock().monotonic()
+        self.log_tail = None
+
+        self.sidecar_format = sidecar_format
+        self.sidecar_path = path + SIDECAR_SUFFIXES[sidecar_format] if sidecar_format else None
+        self.sidecar = None
+        self.samples = []
+        self.pending_samples = []
+        self.web_services = 0
+        if sidecar_format == BINARY:
+            self.sidecar = open(self.sidecar_path, 'wb')
+            self.sidecar.write(SIDECAR_MAGIC)
+
+    def attach(self, log_tail):
+        """
+        Mirror everything a LogTail fetches from now on
+        :param log_tail: LogTail of the test, before its first poll
+        :return: self
+        """
+        self.log_tail = log_tail
+        log_tail.subscribe_bytes(self.on_bytes)
+        if self.sidecar_format:
+            log_tail.subscribe(self.on_event)
+        return self
+
+    def on_event(self, event):
+        if isinstance(event, MinuteSample):
+            self.web_services = len(event.instance_rps)
+        elif isinstance(event, CurrentRps):
+            self.pending_samples.append(Sample(event.minute, event.rps, self.web_services))
+
+    def on_bytes(self, new_bytes, rewritten):
+        """
+        LogTail byte listener
+        :param new_bytes: bytes the poll appended, or the whole log if rewritten
+        :param rewritten: True if the LG replaced the log
+        :return: None
+        """
+        if rewritten:
+            self.rotate()
+        self.file.write(new_bytes)
+        self.file.flush()
+        self.write_samples()
+        now = get_clock().monotonic()
+        if self.log_tail.finished or now - self.last_fsync >= self.fsync_interval:
+            self.fsync()
+
+    def rotate(self):
+        """
+        Keep the mirror of a replaced log as .bak files and start new ones
+        :return: None
+        """
+        self.file.close()
+        os.replace(self.path, self.path + BACKUP_SUFFIX)
+        self.file = open(self.path, 'wb')
+        self.samples = []
+        if self.sidecar:
+            self.sidecar.close()
+            os.replace(self.sidecar_path, self.sidecar_path + BACKUP_SUFFIX)
+            self.sidecar = open(self.sidecar_path, 'wb')
+            self.sidecar.write(SIDECAR_MAGIC)
+
+    def write_samples(self):
+        samples, self.pending_samples = self.pending_samples, []
+        self.samples.extend(samples)
+        if self.sidecar and samples:
+            self.sidecar.write(b''.join(SAMPLE_RECORD.pack(*sample) for sample in samples))
+            self.sidecar.flush()
+
+    def fsync(self):
+        os.fsync(self.file.fileno())
+        if self.sidecar:
+            os.fsync(self.sidecar.fileno())
+        self.last_fsync = get_clock().monotonic()
+
+    def close(self):
+        """
+        Flush, fsync and close the mirror and its sidecar
+        :return: None
+        """
+        if self.file.closed:
+            return
+        self.write_samples()
+        self.fsync()
+        self.file.close()
+        if self.sidecar:
+            self.sidecar.close()
+        elif self.sidecar_format == PARQUET:
+            write_parquet(self.sidecar_path, self.samples)
+
+
+def write_parquet(path, samples):
+    """
+    Write samples to a Parquet file (needs pyarrow)
+    :param path: output file
+    :param samples: list of Sample
+    :return: None
+    """
+    import pyarrow
+    import pyarrow.parquet
+    table = pyarrow.table({field: [getattr(s, field) for s in samples]
+                           for field in Sample._fields})
+    pyarrow.parquet.write_table(table, path)
+
+
+def read_samples(path):
+    """
+    Read a sidecar written by LogMirror
+    :param path: .samples.bin or .samples.parquet file
+    :return: list of Sample
+    """
+    if path.endswith(SIDECAR_SUFFIXES[PARQUET]):
+        import pyarrow.parquet
+        columns = pyarrow.parquet.read_table(path).to_pydict()
+        return [Sample(*row) for row in zip(*(columns[f] for f in Sample._fields))]
+    with open(path, 'rb') as f:
+        data = f.read()
+    if not data.startswith(SIDECAR_MAGIC):
+        raise ValueError('{} is not a sample sidecar'.format(path))
+    return [Sample(*record) for record in SAMPLE_RECORD.iter_unpack(data[len(SIDECAR_MAGIC):])]
@@ -0,0 +1,207 @@
+import re
+from typing import NamedTuple, Optional
+
+MINUTE_REGEX = re.compile(r'\[Minute (\d+)\]$')
+CURRENT_RPS_PREFIX = '[Current rps='
+INSTANCE_HOUR_HEADER = '; Instance-Hour Usage'
+TEST_FINISHED = '[Test finished]'
+
+TEST_SECTIONS = ('Test', 'Test Start')
+TEST_END_SECTION = 'Test End'
+
+# Shared empty result so that the common case allocates nothing
+NO_EVENTS = ()
+
+
+########################################
+# Events
+########################################
+class TestStart(NamedTuple):
+    """Emitted when the [Test] / [Test Start] block has been read."""
+    test_type: Optional[str]
+    test_id: Optional[str]
+    test_file: Optional[str]
+    start_time: Optional[str]
+
+
+class MinuteSample(NamedTuple):
+    """Per-instance RPS reported for one minute (empty for auto scaling)."""
+    minute: int
+    instance_rps: dict
+
+
+class CurrentRps(NamedTuple):
+    """Aggregate RPS reported for a minute."""
+    minute: int
+    rps: float
+
+
+class TestEnd(NamedTuple):
+    """Summary written by the LG in the [Test End] block."""
+    end_time: Optional[str]
+    average_rps: Optional[float]
+    max_rps: Optional[float]
+    rps: Optional[float]
+    pattern: Optional[str]
+    ih: Optional[float]
+    passed: Optional[bool]
+
+
+class InstanceHour(NamedTuple):
+    """One row of the Instance-Hour Usage table."""
+    instance_id: str
+    instance_type: str
+    ih: float
+    launch_time: str
+    termination_time: str
+
+
+class Section(NamedTuple):
+    """Any other key=value block, e.g. [Load Generator] or [Web Service 2]."""
+    name: str
+    fields: dict
+
+
+class TestFinished(NamedTuple):
+    """The final [Test finished] marker."""
+
+
+def _float(value):
+    return float(value) if value is not None else None
+
+
+########################################
+# Parser
+########################################
+class LogParser:
+    """
+    Incremental parser for the MSB test log format.
+
+    Lines are fed one at a time and typed events are returned as soon as the
+    block they belong to is complete. Only the block currently being read is
+    kept in memory, so the parser runs in constant memory regardless of the
+    log length. Keys keep their original case.
+    """
+
+    def __init__(self):
+        self.section = None
+        self.fields = {}
+        self.minute = 0
+        self.in_instance_hours = False
+
+    def feed(self, line):
+        """
+        Consume one line of the log
+        :param line: a single log line, with or without the trailing newline
+        :return: tuple of events completed by this line (usually empty)
+        """
+        line = line.strip()
+        if not line:
+            self.in_instance_hours = False
+            return self._close_section()
+
+        first = line[0]
+        if first == '[':
+            events = self._close_section()
+            if line.startswith(CURRENT_RPS_PREFIX):
+                events += (CurrentRps(self.minute, float(line[len(CURRENT_RPS_PREFIX):-1])),)
+            elif line == TEST_FINISHED:
+                events += (TestFinished(),)
+            else:
+                self.section = line[1:-1]
+                match = MINUTE_REGEX.match(line)
+                if match:
+                    self.minute = int(match.group(1))
+            return events
+
+        if first == ';':
+            if self.in_instance_hours:
+                row = self._instance_hour(line)
+                if row is not None:
+                    return (row,)
+            elif line == INSTANCE_HOUR_HEADER:
+                self.in_instance_hours = True
+            return NO_EVENTS
+
+        if self.section is not None:
+            key, sep, value = line.partition('=')
+            if sep:
+                self.fields[key] = value
+        return NO_EVENTS
+
+    def close(self):
+        """
+        Flush the block being read when the input ends
+        :return: tuple of the remaining events
+        """
+        return self._close_section()
+
+    def _close_section(self):
+        section, fields = self.section, self.fields
+        if section is None:
+            return NO_EVENTS
+        self.section = None
+        self.fields = {}
+
+        if section.startswith('Minute '):
+            rps = fields.pop('rps', None)
+            sample = MinuteSample(
+                self.minute, {dns: float(value) for dns, value in fields.items()}
+            )
+            if rps is None:
+                return (sample,)
+            # Auto scaling logs report the aggregate inside the block
+            return sample, CurrentRps(self.minute, float(rps))
+        if section in TEST_SECTIONS:
+            return (TestStart(
+                fields.get('type'),
+                fields.get('testId'),
+                fields.get('testFile'),
+                fields.get('startTime', fields.get('time'))
+            ),)
+        if section == TEST_END_SECTION:
+            passed = fields.get('pass')
+            return (TestEnd(
+                fields.get('endTime', fields.get('time')),
+                _float(fields.get('averageRps')),
+                _float(fields.get('maxRps')),
+                _float(fields.get('rps')),
+                fields.get('pattern'),
+                _float(fields.get('ih')),
+                None if passed is None else passed == 'true'
+            ),)
+        return (Section(section, fields),)
+
+    @staticmethod
+    def _instance_hour(line):
+        columns = line[1:].strip().split('\t')
+        if len(columns) != 5:
+            return None
+        instance_id, instance_type, ih, launch_time, termination_time = columns
+        return InstanceHour(instance_id, instance_type, float(ih),
+                            launch_time, termination_time)
+
+
+def parse_lines(lines):
+    """
+    Parse an iterable of log lines
+    :param lines: iterable of lines, e.g. an open file
+    :return: generator of events
+    """
+    parser = LogParser()
+    feed = parser.feed
+    for line in lines:
+        events = feed(line)
+        if events:
+            yield from events
+    yield from parser.close()
+
+
+def parse_file(path):
+    """
+    Parse a log file on disk line by line
+    :param path: path to the log file
+    :return: generator of events
+    """
+    with open(path) as f:
+        yield from parse_lines(f)
@@ -0,0 +1,69 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from utilities.clock import get_clock
+
+# Upper bound on instances booting at the same time. Launches beyond this are
+# queued until a waiter frees up.
+MAX_CONCURRENT_LAUNCHES = 8
+
+
+class Provisioner:
+    """
+    Launch independent EC2 instances concurrently.
+
+    Each launch runs on its own worker thread, so the blocking
+    wait_until_running() of one instance no longer delays the next one and
+    starting N instances costs one boot time instead of N.
+    """
+
+    def __init__(self, max_workers=MAX_CONCURRENT_LAUNCHES):
+        """
+        :param max_workers: maximum number of launches in flight
+        """
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix='provision'
+        )
+        self.futures = []
+
+    def launch(self, create_fn, *args, **kwargs):
+        """
+        Start a launch in the background
+        :param create_fn: blocking function that creates and waits for an instance
+        :return: future resolving to whatever create_fn returns
+        """
+        # Run in a copy of the caller's context so tracing spans nest
+        future = get_clock().submit(self.executor, contextvars.copy_context().run,
+                                    create_fn, *args, **kwargs)
+        self.futures.append(future)
+        return future
+
+    def launch_many(self, create_fn, args_list):
+        """
+        Start several launches in the background
+        :param create_fn: blocking function that creates and waits for an instance
+        :param args_list: one tuple of positional arguments per launch
+        :return: list of futures, in the same order as args_list
+        """
+        return [self.launch(create_fn, *args) for args in args_list]
+
+    @staticmethod
+    def wait_all(futures):
+        """
+        Block until every launch has finished
+        :param futures: futures returned by launch()/launch_many()
+        :return: (results of the successful launches, exceptions of the failed ones)
+        """
+        get_clock().wait(futures)
+        results = [f.result() for f in futures if f.exception() is None]
+        errors = [f.exception() for f in futures if f.exception() is not None]
+        return results, errors
+
+    def shutdown(self):
+        """
+        Wait for pending launches and release the worker threads
+        :return: None
+        """
+        get_clock().wait(self.futures)
+        self.executor.shutdown(wait=True)
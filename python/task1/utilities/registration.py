@@ -0,0 +1,149 @@
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from utilities.clock import get_clock
+from utilities.lg_client import backoff_delay
+
+# Give up on a web service the LG has not accepted after this many seconds
+REGISTRATION_TIMEOUT = 600
+
+PENDING = 'pending'
+REGISTERED = 'registered'
+EXPIRED = 'expired'
+CANCELLED = 'cancelled'
+
+
+def registration_slots(boot_time, cooldown):
+    """
+    Number of web services the LG accepts from now until a batch launched
+    now is running, when a slot is open now
+    :param boot_time: seconds a launch takes until the instances run
+    :param cooldown: seconds the LG enforces between two registrations
+    :return: number of registrations, at least 1
+    """
+    return 1 + int(boot_time // cooldown)
+
+
+class RegistrationJob:
+    """
+    Submit one web service to the LG until it is accepted, backing off
+    between attempts.
+
+    The job never polls the test log itself: it stops as soon as the
+    LogTail that the controller keeps polling reports the test finished,
+    when it is cancelled, or once its deadline has passed.
+    """
+
+    def __init__(self, lg_client, instance, log_tail, timeout=REGISTRATION_TIMEOUT):
+        """
+        :param lg_client: LGClient of the load generator
+        :param instance: running WS instance object
+        :param log_tail: LogTail following the test log, polled by someone else
+        :param timeout: seconds after which to give up
+        """
+        self.lg_client = lg_client
+        self.instance = instance
+        self.log_tail = log_tail
+        self.deadline = get_clock().time() + timeout
+        self.state = PENDING
+        self.attempts = 0
+        self.registered_at = None
+        self.cancelled = threading.Event()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def stopped(self):
+        return self.cancelled.is_set() or self.log_tail.finished
+
+    def run(self):
+        """
+        Retry the registration until it succeeds, expires or is cancelled
+        :return: final state
+        """
+        clock = get_clock()
+        while not self.stopped():
+            self.attempts += 1
+            try:
+                response = self.lg_client.add_web_service(self.instance.public_dns_name)
+                if response.status_code == 200:
+                    self.registered_at = clock.time()
+                    self.state = REGISTERED
+                    return self.state
+            except (requests.exceptions.ConnectionError,
+                    requests.exceptions.Timeout):
+                pass
+            delay = backoff_delay(self.attempts - 1)
+            if clock.time() + delay > self.deadline:
+                self.state = EXPIRED
+                return self.state
+            clock.sleep(delay)
+        self.state = CANCELLED
+        return self.state
+
+
+class Registrar:
+    """
+    Run RegistrationJobs on background threads so the controller keeps
+    polling while the LG is not accepting new web services yet.
+    """
+
+    def __init__(self, lg_client, log_tail, timeout=REGISTRATION_TIMEOUT, max_workers=8):
+        """
+        :param lg_client: LGClient of the load generator
+        :param log_tail: LogTail following the test log
+        :param timeout: seconds after which a registration gives up
+        :param max_workers: maximum number of registrations in flight
+        """
+        self.lg_client = lg_client
+        self.log_tail = log_tail
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=max_workers,
+                                           thread_name_prefix='register')
+        self.jobs = []
+        self.futures = []
+        self.reported = set()
+
+    def submit(self, instance):
+        """
+        Start registering a running WS instance in the background
+        :param instance: running WS instance object
+        :return: RegistrationJob
+        """
+        job = RegistrationJob(self.lg_client, instance, self.log_tail, self.timeout)
+        # Run in a copy of the caller's context so tracing spans nest
+        self.futures.append(get_clock().submit(self.executor,
+                                               contextvars.copy_context().run, job.run))
+        self.jobs.append(job)
+        return job
+
+    def pending(self):
+        """
+        :return: number of registrations still in flight
+        """
+        return sum(1 for job in self.jobs if job.state == PENDING)
+
+    def collect(self):
+        """
+        :return: the jobs that finished since the previous call
+        """
+        finished = [job for job in self.jobs
+                    if job.state != PENDING and id(job) not in self.reported]
+        self.reported.update(id(job) for job in finished)
+        return finished
+
+    def cancel_all(self):
+        for job in self.jobs:
+            job.cancel()
+
+    def shutdown(self):
+        """
+        Cancel what is still pending and wait for the worker threads
+        :return: None
+        """
+        self.cancel_all()
+        get_clock().wait(self.futures)
+        self.executor.shutdown(wait=True)
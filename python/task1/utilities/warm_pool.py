@@ -0,0 +1,163 @@
+import threading
+
+import botocore
+
+from utilities.clock import get_clock
+
+
+class WarmPool:
+    """
+    Keep web services that have been booted once and then stopped, so a
+    scale-out only pays for starting them again instead of a cold boot.
+
+    take() hands out pooled instances and tops the pool up again in the
+    background. Every scale event served from the pool is recorded with
+    the time it took and how much faster it was than the cold boots the
+    pool measured while filling itself.
+    """
+
+    def __init__(self, create_fn, start_fn, stop_fn, size, provisioner):
+        """
+        :param create_fn: blocking function launching `count` instances and
+            returning the running ones
+        :param start_fn: blocking function starting stopped instances and
+            returning them running, with their new DNS names
+        :param stop_fn: blocking function stopping running instances
+        :param size: number of stopped instances to keep ready
+        :param provisioner: Provisioner the pool is filled on in the background
+        """
+        self.create_fn = create_fn
+        self.start_fn = start_fn
+        self.stop_fn = stop_fn
+        self.size = size
+        self.provisioner = provisioner
+        self.lock = threading.Lock()
+        self.stopped = []
+        self.filling = 0
+        self.cold_boot_times = []
+        self.events = []
+
+    def fill(self):
+        """
+        Launch, then stop, as many instances as the pool is missing
+        :return: None
+        """
+        with self.lock:
+            count = self.size - len(self.stopped) - self.filling
+            if count <= 0:
+                return
+            self.filling += count
+        # Instances launched but not pooled yet, terminated if the fill fails
+        instances = []
+        try:
+            clock = get_clock()
+            started = clock.monotonic()
+            instances = self.create_fn(count)
+            with self.lock:
+                self.cold_boot_times.append(clock.monotonic() - started)
+            self.stop_fn(instances)
+            with self.lock:
+                self.stopped.extend(instances)
+            print("Warm pool: {} WS stopped and ready".format(len(instances)))
+            instances = []
+        except (botocore.exceptions.ClientError, botocore.exceptions.WaiterError) as e:
+            # The pool is an optimization; scale-outs fall back to cold launches
+            print(f"Warm pool could not be filled: {e}")
+        finally:
+            with self.lock:
+                self.filling -= count
+            self.discard(instances)
+
+    def replenish(self):
+        """
+        Fill the pool in the background
+        :return: future of the fill
+        """
+        return self.provisioner.launch(self.fill)
+
+    def take(self, count):
+        """
+        Start up to `count` pooled instances
+        :param count: number of instances wanted
+        :return: list of running instances, fewer than count if the pool runs short
+        """
+        with self.lock:
+            instances = self.stopped[:count]
+            del self.stopped[:count]
+        if not instances:
+            return []
+        clock = get_clock()
+        started = clock.monotonic()
+        try:
+            instances = self.start_fn(instances)
+        except (botocore.exceptions.ClientError, botocore.exceptions.WaiterError) as e:
+            # In an unknown state: terminate them, the caller cold launches instead
+            print(f"Warm pool instances could not be started: {e}")
+            self.discard(instances)
+            self.replenish()
+            return []
+        except BaseException:
+            self.discard(instances)
+            raise
+        elapsed = clock.monotonic() - started
+        cold_boot = self.cold_boot_time()
+        saved = cold_boot - elapsed if cold_boot is not None else None
+        self.events.append((len(instances), elapsed, saved))
+        print("Warm pool: started {} WS in {:.1f} s{}".format(
+            len(instances), elapsed,
+            '' if saved is None else ', {:.1f} s faster than a cold boot'.format(saved)))
+        self.replenish()
+        return instances
+
+    def discard(self, instances):
+        """
+        Terminate instances that left the pool without being handed out
+        :param instances: instance objects
+        :return: None
+        """
+        for instance in instances:
+            try:
+                instance.terminate()
+                print(f"Terminated unusable pooled instance: {instance.instance_id}")
+            except botocore.exceptions.ClientError as e:
+                print(f"Could not terminate pooled instance {instance.instance_id}: {e}")
+
+    def cold_boot_time(self):
+        """
+        :return: mean seconds of the cold launches made by the pool, None before any
+        """
+        with self.lock:
+            if not self.cold_boot_times:
+                return None
+            return sum(self.cold_boot_times) / len(self.cold_boot_times)
+
+    def report(self):
+        """
+        Print the time-to-capacity of every scale event served from the pool
+        :return: None
+        """
+        cold_boot = self.cold_boot_time()
+        print("Warm pool of {} WS, cold boot {}".format(
+            self.size, '-' if cold_boot is None else '{:.1f} s'.format(cold_boot)))
+        if not self.events:
+            print("No scale event was served from the warm pool")
+            return
+        print('{:>6} {:>10} {:>10}'.format('WS', 'start s', 'saved s'))
+        for count, elapsed, saved in self.events:
+            print('{:>6} {:>10.1f} {:>10}'.format(
+                count, elapsed, '-' if saved is None else '{:.1f}'.format(saved)))
+        total = sum(saved for _, _, saved in self.events if saved is not None)
+        print("Time-to-capacity saved: {:.1f} s over {} scale events".format(
+            total, len(self.events)))
+
+    def terminate(self):
+        """
+        Terminate the instances still in the pool
+        :return: list of the terminated instance ids
+        """
+        with self.lock:
+            instances, self.stopped = self.stopped, []
+        for instance in instances:
+            instance.terminate()
+            print(f"Terminated pooled instance: {instance.instance_id}")
+        return [instance.instance_id for instance in instances]
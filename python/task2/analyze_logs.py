@@ -0,0 +1,311 @@
+"""
+Post-run analysis of MSB test logs.
+
+Parses one or more test.*.log files into columnar tables (one list per
+column, convertible to a pandas DataFrame when pandas is installed) and
+prints the runs side by side:
+
+    python analyze_logs.py test.*.log
+    python analyze_logs.py --timeline --csv runs.csv test.*.log
+
+Per run it reports the LG summary (averageRps, maxRps, pattern, ih), RPS
+per instance-hour, the capacity timeline rebuilt from the Instance-Hour
+Usage table, and how many minutes the group was over or under
+provisioned. A minute is under provisioned when every instance serves
+close to the per-instance capacity, i.e. the group is saturated, and over
+provisioned when the instances are mostly idle. Scale-out latency is the
+time from the start of a saturated stretch to the next instance launch.
+"""
+import argparse
+import csv
+import os
+from datetime import datetime
+
+from utilities.log_parser import (
+    CurrentRps, InstanceHour, MinuteSample, TestEnd, TestStart, parse_file
+)
+
+# Share of the per-instance capacity above which a minute counts as
+# saturated (under provisioned), and below which it counts as idle
+SATURATION = 0.9
+IDLE = 0.5
+
+RUN_COLUMNS = (
+    'run', 'test_type', 'pattern', 'minutes', 'average_rps', 'max_rps', 'ih',
+    'rps_per_ih', 'instances', 'peak_capacity', 'mean_capacity',
+    'instance_capacity', 'under_minutes', 'over_minutes', 'scale_outs',
+    'scale_ins', 'mean_scale_out_latency', 'max_scale_out_latency'
+)
+MINUTE_COLUMNS = ('run', 'minute', 'rps', 'capacity', 'rps_per_instance', 'state')
+
+
+class Table:
+    """
+    Column-oriented table: one list per column.
+    """
+
+    def __init__(self, columns):
+        self.columns = {name: [] for name in columns}
+
+    def __len__(self):
+        return len(next(iter(self.columns.values()), []))
+
+    def append(self, row):
+        """
+        Add a row
+        :param row: dict with a value for every column
+        :return: None
+        """
+        for name, values in self.columns.items():
+            values.append(row.get(name))
+
+    def column(self, name):
+        return self.columns[name]
+
+    def rows(self):
+        """
+        :return: list of row dicts
+        """
+        names = list(self.columns)
+        return [dict(zip(names, values)) for values in zip(*self.columns.values())]
+
+    def to_dataframe(self):
+        """
+        :return: pandas DataFrame of the table
+        """
+        import pandas
+        return pandas.DataFrame(self.columns)
+
+    def to_csv(self, path):
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(self.columns))
+            writer.writeheader()
+            writer.writerows(self.rows())
+
+
+def parse_time(value):
+    return datetime.fromisoformat(value) if value else None
+
+
+def timestamp(value):
+    return datetime.fromisoformat(value).timestamp() if value else None
+
+
+def read_run(path):
+    """
+    Collect the events of one log
+    :param path: log file
+    :return: dict with the start, end, per-minute RPS/capacity and the
+        (launch, termination) timestamps of the instance-hour rows
+    """
+    run = {
+        'run': os.path.basename(path),
+        'start': None,
+        'test_type': None,
+        'end': None,
+        'rps': {},
+        'reported_capacity': {},
+        'instances': []
+    }
+    for event in parse_file(path):
+        if isinstance(event, TestStart):
+            run['start'] = parse_time(event.start_time)
+            run['test_type'] = event.test_type
+        elif isinstance(event, CurrentRps):
+            run['rps'][event.minute] = event.rps
+        elif isinstance(event, MinuteSample) and event.instance_rps:
+            # Horizontal logs list every web service of the minute
+            run['reported_capacity'][event.minute] = len(event.instance_rps)
+        elif isinstance(event, TestEnd):
+            run['end'] = event
+        elif isinstance(event, InstanceHour):
+            run['instances'].append((timestamp(event.launch_time),
+                                     timestamp(event.termination_time)))
+    return run
+
+
+def capacity_at(instances, moment):
+    return sum(1 for launch, termination in instances
+               if launch <= moment and (termination is None or moment < termination))
+
+
+def analyze_run(path, minutes_table, saturation=SATURATION, idle=IDLE,
+                instance_capacity=None):
+    """
+    Compute the efficiency figures of one run
+    :param path: log file
+    :param minutes_table: Table the per-minute timeline is appended to
+    :param saturation: share of instance_capacity above which a minute is under provisioned
+    :param idle: share of instance_capacity below which a minute is over provisioned
+    :param instance_capacity: RPS one instance can serve, estimated from the run if None
+    :return: dict with one value per RUN_COLUMNS entry
+    """
+    run = read_run(path)
+    start, end, instances = run['start'], run['end'], run['instances']
+
+    timeline = []
+    for minute in sorted(run['rps']):
+        if minute in run['reported_capacity']:
+            capacity = run['reported_capacity'][minute]
+        elif instances and start is not None:
+            # Instances alive in the middle of the minute
+            capacity = capacity_at(instances, start.timestamp() + (minute - 0.5) * 60)
+        else:
+            capacity = None
+        rps = run['rps'][minute]
+        per_instance = rps / capacity if capacity else None
+        timeline.append((minute, rps, capacity, per_instance))
+
+    per_instance_values = [p for _, _, _, p in timeline if p is not None]
+    if instance_capacity is None and per_instance_values:
+        instance_capacity = max(per_instance_values)
+
+    under, over = [], []
+    for minute, rps, capacity, per_instance in timeline:
+        state = None
+        if per_instance is not None and instance_capacity:
+            if per_instance >= saturation * instance_capacity:
+                state = 'under'
+                under.append(minute)
+            elif per_instance <= idle * instance_capacity:
+                state = 'over'
+                over.append(minute)
+        minutes_table.append({
+            'run': run['run'], 'minute': minute, 'rps': rps, 'capacity': capacity,
+            'rps_per_instance': per_instance, 'state': state
+        })
+
+    latencies = scale_out_latencies(start, under, [launch for launch, _ in instances])
+    capacities = [c for _, _, c, _ in timeline if c is not None]
+    ih = end.ih if end else None
+    average_rps = end.average_rps if end and end.average_rps is not None else \
+        (end.rps if end else None)
+    return {
+        'run': run['run'],
+        'test_type': run['test_type'],
+        'pattern': end.pattern if end else None,
+        'minutes': len(timeline),
+        'average_rps': average_rps,
+        'max_rps': end.max_rps if end else None,
+        'ih': ih,
+        'rps_per_ih': average_rps / ih if average_rps is not None and ih else None,
+        'instances': len(instances) or None,
+        'peak_capacity': max(capacities) if capacities else None,
+        'mean_capacity': sum(capacities) / len(capacities) if capacities else None,
+        'instance_capacity': instance_capacity,
+        'under_minutes': len(under) if instance_capacity else None,
+        'over_minutes': len(over) if instance_capacity else None,
+        'scale_outs': count_changes(instances, 0),
+        'scale_ins': count_changes(instances, 1),
+        'mean_scale_out_latency': sum(latencies) / len(latencies) if latencies else None,
+        'max_scale_out_latency': max(latencies) if latencies else None
+    }
+
+
+def scale_out_latencies(start, under_minutes, launches):
+    """
+    Seconds from the start of each saturated stretch to the next launch
+    :param start: test start time
+    :param under_minutes: sorted under provisioned minutes
+    :param launches: instance launch timestamps
+    :return: list of latencies in seconds
+    """
+    if start is None or not launches:
+        return []
+    launches = sorted(launches)
+    latencies = []
+    previous = None
+    for minute in under_minutes:
+        if previous is None or minute != previous + 1:
+            stretch_start = start.timestamp() + (minute - 1) * 60
+            later = [launch for launch in launches if launch >= stretch_start]
+            if later:
+                latencies.append(later[0] - stretch_start)
+        previous = minute
+    return latencies
+
+
+def count_changes(instances, index):
+    """
+    Count distinct launch (index 0) or termination (index 1) moments,
+    i.e. scaling actions rather than instances
+    """
+    return len({times[index] for times in instances if times[index] is not None})
+
+
+def analyze(paths, saturation=SATURATION, idle=IDLE, instance_capacity=None):
+    """
+    Analyze several logs
+    :param paths: log files
+    :return: (runs Table, minutes Table)
+    """
+    runs = Table(RUN_COLUMNS)
+    minutes = Table(MINUTE_COLUMNS)
+    for path in paths:
+        runs.append(analyze_run(path, minutes, saturation, idle, instance_capacity))
+    return runs, minutes
+
+
+def format_value(value):
+    if value is None:
+        return '-'
+    if isinstance(value, float):
+        return '{:.4g}'.format(value)
+    return str(value)
+
+
+def print_side_by_side(runs):
+    """
+    Print one column per run and one row per metric
+    :param runs: runs Table
+    :return: None
+    """
+    names = runs.column('run')
+    width = max([16] + [len(name) for name in names])
+    print('{:<24}'.format('') + ''.join(' {:>{w}}'.format(n, w=width) for n in names))
+    for column in RUN_COLUMNS[1:]:
+        print('{:<24}'.format(column) + ''.join(
+            ' {:>{w}}'.format(format_value(v), w=width) for v in runs.column(column)))
+
+
+def print_timeline(minutes):
+    """
+    Print the per-minute RPS and capacity of every run
+    :param minutes: minutes Table
+    :return: None
+    """
+    print('{:<28} {:>6} {:>8} {:>8} {:>12} {:>6}'.format(
+        'run', 'minute', 'rps', 'capacity', 'rps/instance', 'state'))
+    for row in minutes.rows():
+        print('{:<28} {:>6} {:>8} {:>8} {:>12} {:>6}'.format(
+            row['run'], row['minute'], format_value(row['rps']),
+            format_value(row['capacity']), format_value(row['rps_per_instance']),
+            row['state'] or ''))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('logs', nargs='+', help='test.*.log files')
+    parser.add_argument('--timeline', action='store_true',
+                        help='also print the per-minute capacity timeline')
+    parser.add_argument('--csv', metavar='PATH',
+                        help='write the run table to a CSV file')
+    parser.add_argument('--instance-capacity', type=float,
+                        help='RPS one instance serves; estimated per run by default')
+    parser.add_argument('--saturation', type=float, default=SATURATION)
+    parser.add_argument('--idle', type=float, default=IDLE)
+    args = parser.parse_args()
+
+    runs, minutes = analyze(args.logs, args.saturation, args.idle, args.instance_capacity)
+    print_side_by_side(runs)
+    if args.timeline:
+        print()
+        print_timeline(minutes)
+    if args.csv:
+        runs.to_csv(args.csv)
+        print('Run table written to {}'.format(args.csv))
+
+
+if __name__ == '__main__':
+    main()
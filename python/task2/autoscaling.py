@@ -1,12 +1,23 @@
-import boto3
 import botocore
+import functools
+import glob
 import requests
-import time
 import json
 import re
-from datetime import datetime
 from dateutil.parser import parse
 
+from fast_scaling import FastScalingController
+from forecast import SCHEDULED, DemandForecast, PredictiveController, put_scheduled_actions
+from metrics_bridge import MetricsBridge
+from scale_in_protection import ScaleInProtection
+from stack import TAGS, build_stack, lb_zone_count, resolve
+from utilities import aws, tracing
+from utilities.clock import ScaledClock, get_clock, set_clock
+from utilities.lg_client import LGClient
+from utilities.log_mirror import LogMirror
+from utilities.log_tail import LogTail
+from utilities.task_graph import TaskGraph
+
 ########################################
 # Constants
 ########################################
@@ -16,6 +27,8 @@ with open('auto-scaling-config.json') as file:
 LOAD_GENERATOR_AMI = configuration['load_generator_ami']
 WEB_SERVICE_AMI = configuration['web_service_ami']
 INSTANCE_TYPE = configuration['instance_type']
+# Availability zones the ASG spreads over
+AVAILABILITY_ZONES = configuration['availability_zones']
 
 # Auto Scaling parameters
 ASG_MAX_SIZE = configuration['asg_max_size']
@@ -26,23 +39,46 @@ COOL_DOWN_PERIOD_SCALE_OUT = configuration['cool_down_period_scale_out']
 SCALE_OUT_ADJUSTMENT = configuration['scale_out_adjustment']
 SCALE_IN_ADJUSTMENT = configuration['scale_in_adjustment']
 ASG_DEFAULT_COOL_DOWN_PERIOD = configuration['asg_default_cool_down_period']
+# Seconds a new instance is protected from scale in once in service, 0 for no protection
+MIN_INSTANCE_LIFETIME = configuration['min_instance_lifetime']
+SCALE_IN_PROTECTION_INTERVAL = configuration['scale_in_protection_interval']
+# Instances kept pre-initialized in the ASG warm pool, 0 for no warm pool
+WARM_POOL_SIZE = configuration['warm_pool_size']
+# "Stopped", "Hibernated" or "Running"
+WARM_POOL_STATE = configuration['warm_pool_state']
 ALARM_PERIOD = configuration['alarm_period']
 CPU_LOWER_THRESHOLD = configuration['cpu_lower_threshold']
 CPU_UPPER_THRESHOLD = configuration['cpu_upper_threshold']
+# "cpu" scales on CPUUtilization; "rps" (opt-in) on the request rate per
+# instance that MetricsBridge publishes from the LG log while this script runs
+SCALING_METRIC = configuration['scaling_metric']
+METRICS_NAMESPACE = configuration['metrics_namespace']
+METRICS_FLUSH_INTERVAL = configuration['metrics_flush_interval']
+RPS_LOWER_THRESHOLD = configuration['rps_per_instance_lower_threshold']
+RPS_UPPER_THRESHOLD = configuration['rps_per_instance_upper_threshold']
 ALARM_EVALUATION_PERIODS_SCALE_OUT = configuration['alarm_evaluation_periods_scale_out']
 ALARM_EVALUATION_PERIODS_SCALE_IN = configuration['alarm_evaluation_periods_scale_in']
 AUTO_SCALING_TARGET_GROUP = configuration['auto_scaling_target_group']
 LOAD_BALANCER_NAME = configuration['load_balancer_name']
 LAUNCH_TEMPLATE_NAME = configuration['launch_template_name']
 AUTO_SCALING_GROUP_NAME = configuration['auto_scaling_group_name']
-
-########################################
-# Tags
-########################################
-tag_pairs = [
-    ("Project", "vm-scaling"),
-]
-TAGS = [{'Key': k, 'Value': v} for k, v in tag_pairs]
+# host:port of utilities/lg_simulator.py for offline runs, null for AWS
+LG_BASE_URL = configuration['lg_base_url']
+# Run the controller this many times faster than real time (offline runs)
+CLOCK_SPEEDUP = configuration['clock_speedup']
+# "mode" null for reactive scaling only, "scheduled" or "controller" to
+# also set the minimum size from the demand of the "history" logs
+PREDICTIVE_SCALING = configuration['predictive_scaling']
+# Set the desired capacity from the LG RPS and the target health in
+# process, with the alarms as a safety net
+FAST_SCALING = configuration['fast_scaling']
+# Seconds between two fsyncs of the local log mirror
+LOG_FSYNC_INTERVAL = configuration['log_fsync_interval']
+# "binary" or "parquet" to write the parsed samples next to the mirror, null for none
+LOG_SIDECAR = configuration['log_sidecar']
+# JSONL file the phase/call trace is exported to at exit, null to skip
+TRACE_FILE = configuration['trace_file']
+SIMULATED_ELB_DNS = 'simulated-elb.local'
 
 TEST_NAME_REGEX = r'name=(.*log)'
 
@@ -56,10 +92,8 @@ resources = {
     'tg_arn': None,
     'sg1_id': None,
     'sg2_id': None,
-    'scale_out_policy_arn': None,
-    'scale_in_policy_arn': None,
-    'scale_out_alarm_name': None,
-    'scale_in_alarm_name': None
+    'policy_arns': [],
+    'alarm_names': []
 }
 
 ########################################
@@ -67,6 +101,7 @@ resources = {
 ########################################
 
 
+@tracing.traced()
 def create_instance(ami, sg_id):
     """
     Given AMI, create and return an AWS EC2 instance object
@@ -74,24 +109,11 @@ def create_instance(ami, sg_id):
     :param sg_id: ID of the security group to be attached to instance
     :return: instance object
     """
-    ec2 = boto3.resource('ec2', region_name='us-east-1')
-    
-    # Get default subnet for availability zone us-east-1a for consistency
-    ec2_client = boto3.client('ec2', region_name='us-east-1')
-    subnets = ec2_client.describe_subnets(
-        Filters=[
-            {'Name': 'default-for-az', 'Values': ['true']},
-            {'Name': 'availability-zone', 'Values': ['us-east-1a']}
-        ]
-    )
-    
-    if not subnets['Subnets']:
-        # Fallback to any default subnet
-        subnets = ec2_client.describe_subnets(
-            Filters=[{'Name': 'default-for-az', 'Values': ['true']}]
-        )
+    ec2 = aws.get_resource('ec2')
     
-    subnet_id = subnets['Subnets'][0]['SubnetId']
+    # Get default subnet for availability zone us-east-1a for consistency,
+    # falling back to any default subnet
+    subnet_id = aws.default_subnet_id('us-east-1a')
     
     # Launch instance
     instances = ec2.create_instances(
@@ -125,48 +147,30 @@ def create_instance(ami, sg_id):
     return instance
 
 
-def initialize_test(load_generator_dns, first_web_service_dns):
+@tracing.traced()
+def initialize_test(lg_client, first_web_service_dns):
     """
     Start the auto scaling test
-    :param lg_dns: Load Generator DNS
+    :param lg_client: LGClient of the Load Generator
     :param first_web_service_dns: Web service DNS
     :return: Log file name
     """
-
-    add_ws_string = 'http://{}/autoscaling?dns={}'.format(
-        load_generator_dns, first_web_service_dns
-    )
-    response = None
-    while not response or response.status_code != 200:
-        try:
-            response = requests.get(add_ws_string)
-        except requests.exceptions.ConnectionError:
-            time.sleep(1)
-            pass 
+    response = lg_client.start_autoscaling_test(first_web_service_dns)
 
     # Extract test log name from response
     log_name = get_test_id(response)
     return log_name
 
 
-def initialize_warmup(load_generator_dns, load_balancer_dns):
+@tracing.traced()
+def initialize_warmup(lg_client, load_balancer_dns):
     """
     Start the warmup test
-    :param lg_dns: Load Generator DNS
+    :param lg_client: LGClient of the Load Generator
     :param load_balancer_dns: Load Balancer DNS
     :return: Log file name
     """
-
-    add_ws_string = 'http://{}/warmup?dns={}'.format(
-        load_generator_dns, load_balancer_dns
-    )
-    response = None
-    while not response or response.status_code != 200:
-        try:
-            response = requests.get(add_ws_string)
-        except requests.exceptions.ConnectionError:
-            time.sleep(1)
-            pass  
+    response = lg_client.start_warmup(load_balancer_dns)
 
     # Extract test log name from response
     log_name = get_test_id(response)
@@ -203,200 +207,356 @@ def destroy_resources():
     :return: None
     """
     print_section('Destroying Resources')
-    
-    ec2_client = boto3.client('ec2', region_name='us-east-1')
-    elb_client = boto3.client('elbv2', region_name='us-east-1')
-    asg_client = boto3.client('autoscaling', region_name='us-east-1')
-    cw_client = boto3.client('cloudwatch', region_name='us-east-1')
-    
-    try:
-        # Step 1: Delete CloudWatch alarms
-        print("Step 1: Deleting CloudWatch alarms...")
-        if resources['scale_out_alarm_name']:
-            try:
-                cw_client.delete_alarms(AlarmNames=[resources['scale_out_alarm_name']])
-                print(f"  Deleted CloudWatch alarm: {resources['scale_out_alarm_name']}")
-            except Exception as e:
-                print(f"  Error deleting scale out alarm: {e}")
-        
-        if resources['scale_in_alarm_name']:
-            try:
-                cw_client.delete_alarms(AlarmNames=[resources['scale_in_alarm_name']])
-                print(f"  Deleted CloudWatch alarm: {resources['scale_in_alarm_name']}")
-            except Exception as e:
-                print(f"  Error deleting scale in alarm: {e}")
-        
-        # Step 2: Update ASG to 0 instances and wait for termination
-        if resources['asg_name']:
-            print("Step 2: Updating ASG to 0 instances...")
-            try:
-                # Update ASG to have 0 instances
-                asg_client.update_auto_scaling_group(
-                    AutoScalingGroupName=resources['asg_name'],
-                    MinSize=0,
-                    MaxSize=0,
-                    DesiredCapacity=0
-                )
-                
-                # Step 3: Delete ASG
-                print("Step 3: Deleting Auto Scaling Group...")
-                asg_client.delete_auto_scaling_group(
-                    AutoScalingGroupName=resources['asg_name'],
-                    ForceDelete=True
-                )
-                print(f"  Deleted Auto Scaling Group: {resources['asg_name']}")
-                
-            except Exception as e:
-                print(f"  Error with ASG operations: {e}")
-        
-        # Step 4: Delete Load Balancer listeners
-        if resources['lb_arn']:
-            print("Step 4: Deleting Load Balancer listeners...")
-            try:
-                listeners = elb_client.describe_listeners(LoadBalancerArn=resources['lb_arn'])
-                for listener in listeners['Listeners']:
-                    elb_client.delete_listener(ListenerArn=listener['ListenerArn'])
-                    print(f"  Deleted listener: {listener['ListenerArn']}")
-            except Exception as e:
-                print(f"  Error deleting listeners: {e}")
-            
-            # Step 5: Delete Load Balancer and wait for full deletion
-            print("Step 5: Deleting Load Balancer...")
-            try:
-                elb_client.delete_load_balancer(LoadBalancerArn=resources['lb_arn'])
-                print(f"  Initiated deletion of Load Balancer")
-                
-                # Wait for Load Balancer to be fully deleted
-                print("  Waiting for Load Balancer to be fully deleted...")
-                waiter = elb_client.get_waiter('load_balancers_deleted')
-                waiter.wait(
-                    LoadBalancerArns=[resources['lb_arn']],
-                    WaiterConfig={'Delay': 15, 'MaxAttempts': 40}
-                )
-                print("  Load Balancer fully deleted")
-            except Exception as e:
-                print(f"  Error deleting Load Balancer: {e}")
-        
-        # Step 6: Wait for Target Group targets to deregister
-        if resources['tg_arn']:
-            print("Step 6: Waiting for Target Group targets to deregister...")
-            try:
-                max_wait_time = 200 
-                start_time = time.time()
-                
-                while time.time() - start_time < max_wait_time:
-                    response = elb_client.describe_target_health(TargetGroupArn=resources['tg_arn'])
-                    targets = response.get('TargetHealthDescriptions', [])
-                    if not targets:
-                        print("  All targets deregistered")
-                        break
-                    print(f"    Still waiting... {len(targets)} targets remaining")
-                    time.sleep(10)
-                else:
-                    print("  Warning: Timeout waiting for targets to deregister")
-                
-                # Step 7: Delete Target Group
-                print("Step 7: Deleting Target Group...")
-                elb_client.delete_target_group(TargetGroupArn=resources['tg_arn'])
-                print(f"  Deleted Target Group")
-            except Exception as e:
-                print(f"  Error with Target Group operations: {e}")
-        
-        # Step 8: Delete Launch Template
+
+    ec2_client = aws.get_client('ec2')
+    elb_client = aws.get_client('elbv2')
+    asg_client = aws.get_client('autoscaling')
+    cw_client = aws.get_client('cloudwatch')
+
+    def delete_alarms():
+        alarm_names = resources['alarm_names']
+        if alarm_names:
+            cw_client.delete_alarms(AlarmNames=alarm_names)
+            print(f"  Deleted CloudWatch alarms: {', '.join(alarm_names)}")
+
+    def delete_asg():
+        if not resources['asg_name']:
+            return
+        # ForceDelete terminates the instances together with the group
+        asg_client.delete_auto_scaling_group(
+            AutoScalingGroupName=resources['asg_name'],
+            ForceDelete=True
+        )
+        print(f"  Deleting Auto Scaling Group: {resources['asg_name']}")
+
+        def asg_gone():
+            groups = asg_client.describe_auto_scaling_groups(
+                AutoScalingGroupNames=[resources['asg_name']]
+            )
+            return not groups['AutoScalingGroups']
+
+        aws.wait_until(asg_gone, timeout=900, interval=10,
+                       description='Auto Scaling Group deletion')
+        print(f"  Deleted Auto Scaling Group: {resources['asg_name']}")
+
+    def delete_launch_template():
         if resources['lt_id']:
-            print("Step 8: Deleting Launch Template...")
-            try:
-                ec2_client.delete_launch_template(LaunchTemplateId=resources['lt_id'])
-                print(f"  Deleted Launch Template: {resources['lt_name']}")
-            except Exception as e:
-                print(f"  Error deleting Launch Template: {e}")
-        
-        # Step 9: Terminate Load Generator
-        if resources['lg_instance_id']:
-            print("Step 9: Terminating Load Generator instance...")
+            ec2_client.delete_launch_template(LaunchTemplateId=resources['lt_id'])
+            print(f"  Deleted Launch Template: {resources['lt_name']}")
+
+    def delete_load_balancer():
+        if not resources['lb_arn']:
+            return
+        listeners = elb_client.describe_listeners(LoadBalancerArn=resources['lb_arn'])
+        for listener in listeners['Listeners']:
+            elb_client.delete_listener(ListenerArn=listener['ListenerArn'])
+            print(f"  Deleted listener: {listener['ListenerArn']}")
+        elb_client.delete_load_balancer(LoadBalancerArn=resources['lb_arn'])
+        aws.wait_for(
+            elb_client, 'load_balancers_deleted',
+            LoadBalancerArns=[resources['lb_arn']],
+            WaiterConfig={'Delay': 5, 'MaxAttempts': 120}
+        )
+        print("  Load Balancer fully deleted")
+
+    def delete_target_group():
+        if resources['tg_arn']:
+            elb_client.delete_target_group(TargetGroupArn=resources['tg_arn'])
+            print("  Deleted Target Group")
+
+    def terminate_load_generator():
+        if not resources['lg_instance_id']:
+            return
+        ec2_client.terminate_instances(InstanceIds=[resources['lg_instance_id']])
+        aws.wait_for(
+            ec2_client, 'instance_terminated',
+            InstanceIds=[resources['lg_instance_id']],
+            WaiterConfig={'Delay': 5, 'MaxAttempts': 120}
+        )
+        print(f"  Load Generator terminated: {resources['lg_instance_id']}")
+
+    def delete_security_group(key, sg_name):
+        sg_id = resources[key]
+        if not sg_id:
+            return
+        # Terminated instances and deleted ELBs release their network
+        # interfaces asynchronously; the group is deletable once they are gone
+        try:
+            aws.wait_until(lambda: aws.network_interface_count(sg_id) == 0,
+                           timeout=300, interval=5,
+                           description=f'network interfaces of {sg_id} to detach')
+        except TimeoutError as e:
+            print(f"  Warning: {e}, trying to delete {sg_name} anyway")
+
+        def try_delete():
             try:
-                ec2_client.terminate_instances(InstanceIds=[resources['lg_instance_id']])
-                print(f"  Initiated termination of Load Generator: {resources['lg_instance_id']}")
-                
-                # Wait for instance to terminate
-                waiter = ec2_client.get_waiter('instance_terminated')
-                waiter.wait(
-                    InstanceIds=[resources['lg_instance_id']],
-                    WaiterConfig={'Delay': 15, 'MaxAttempts': 40}
-                )
-                print("  Load Generator terminated")
-            except Exception as e:
-                print(f"  Error terminating Load Generator: {e}")
-        
-        # sg1_id is for Load Generator (non-LB)
-        # sg2_id is for ASG and ELB (LB-associated)
-        print(f"  Non-LB security group (Load Generator): {resources['sg1_id']}")
-        print(f"  LB-associated security group (ASG/ELB): {resources['sg2_id']}")
-        
-        # Wait a bit for resources to fully clean up
-        print("Waiting for network interfaces to detach...")
-        time.sleep(100)
-        
-        # Simple retry function for security group deletion
-        def delete_sg_with_retry(sg_id, sg_name, max_retries=5, wait_time=30):
-            """Try to delete security group with retries"""
-            for attempt in range(max_retries):
-                try:
-                    ec2_client.delete_security_group(GroupId=sg_id)
-                    print(f"  Deleted {sg_name}: {sg_id}")
-                    return True
-                except botocore.exceptions.ClientError as e:
-                    if attempt < max_retries - 1:
-                        print(f"  Attempt {attempt + 1}/{max_retries} failed. Waiting {wait_time}s before retry...")
-                        time.sleep(wait_time)
-                    else:
-                        print(f"  Failed to delete {sg_name} after {max_retries} attempts: {e}")
-                        return False
-        
-        # Step 11: Delete non-LB security group first (sg1 - Load Generator)
-        if resources['sg1_id']:
-            print("Step 11: Deleting non-LB security group (Load Generator)...")
-            delete_sg_with_retry(resources['sg1_id'], "Load Generator Security Group", max_retries=3, wait_time=20)
-        
-        # Step 12: Delete LB-associated security group last (sg2 - ASG/ELB)
-        if resources['sg2_id']:
-            print("Step 13: Deleting LB-associated security group (ASG/ELB)...")
-            # ELB security group may need more retries and longer wait
-            delete_sg_with_retry(resources['sg2_id'], "ASG/ELB Security Group", max_retries=6, wait_time=30)
-        
+                ec2_client.delete_security_group(GroupId=sg_id)
+                return True
+            except botocore.exceptions.ClientError as e:
+                # Detached interfaces can take a moment to stop counting
+                if e.response['Error']['Code'] == 'DependencyViolation':
+                    return False
+                raise
+
+        aws.wait_until(try_delete, timeout=120, interval=5,
+                       description=f'{sg_name} to become deletable')
+        print(f"  Deleted {sg_name}: {sg_id}")
+
+    # Resource dependencies:
+    #   alarms -> ASG -> launch template
+    #   listeners -> load balancer, ASG -> target group
+    #   load generator -> sg1 (Load Generator)
+    #   ASG + load balancer -> sg2 (ASG/ELB)
+    # Branches that do not depend on each other are deleted concurrently.
+    graph = TaskGraph(skip_dependents_on_error=False)
+    graph.add('delete_alarms', delete_alarms)
+    graph.add('delete_asg', delete_asg, deps=['delete_alarms'])
+    graph.add('delete_launch_template', delete_launch_template, deps=['delete_asg'])
+    graph.add('delete_load_balancer', delete_load_balancer)
+    graph.add('delete_target_group', delete_target_group,
+              deps=['delete_load_balancer', 'delete_asg'])
+    graph.add('terminate_load_generator', terminate_load_generator)
+    graph.add('delete_sg1', lambda: delete_security_group(
+        'sg1_id', 'Load Generator Security Group'), deps=['terminate_load_generator'])
+    graph.add('delete_sg2', lambda: delete_security_group(
+        'sg2_id', 'ASG/ELB Security Group'), deps=['delete_asg', 'delete_load_balancer'])
+    graph.run()
+
+    print()
+    graph.print_timings()
+    if graph.errors:
+        print("\nResource cleanup finished with errors in: {}".format(
+            ', '.join(graph.errors)))
+    else:
         print("\nResource cleanup completed successfully!")
-        
-    except Exception as e:
-        print(f"Unexpected error during resource cleanup: {e}")
-        import traceback
-        traceback.print_exc()
+
+
+def report_scale_out_latency():
+    """
+    Print how long every instance launch of the ASG took, and how much
+    time-to-capacity the launches served from the warm pool saved over the
+    mean cold launch
+    :return: None
+    """
+    asg_client = aws.get_client('autoscaling')
+    paginator = asg_client.get_paginator('describe_scaling_activities')
+    launches = []
+    for page in paginator.paginate(AutoScalingGroupName=AUTO_SCALING_GROUP_NAME):
+        for activity in page['Activities']:
+            description = activity['Description']
+            # Instances launched to fill the pool are not scale-outs
+            if not description.startswith('Launching') or 'into warm pool' in description \
+                    or 'EndTime' not in activity:
+                continue
+            duration = (activity['EndTime'] - activity['StartTime']).total_seconds()
+            launches.append((activity['StartTime'], 'from warm pool' in description, duration))
+    launches.sort()
+
+    cold = [duration for _, warm, duration in launches if not warm]
+    cold_mean = sum(cold) / len(cold) if cold else None
+    print('{:<26} {:>6} {:>10} {:>10}'.format('launch', 'source', 'seconds', 'saved s'))
+    saved_total = 0.0
+    for start, warm, duration in launches:
+        saved = cold_mean - duration if warm and cold_mean is not None else None
+        saved_total += saved or 0.0
+        print('{:<26} {:>6} {:>10.1f} {:>10}'.format(
+            start.isoformat(timespec='seconds'), 'warm' if warm else 'cold', duration,
+            '-' if saved is None else '{:.1f}'.format(saved)))
+    warm_count = sum(1 for _, warm, _ in launches if warm)
+    print("Warm pool served {} of {} launches, saving {:.1f} s of time-to-capacity".format(
+        warm_count, len(launches), saved_total))
+
+
+def create_metrics_bridge():
+    """
+    Create the bridge publishing the LG request rate for the "rps" scaling metric
+    :return: MetricsBridge, or None when scaling on CPU
+    """
+    if SCALING_METRIC != 'rps':
+        return None
+    asg_client = aws.get_client('autoscaling')
+
+    def in_service_instances():
+        groups = asg_client.describe_auto_scaling_groups(
+            AutoScalingGroupNames=[AUTO_SCALING_GROUP_NAME]
+        )['AutoScalingGroups']
+        if not groups:
+            return 0
+        # Capacity units of a mixed instances group, so the per-instance
+        # thresholds apply per unit
+        return sum(int(instance.get('WeightedCapacity', 1))
+                   for instance in groups[0]['Instances']
+                   if instance['LifecycleState'] == 'InService')
+
+    return MetricsBridge(
+        aws.get_client('cloudwatch'),
+        namespace=METRICS_NAMESPACE,
+        dimensions=[{'Name': 'AutoScalingGroupName', 'Value': AUTO_SCALING_GROUP_NAME}],
+        capacity_fn=in_service_instances,
+        flush_interval=METRICS_FLUSH_INTERVAL
+    )
+
+
+def create_demand_forecast():
+    """
+    Learn the demand of past auto scaling tests for predictive scaling
+    :return: DemandForecast, or None when predictive scaling is off
+    """
+    if not PREDICTIVE_SCALING['mode']:
+        return None
+    paths = sorted(glob.glob(PREDICTIVE_SCALING['history']))
+    forecast = DemandForecast.learn(paths, PREDICTIVE_SCALING['instance_capacity'],
+                                    headroom=PREDICTIVE_SCALING['headroom'],
+                                    lead_minutes=PREDICTIVE_SCALING['lead_minutes'])
+    print("Predictive scaling ({}) from {} pattern(s) of {} log(s), {:.2f} RPS per instance".format(
+        PREDICTIVE_SCALING['mode'], len(forecast.curves), len(paths), forecast.instance_capacity))
+    return forecast
+
+
+def start_predictive_scaling(forecast, log_tail):
+    """
+    Drive the minimum size of the ASG from the forecast during the auto
+    scaling test that just started
+    :param forecast: DemandForecast, or None
+    :param log_tail: LogTail of the auto scaling test
+    :return: PredictiveController to tick, or None
+    """
+    if forecast is None:
+        return None
+    asg_client = aws.get_client('autoscaling')
+    if PREDICTIVE_SCALING['mode'] == SCHEDULED:
+        put_scheduled_actions(asg_client, AUTO_SCALING_GROUP_NAME, forecast,
+                              ASG_MIN_SIZE, ASG_MAX_SIZE)
+        return None
+    return PredictiveController(asg_client, AUTO_SCALING_GROUP_NAME, forecast,
+                                ASG_MIN_SIZE, ASG_MAX_SIZE).attach(log_tail)
+
+
+def start_scale_in_protection():
+    """
+    Start lifting the scale-in protection of instances that served MIN_INSTANCE_LIFETIME
+    :return: ScaleInProtection to tick, or None when disabled or offline
+    """
+    if not MIN_INSTANCE_LIFETIME or not resources['asg_name']:
+        return None
+    return ScaleInProtection(aws.get_client('autoscaling'), AUTO_SCALING_GROUP_NAME,
+                             MIN_INSTANCE_LIFETIME, SCALE_IN_PROTECTION_INTERVAL)
+
+
+def start_fast_scaling(log_tail):
+    """
+    Start the in-process scaling controller for the auto scaling test
+    :param log_tail: LogTail of the auto scaling test
+    :return: FastScalingController to tick, or None when disabled or offline
+    """
+    if not FAST_SCALING['enabled'] or not resources['asg_name']:
+        return None
+    controller = FastScalingController(
+        aws.get_client('autoscaling'),
+        aws.get_client('elbv2'),
+        AUTO_SCALING_GROUP_NAME,
+        resources['tg_arn'],
+        RPS_LOWER_THRESHOLD,
+        RPS_UPPER_THRESHOLD,
+        interval=FAST_SCALING['interval'],
+        max_step_out=FAST_SCALING['max_step_out'],
+        scale_out_cooldown=FAST_SCALING['scale_out_cooldown'],
+        scale_in_delay=FAST_SCALING['scale_in_delay'],
+        scale_in_cooldown=FAST_SCALING['scale_in_cooldown']
+    )
+    return controller.attach(log_tail)
 
 
 def print_section(msg):
     """
-    Print a section separator including given message
+    Print a section separator including given message and start the
+    trace phase of that name
     :param msg: message
     :return: None
     """
     print(('#' * 40) + '\n# ' + msg + '\n' + ('#' * 40))
+    tracing.phase(msg)
 
 
-def is_test_complete(load_generator_dns, log_name):
+def mirror_log(log_tail):
+    """
+    Keep a local copy of the test log for submission and monitoring
+    :param log_tail: LogTail of the test, before its first poll
+    :return: LogMirror appending to a file named after the log
+    """
+    return LogMirror(log_tail.log_name, LOG_FSYNC_INTERVAL,
+                     LOG_SIDECAR).attach(log_tail)
+
+
+@tracing.traced('poll')
+def is_test_complete(log_tail):
     """
     Check if auto scaling test is complete
-    :param load_generator_dns: lg dns
-    :param log_name: log file name
+    :param log_tail: LogTail following the test log
     :return: True if Auto Scaling test is complete and False otherwise.
     """
-    log_string = 'http://{}/log?name={}'.format(load_generator_dns, log_name)
+    try:
+        log_tail.poll()
+    except (requests.exceptions.ConnectionError,
+            requests.exceptions.Timeout,
+            requests.exceptions.HTTPError) as e:
+        # A slow, unreachable or failing LG must not kill the control loop
+        print(f"Log poll failed, retrying next tick: {e}")
+        return log_tail.finished
+
+    return log_tail.finished
+
 
-    # creates a log file for submission and monitoring
-    f = open(log_name + ".log", "w")
-    log_text = requests.get(log_string).text
-    f.write(log_text)
-    f.close()
+def run_tests(lg_dns, lb_dns, metrics_bridge=None, forecast=None):
+    """
+    Run the warmup test and then the auto scaling test against the ELB
+    :param lg_dns: load generator DNS
+    :param lb_dns: load balancer DNS
+    :param metrics_bridge: MetricsBridge publishing both tests' request rate, or None
+    :param forecast: DemandForecast for predictive scaling, or None
+    :return: None
+    """
+    print_section('10. Submit ELB DNS to LG, starting warm up test.')
+    lg_client = LGClient(lg_dns)
+    protection = start_scale_in_protection()
+    warmup_log_name = initialize_warmup(lg_client, lb_dns)
+    warmup_log_tail = LogTail(lg_client, warmup_log_name)
+    warmup_mirror = mirror_log(warmup_log_tail)
+    if metrics_bridge:
+        metrics_bridge.attach(warmup_log_tail).start()
+    try:
+        while not is_test_complete(warmup_log_tail):
+            if protection:
+                protection.tick()
+            get_clock().sleep(1)
+    finally:
+        warmup_mirror.close()
 
-    return '[Test finished]' in log_text
+    print_section('11. Submit ELB DNS to LG, starting auto scaling test.')
+    # May take a few minutes to start actual test after warm up test finishes
+    log_name = initialize_test(lg_client, lb_dns)
+    log_tail = LogTail(lg_client, log_name)
+    mirror = mirror_log(log_tail)
+    if metrics_bridge:
+        metrics_bridge.attach(log_tail)
+    controller = start_predictive_scaling(forecast, log_tail)
+    fast_scaling = start_fast_scaling(log_tail)
+    try:
+        while not is_test_complete(log_tail):
+            if controller:
+                controller.tick()
+            if fast_scaling:
+                fast_scaling.tick()
+            if protection:
+                protection.tick()
+            get_clock().sleep(1)
+    finally:
+        mirror.close()
+    if fast_scaling:
+        fast_scaling.report()
+    lg_client.print_stats()
+    if metrics_bridge:
+        metrics_bridge.close()
 
 
 ########################################
@@ -415,7 +575,19 @@ def main():
     #   - Initialize Autoscaling Test
     #   - Terminate Resources
 
-    print_section('1 - create two security groups')
+    if CLOCK_SPEEDUP != 1:
+        set_clock(ScaledClock(CLOCK_SPEEDUP))
+
+    if LG_BASE_URL:
+        # Offline run against the LG simulator, no AWS resources needed
+        run_tests(LG_BASE_URL, SIMULATED_ELB_DNS)
+        tracing.finish(TRACE_FILE)
+        return
+
+    # Fails before provisioning when there is no history to learn from
+    forecast = create_demand_forecast()
+
+    print_section('Provisioning the stack')
 
     PERMISSIONS = [
         {'IpProtocol': 'tcp',
@@ -426,20 +598,40 @@ def main():
          }
     ]
 
-    # Create EC2 client
-    ec2_client = boto3.client('ec2', region_name='us-east-1')
-    
-    # Get the default VPC
-    vpcs = ec2_client.describe_vpcs(Filters=[{'Name': 'is-default', 'Values': ['true']}])
-    vpc_id = vpcs['Vpcs'][0]['VpcId']
-    
+    ec2_client = aws.get_client('ec2')
+    elb_client = aws.get_client('elbv2')
+    asg_client = aws.get_client('autoscaling')
+    cw_client = aws.get_client('cloudwatch')
+
+    # Every step below is a node of the stack graph; its return value is
+    # read by the steps depending on it through graph.result()
+    graph = TaskGraph()
+    result = graph.result
+
+    # The boto3 calls of the scaling stack, shared with the Terraform
+    # emitter of stack.py
+    stack = build_stack(configuration)
+
+    def stack_ref(name):
+        # Ref placeholders name the graph step creating the resource
+        if name == 'vpc':
+            return aws.default_vpc_id()
+        if name == 'lb_subnets':
+            return lb_subnet_ids()
+        if name == 'asg_subnets':
+            # Several capacity pools to launch from; all are zones of the ELB
+            return ','.join(lb_subnet_ids()[:AVAILABILITY_ZONES])
+        if name == 'load_balancer_arn':
+            return resources['lb_arn']
+        return result(name)
+
     # Create security groups
     def create_security_group(name, description):
         try:
             response = ec2_client.create_security_group(
                 GroupName=name,
                 Description=description,
-                VpcId=vpc_id,
+                VpcId=aws.default_vpc_id(),
                 TagSpecifications=[{'ResourceType': 'security-group', 'Tags': TAGS}]
             )
             sg_id = response['GroupId']
@@ -452,286 +644,151 @@ def main():
             return sg_id
         except botocore.exceptions.ClientError as e:
             if e.response['Error']['Code'] == 'InvalidGroup.Duplicate':
-                sgs = ec2_client.describe_security_groups(
-                    Filters=[{'Name': 'group-name', 'Values': [name]}]
-                )
-                sg_id = sgs['SecurityGroups'][0]['GroupId']
+                sg_id = aws.security_group_id(name)
                 print(f"Using existing {name}: {sg_id}")
                 return sg_id
             raise e
-    
-    sg1_id = create_security_group('AutoScalingLGSecGroup', 'Load Generator security group')
-    sg2_id = create_security_group('AutoScalingASGSecGroup', 'ASG and ELB security group')
-    
-    resources['sg1_id'] = sg1_id
-    resources['sg2_id'] = sg2_id
-
-    print_section('2 - create LG')
-
-    # Create Load Generator instance
-    lg = create_instance(LOAD_GENERATOR_AMI, sg1_id)
-    lg_id = lg.instance_id
-    lg_dns = lg.public_dns_name
-    resources['lg_instance_id'] = lg_id
-    print("Load Generator running: id={} dns={}".format(lg_id, lg_dns))
-
-    print_section('3. Create LT (Launch Template)')
-    
-    # Create Launch Template
-    lt_response = ec2_client.create_launch_template(
-        LaunchTemplateName=LAUNCH_TEMPLATE_NAME,
-        LaunchTemplateData={
-            'ImageId': WEB_SERVICE_AMI,
-            'InstanceType': INSTANCE_TYPE,
-            'SecurityGroupIds': [sg2_id],
-            'Monitoring': {
-                'Enabled': True
-            },
-            'TagSpecifications': [
-                {
-                    'ResourceType': 'instance',
-                    'Tags': TAGS
-                },
-                {
-                    'ResourceType': 'volume',
-                    'Tags': TAGS
-                }
-            ]
-        },
-        TagSpecifications=[
-            {
-                'ResourceType': 'launch-template',
-                'Tags': TAGS
-            }
-        ]
-    )
-    lt_id = lt_response['LaunchTemplate']['LaunchTemplateId']
-    lt_name = lt_response['LaunchTemplate']['LaunchTemplateName']
-    resources['lt_id'] = lt_id
-    resources['lt_name'] = lt_name
-    print(f"Created Launch Template: {lt_name} (ID: {lt_id})")
-
-    print_section('4. Create TG (Target Group)')
-    
-    # Create Target Group
-    elb_client = boto3.client('elbv2', region_name='us-east-1')
-    
-    tg_response = elb_client.create_target_group(
-        Name=AUTO_SCALING_TARGET_GROUP,
-        Protocol='HTTP',
-        Port=80,
-        VpcId=vpc_id,
-        HealthCheckEnabled=True,
-        HealthCheckProtocol='HTTP',
-        HealthCheckPort='80',
-        HealthCheckPath='/',
-        HealthCheckIntervalSeconds=30,
-        HealthCheckTimeoutSeconds=5,
-        HealthyThresholdCount=2,
-        UnhealthyThresholdCount=3,
-        TargetType='instance',
-        Tags=TAGS
-    )
-    tg_arn = tg_response['TargetGroups'][0]['TargetGroupArn']
-    resources['tg_arn'] = tg_arn
-    print(f"Created Target Group: {AUTO_SCALING_TARGET_GROUP} (ARN: {tg_arn})")
-
-    print_section('5. Create ELB (Elastic/Application Load Balancer)')
-
-    # Get subnets for the Load Balancer (need at least 2 availability zones)
-    subnets_response = ec2_client.describe_subnets(
-        Filters=[
-            {'Name': 'vpc-id', 'Values': [vpc_id]},
-            {'Name': 'default-for-az', 'Values': ['true']}
-        ]
-    )
-    subnet_ids = [subnet['SubnetId'] for subnet in subnets_response['Subnets']]
-    # Use at least 2 subnets for ALB
-    subnet_ids = subnet_ids[:2] if len(subnet_ids) >= 2 else subnet_ids
-
-    # Create Application Load Balancer
-    lb_response = elb_client.create_load_balancer(
-        Name=LOAD_BALANCER_NAME,
-        Subnets=subnet_ids,
-        SecurityGroups=[sg2_id],
-        Scheme='internet-facing',
-        Tags=TAGS,
-        Type='application',
-        IpAddressType='ipv4'
-    )
-    lb_arn = lb_response['LoadBalancers'][0]['LoadBalancerArn']
-    lb_dns = lb_response['LoadBalancers'][0]['DNSName']
-    resources['lb_arn'] = lb_arn
-    print("lb started. ARN={}, DNS={}".format(lb_arn, lb_dns))
-
-    print_section('6. Associate ELB with target group')
-    
-    # Create listener to associate ELB with Target Group
-    listener_response = elb_client.create_listener(
-        LoadBalancerArn=lb_arn,
-        Protocol='HTTP',
-        Port=80,
-        DefaultActions=[
-            {
-                'Type': 'forward',
-                'TargetGroupArn': tg_arn
-            }
-        ]
-    )
-    print(f"Created listener to forward traffic from ELB to Target Group")
-
-    print_section('7. Create ASG (Auto Scaling Group)')
-    
-    # Create Auto Scaling Group
-    asg_client = boto3.client('autoscaling', region_name='us-east-1')
-    
-    # Use the first subnet for ASG (single AZ for better performance)
-    asg_subnet = subnets_response['Subnets'][0]['SubnetId']
-    
-    asg_response = asg_client.create_auto_scaling_group(
-        AutoScalingGroupName=AUTO_SCALING_GROUP_NAME,
-        LaunchTemplate={
-            'LaunchTemplateId': lt_id,
-            'Version': '$Latest'
-        },
-        MinSize=ASG_MIN_SIZE,
-        MaxSize=ASG_MAX_SIZE,
-        DesiredCapacity=ASG_MIN_SIZE,
-        DefaultCooldown=ASG_DEFAULT_COOL_DOWN_PERIOD,
-        HealthCheckType='EC2',
-        HealthCheckGracePeriod=HEALTH_CHECK_GRACE_PERIOD,
-        VPCZoneIdentifier=asg_subnet,
-        TargetGroupARNs=[tg_arn],
-        Tags=[
-            {
-                'Key': tag['Key'],
-                'Value': tag['Value'],
-                'PropagateAtLaunch': True,
-                'ResourceId': AUTO_SCALING_GROUP_NAME,
-                'ResourceType': 'auto-scaling-group'
-            } for tag in TAGS
-        ]
-    )
-    resources['asg_name'] = AUTO_SCALING_GROUP_NAME
-    print(f"Created Auto Scaling Group: {AUTO_SCALING_GROUP_NAME}")
-    
-    # Enable metrics collection for ASG
-    asg_client.enable_metrics_collection(
-        AutoScalingGroupName=AUTO_SCALING_GROUP_NAME,
-        Metrics=[
-            'GroupMinSize',
-            'GroupMaxSize',
-            'GroupDesiredCapacity',
-            'GroupInServiceInstances',
-            'GroupTotalInstances'
-        ],
-        Granularity='1Minute'
-    )
 
-    print_section('8. Create policy and attached to ASG')
-    
-    # Create Scale Out Policy
-    scale_out_policy = asg_client.put_scaling_policy(
-        AutoScalingGroupName=AUTO_SCALING_GROUP_NAME,
-        PolicyName=f'{AUTO_SCALING_GROUP_NAME}-scale-out',
-        PolicyType='SimpleScaling',
-        AdjustmentType='ChangeInCapacity',
-        ScalingAdjustment=SCALE_OUT_ADJUSTMENT,
-        Cooldown=COOL_DOWN_PERIOD_SCALE_OUT
-    )
-    scale_out_policy_arn = scale_out_policy['PolicyARN']
-    resources['scale_out_policy_arn'] = scale_out_policy_arn
-    print(f"Created Scale Out Policy (adds {SCALE_OUT_ADJUSTMENT} instances)")
-    
-    # Create Scale In Policy
-    scale_in_policy = asg_client.put_scaling_policy(
-        AutoScalingGroupName=AUTO_SCALING_GROUP_NAME,
-        PolicyName=f'{AUTO_SCALING_GROUP_NAME}-scale-in',
-        PolicyType='SimpleScaling',
-        AdjustmentType='ChangeInCapacity',
-        ScalingAdjustment=SCALE_IN_ADJUSTMENT,
-        Cooldown=COOL_DOWN_PERIOD_SCALE_IN
-    )
-    scale_in_policy_arn = scale_in_policy['PolicyARN']
-    resources['scale_in_policy_arn'] = scale_in_policy_arn
-    print(f"Created Scale In Policy (removes {abs(SCALE_IN_ADJUSTMENT)} instances)")
-
-    print_section('9. Create Cloud Watch alarm. Action is to invoke policy.')
-    
-    # Create CloudWatch client
-    cw_client = boto3.client('cloudwatch', region_name='us-east-1')
-    
-    # Create Scale Out Alarm (high CPU)
-    scale_out_alarm_name = f'{AUTO_SCALING_GROUP_NAME}-scale-out-alarm'
-    cw_client.put_metric_alarm(
-        AlarmName=scale_out_alarm_name,
-        ComparisonOperator='GreaterThanThreshold',
-        EvaluationPeriods=ALARM_EVALUATION_PERIODS_SCALE_OUT,
-        MetricName='CPUUtilization',
-        Namespace='AWS/EC2',
-        Period=ALARM_PERIOD,
-        Statistic='Average',
-        Threshold=CPU_UPPER_THRESHOLD,
-        ActionsEnabled=True,
-        AlarmActions=[scale_out_policy_arn],
-        AlarmDescription=f'Trigger scale out when CPU > {CPU_UPPER_THRESHOLD}%',
-        Dimensions=[
-            {
-                'Name': 'AutoScalingGroupName',
-                'Value': AUTO_SCALING_GROUP_NAME
-            }
-        ],
-        Unit='Percent'
-    )
-    resources['scale_out_alarm_name'] = scale_out_alarm_name
-    print(f"Created Scale Out Alarm (CPU > {CPU_UPPER_THRESHOLD}%)")
-    
-    # Create Scale In Alarm (low CPU)
-    scale_in_alarm_name = f'{AUTO_SCALING_GROUP_NAME}-scale-in-alarm'
-    cw_client.put_metric_alarm(
-        AlarmName=scale_in_alarm_name,
-        ComparisonOperator='LessThanThreshold',
-        EvaluationPeriods=ALARM_EVALUATION_PERIODS_SCALE_IN,
-        MetricName='CPUUtilization',
-        Namespace='AWS/EC2',
-        Period=ALARM_PERIOD,
-        Statistic='Average',
-        Threshold=CPU_LOWER_THRESHOLD,
-        ActionsEnabled=True,
-        AlarmActions=[scale_in_policy_arn],
-        AlarmDescription=f'Trigger scale in when CPU < {CPU_LOWER_THRESHOLD}%',
-        Dimensions=[
-            {
-                'Name': 'AutoScalingGroupName',
-                'Value': AUTO_SCALING_GROUP_NAME
-            }
-        ],
-        Unit='Percent'
-    )
-    resources['scale_in_alarm_name'] = scale_in_alarm_name
-    print(f"Created Scale In Alarm (CPU < {CPU_LOWER_THRESHOLD}%)")
-    
-    # Wait for Load Balancer to be active
-    print("Waiting for Load Balancer to be active...")
-    waiter = elb_client.get_waiter('load_balancer_available')
-    waiter.wait(LoadBalancerArns=[lb_arn])
-    
-    # Wait for at least one instance to be healthy in target group
-    print("Waiting for instances to be healthy in target group...")
-    time.sleep(60)  # Give time for instances to launch and become healthy
-
-    print_section('10. Submit ELB DNS to LG, starting warm up test.')
-    warmup_log_name = initialize_warmup(lg_dns, lb_dns)
-    while not is_test_complete(lg_dns, warmup_log_name):
-        time.sleep(1)
-
-    print_section('11. Submit ELB DNS to LG, starting auto scaling test.')
-    # May take a few minutes to start actual test after warm up test finishes
-    log_name = initialize_test(lg_dns, lb_dns)
-    while not is_test_complete(lg_dns, log_name):
-        time.sleep(1)
+    def create_lg_security_group():
+        resources['sg1_id'] = create_security_group(
+            'AutoScalingLGSecGroup', 'Load Generator security group')
+        return resources['sg1_id']
+
+    def create_asg_security_group():
+        resources['sg2_id'] = create_security_group(
+            'AutoScalingASGSecGroup', 'ASG and ELB security group')
+        return resources['sg2_id']
+
+    def create_load_generator():
+        lg = create_instance(LOAD_GENERATOR_AMI, result('lg_security_group'))
+        resources['lg_instance_id'] = lg.instance_id
+        print("Load Generator running: id={} dns={}".format(lg.instance_id, lg.public_dns_name))
+        return lg.public_dns_name
+
+    def create_launch_template():
+        lt_response = ec2_client.create_launch_template(
+            **resolve(stack.launch_template, stack_ref))
+        lt_id = lt_response['LaunchTemplate']['LaunchTemplateId']
+        lt_name = lt_response['LaunchTemplate']['LaunchTemplateName']
+        resources['lt_id'] = lt_id
+        resources['lt_name'] = lt_name
+        print(f"Created Launch Template: {lt_name} (ID: {lt_id})")
+        return lt_id
+
+    def create_target_group():
+        tg_response = elb_client.create_target_group(**resolve(stack.target_group, stack_ref))
+        tg_arn = tg_response['TargetGroups'][0]['TargetGroupArn']
+        resources['tg_arn'] = tg_arn
+        print(f"Created Target Group: {AUTO_SCALING_TARGET_GROUP} (ARN: {tg_arn})")
+        return tg_arn
+
+    def lb_subnet_ids():
+        # Subnets of the Load Balancer: at least 2 availability zones, and
+        # every zone of the ASG so that all its instances receive traffic
+        subnet_ids = list(aws.default_subnets().values())
+        return subnet_ids[:lb_zone_count(configuration)]
+
+    def create_load_balancer():
+        # Create Application Load Balancer
+        lb_response = elb_client.create_load_balancer(**resolve(stack.load_balancer, stack_ref))
+        lb_arn = lb_response['LoadBalancers'][0]['LoadBalancerArn']
+        lb_dns = lb_response['LoadBalancers'][0]['DNSName']
+        resources['lb_arn'] = lb_arn
+        print("lb started. ARN={}, DNS={}".format(lb_arn, lb_dns))
+        return lb_dns
+
+    def wait_load_balancer_available():
+        # The ELB provisions in the background while the rest is created
+        aws.wait_for(
+            elb_client, 'load_balancer_available',
+            LoadBalancerArns=[resources['lb_arn']],
+            WaiterConfig={'Delay': 5, 'MaxAttempts': 120}
+        )
+        print("Load Balancer active")
+
+    def create_listener():
+        # Create listener to associate ELB with Target Group
+        elb_client.create_listener(**resolve(stack.listener, stack_ref))
+        print(f"Created listener to forward traffic from ELB to Target Group")
+
+    def create_auto_scaling_group():
+        asg_client.create_auto_scaling_group(**resolve(stack.auto_scaling_group, stack_ref))
+        resources['asg_name'] = AUTO_SCALING_GROUP_NAME
+        print(f"Created Auto Scaling Group: {AUTO_SCALING_GROUP_NAME}")
+
+        # Enable metrics collection for ASG
+        asg_client.enable_metrics_collection(**stack.metrics_collection)
+
+    def create_warm_pool():
+        # Pool instances boot and initialize once, then wait in WARM_POOL_STATE;
+        # a scale-out starts one of them instead of cold launching
+        asg_client.put_warm_pool(**stack.warm_pool)
+        print(f"Created warm pool of {WARM_POOL_SIZE} {WARM_POOL_STATE.lower()} instances")
+
+    def create_policy(spec):
+        policy = asg_client.put_scaling_policy(**spec.policy)
+        resources['policy_arns'].append(policy['PolicyARN'])
+        print(f"Created {spec.policy['PolicyType']} policy {spec.policy['PolicyName']} "
+              f"({spec.description})")
+        return policy['PolicyARN']
+
+    def create_alarm(spec):
+        cw_client.put_metric_alarm(**resolve(spec.alarm, stack_ref))
+        resources['alarm_names'].append(spec.alarm['AlarmName'])
+        print(f"Created alarm {spec.alarm['AlarmName']} ({spec.alarm['AlarmDescription']})")
+
+    def wait_first_healthy_target():
+        # Poll instead of sleeping a fixed minute: the test can start as
+        # soon as the ELB has one healthy target to send traffic to
+        def healthy_target():
+            health = elb_client.describe_target_health(TargetGroupArn=resources['tg_arn'])
+            return any(target['TargetHealth']['State'] == 'healthy'
+                       for target in health['TargetHealthDescriptions'])
+
+        aws.wait_until(healthy_target, timeout=600, interval=5,
+                       description='a healthy target in the target group')
+        print("First target healthy in the target group")
+
+    graph.add('lg_security_group', create_lg_security_group)
+    graph.add('asg_security_group', create_asg_security_group)
+    graph.add('load_generator', create_load_generator, deps=['lg_security_group'])
+    graph.add('launch_template', create_launch_template, deps=['asg_security_group'])
+    graph.add('target_group', create_target_group)
+    graph.add('load_balancer', create_load_balancer, deps=['asg_security_group'])
+    graph.add('load_balancer_available', wait_load_balancer_available,
+              deps=['load_balancer'])
+    graph.add('listener', create_listener, deps=['load_balancer', 'target_group'])
+    graph.add('auto_scaling_group', create_auto_scaling_group,
+              deps=['launch_template', 'target_group'])
+    if stack.warm_pool:
+        graph.add('warm_pool', create_warm_pool, deps=['auto_scaling_group'])
+    for spec in stack.policies:
+        graph.add(spec.name + '_policy', functools.partial(create_policy, spec),
+                  deps=['auto_scaling_group'])
+        if spec.alarm is not None:
+            graph.add(spec.name + '_alarm', functools.partial(create_alarm, spec),
+                      deps=[spec.name + '_policy'])
+    graph.add('first_healthy_target', wait_first_healthy_target,
+              deps=['auto_scaling_group', 'listener', 'load_balancer_available'])
+    graph.run()
+
+    print()
+    graph.print_timings()
+    if graph.errors:
+        destroy_resources()
+        tracing.finish(TRACE_FILE)
+        raise next(iter(graph.errors.values()))
 
-    destroy_resources()
+    try:
+        lg_dns = result('load_generator')
+        lb_dns = result('load_balancer')
+        run_tests(lg_dns, lb_dns, create_metrics_bridge(), forecast)
+        if WARM_POOL_SIZE:
+            report_scale_out_latency()
+    finally:
+        # Always tear the stack down, even if the tests failed
+        destroy_resources()
+        tracing.finish(TRACE_FILE)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,662 @@
+"""
+Offline tuner for auto-scaling-config.json.
+
+Every configuration is scored by a discrete-event simulation of the ASG,
+its CloudWatch alarms and the LG demand of past auto scaling tests, so
+thousands of candidates cost seconds instead of 25-minute cloud runs:
+
+    python autotune.py test.*.log
+    python autotune.py --samples 20000 --space space.json --csv results.csv test.*.log
+
+The demand of a pattern is the per-minute maximum RPS over every log of
+that pattern. Minutes in which the group was saturated only give a lower
+bound of the demand, so a tuned config should still be confirmed by a real
+run. What the logs measured is printed next to the simulated current
+config, with a warning when the two differ by more than
+--calibration-tolerance. The policies and alarms simulated are the ones
+build_policy_specs() would deploy for the candidate, so SimpleScaling,
+StepScaling and TargetTrackingScaling configs are all scored as deployed.
+
+The search space maps config keys to candidate values; keys of the
+"scaling_policy" section are written "scaling_policy.<key>". The result is
+the Pareto front of average RPS against instance-hours, and the cheapest
+front config reaching --min-rps-share of the best average RPS is written
+to --output.
+"""
+import argparse
+import copy
+import heapq
+import itertools
+import json
+import math
+import os
+import random
+import statistics
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from analyze_logs import Table, analyze_run, read_run
+from scaling_policies import (
+    SIMPLE_SCALING, STEP_SCALING, alarm_metric, build_policy_specs
+)
+from utilities.lg_simulator import DEFAULT_PATTERN, IH_SECONDS_PER_UNIT
+
+CONFIG_FILE = 'auto-scaling-config.json'
+OUTPUT_FILE = 'auto-scaling-config.tuned.json'
+
+# RPS one web service serves when no log gives an estimate (as lg_simulator)
+DEFAULT_INSTANCE_CAPACITY = 12.0
+# Seconds from launch until an instance serves traffic
+DEFAULT_BOOT_DELAY = 60
+
+# Relative difference between the simulated and the measured runs above
+# which the simulation is reported as not calibrated
+CALIBRATION_TOLERANCE = 0.1
+
+# Target tracking scales in only after 15 minutes below the target
+TARGET_TRACKING_SCALE_IN_SECONDS = 15 * 60
+
+RESULT_COLUMNS = ('average_rps', 'max_rps', 'ih', 'rps_per_ih', 'peak_instances',
+                  'scale_outs', 'scale_ins')
+
+# Same-time events run in this order: served load is counted up to the
+# minute end, then the LG sample is published, then alarms are evaluated
+READY, MINUTE, EVALUATE = range(3)
+
+
+def default_space(configuration):
+    """
+    The search space used when --space is not given
+    :param configuration: base configuration
+    :return: dict of config key to list of candidate values
+    """
+    if configuration['scaling_metric'] == 'rps':
+        thresholds = {
+            'rps_per_instance_lower_threshold': [4, 6, 8],
+            'rps_per_instance_upper_threshold': [9, 10, 11, 12]
+        }
+    else:
+        thresholds = {
+            'cpu_lower_threshold': [20, 30, 40, 50],
+            'cpu_upper_threshold': [50, 60, 70, 80]
+        }
+    space = {
+        'alarm_period': [30, 60],
+        'alarm_evaluation_periods_scale_out': [1, 2],
+        'asg_max_size': [5, 7, 9],
+        **thresholds
+    }
+    policy_type = (configuration.get('scaling_policy') or {}).get('type', SIMPLE_SCALING)
+    if policy_type == SIMPLE_SCALING:
+        space.update({
+            'alarm_evaluation_periods_scale_in': [1, 3, 5],
+            'scale_out_adjustment': [1, 2],
+            'cool_down_period_scale_out': [30, 60, 120],
+            'cool_down_period_scale_in': [30, 120, 300]
+        })
+    elif policy_type == STEP_SCALING:
+        space.update({
+            'scaling_policy.scale_in_evaluation_periods': [1, 3, 5],
+            'scaling_policy.estimated_instance_warmup': [30, 60, 120]
+        })
+    else:
+        space.update({
+            'scaling_policy.target_value': [6, 7, 8, 9, 10],
+            'scaling_policy.estimated_instance_warmup': [30, 60, 120]
+        })
+    return space
+
+
+def apply_overrides(configuration, overrides):
+    """
+    :param configuration: base configuration
+    :param overrides: dict of (possibly "section.key") config keys to values
+    :return: a new configuration with the overrides applied
+    """
+    result = copy.deepcopy(configuration)
+    for key, value in overrides.items():
+        target = result
+        *sections, name = key.split('.')
+        for section in sections:
+            target = target.setdefault(section, {})
+        target[name] = value
+    return result
+
+
+def candidates(space, samples=None, seed=0):
+    """
+    Enumerate the search space
+    :param space: dict of config key to list of values
+    :param samples: draw this many random combinations instead of the full grid
+    :param seed: seed of the random draw
+    :return: list of override dicts
+    """
+    keys = sorted(space)
+    grid = list(itertools.product(*(space[key] for key in keys)))
+    if samples is not None and samples < len(grid):
+        grid = random.Random(seed).sample(grid, samples)
+    return [dict(zip(keys, values)) for values in grid]
+
+
+########################################
+# Demand
+########################################
+def load_demand(paths):
+    """
+    Rebuild the per-minute demand of every pattern seen in the logs
+    :param paths: test.*.log files; only auto scaling tests are used
+    :return: (dict of pattern to list of per-minute RPS, estimated instance capacity)
+    """
+    demand = {}
+    capacities = []
+    for path in paths:
+        run = read_run(path)
+        if run['test_type'] != 'autoscaling' or not run['rps']:
+            continue
+        pattern = run['end'].pattern if run['end'] else None
+        minutes = max(run['rps'])
+        rps = [run['rps'].get(minute, 0.0) for minute in range(1, minutes + 1)]
+        previous = demand.get(pattern, [])
+        demand[pattern] = [max(values) for values in itertools.zip_longest(
+            previous, rps, fillvalue=0.0)]
+        capacity = analyze_run(path, Table(()))['instance_capacity']
+        if capacity:
+            capacities.append(capacity)
+    return demand, statistics.median(capacities) if capacities else None
+
+
+def measure_runs(paths):
+    """
+    Average what the logged auto scaling tests measured
+    :param paths: test.*.log files
+    :return: dict of average_rps and ih, None if no log has both
+    """
+    runs = [analyze_run(path, Table(())) for path in paths]
+    runs = [run for run in runs if run['test_type'] == 'autoscaling'
+            and run['average_rps'] is not None and run['ih']]
+    if not runs:
+        return None
+    return {column: sum(run[column] for run in runs) / len(runs)
+            for column in ('average_rps', 'ih')}
+
+
+########################################
+# Simulation
+########################################
+class SimulatedInstance:
+
+    __slots__ = ('launch', 'ready', 'termination', 'capacity', 'warmup_end')
+
+    def __init__(self, launch, ready, capacity, warmup_end):
+        self.launch = launch
+        self.ready = ready
+        self.termination = None
+        self.capacity = capacity
+        self.warmup_end = warmup_end
+
+
+class Alarm:
+    """
+    CloudWatch alarm state: ALARM once the last EvaluationPeriods datapoints
+    all breach the threshold.
+    """
+
+    def __init__(self, spec):
+        self.threshold = spec['Threshold']
+        self.greater = spec['ComparisonOperator'] == 'GreaterThanThreshold'
+        self.datapoints = deque(maxlen=spec['EvaluationPeriods'])
+
+    def evaluate(self, value):
+        """
+        :param value: datapoint of the period, None if missing (not breaching)
+        :return: True if the alarm is in ALARM
+        """
+        if value is None:
+            self.datapoints.append(False)
+        elif self.greater:
+            self.datapoints.append(value > self.threshold)
+        else:
+            self.datapoints.append(value < self.threshold)
+        return len(self.datapoints) == self.datapoints.maxlen and all(self.datapoints)
+
+
+class AsgSimulation:
+    """
+    Discrete-event model of one auto scaling test: the LG demand, the web
+    services of the ASG, the scaling metric and the alarms and policies
+    acting on it.
+    """
+
+    def __init__(self, configuration, demand, instance_capacity=DEFAULT_INSTANCE_CAPACITY,
+                 capacity_jitter=0.15, boot_delay=DEFAULT_BOOT_DELAY, seed=0):
+        """
+        :param configuration: auto-scaling-config.json contents
+        :param demand: RPS sent by the LG for each minute of the test
+        :param instance_capacity: mean RPS one web service can serve
+        :param capacity_jitter: relative random spread of the capacity per instance
+        :param boot_delay: seconds between launch and serving traffic
+        :param seed: seed of the capacity jitter
+        """
+        self.configuration = configuration
+        self.demand = demand
+        self.instance_capacity = instance_capacity
+        self.capacity_jitter = capacity_jitter
+        self.boot_delay = boot_delay
+        self.random = random.Random(seed)
+
+        metric, lower, upper, label = alarm_metric(configuration)
+        self.rps_metric = configuration['scaling_metric'] == 'rps'
+        self.period = metric['Period']
+        self.policies = []
+        for spec in build_policy_specs(configuration, metric, lower, upper, label):
+            self.policies.append((spec.policy, Alarm(spec.alarm) if spec.alarm else None))
+        self.min_size = configuration['asg_min_size']
+        self.max_size = configuration['asg_max_size']
+        # Seconds an instance serves before it may be scaled in
+        self.min_lifetime = configuration['min_instance_lifetime']
+        self.newest_first = 'NewestInstance' in configuration['termination_policies']
+        policy_config = configuration.get('scaling_policy') or {}
+        self.warmup = policy_config.get('estimated_instance_warmup', 0) or 0
+        self.scale_in_periods = math.ceil(TARGET_TRACKING_SCALE_IN_SECONDS / self.period)
+
+        self.events = []
+        self.sequence = itertools.count()
+        self.now = 0.0
+        self.instances = []
+        self.cooldown_until = 0.0
+        self.below_target = deque(maxlen=self.scale_in_periods)
+        # Load served in the current minute and alarm period
+        self.minute_served = 0.0
+        self.period_served = 0.0
+        self.period_capacity = 0.0
+        self.period_samples = []
+        self.minute_rps = []
+        self.scale_outs = 0
+        self.scale_ins = 0
+        self.peak_instances = 0
+        # Scale-ins waiting for instances to reach min_lifetime
+        self.pending_terminations = 0
+
+    def schedule(self, at, kind, payload=None):
+        heapq.heappush(self.events, (at, kind, next(self.sequence), payload))
+
+    def alive(self):
+        return [i for i in self.instances if i.termination is None]
+
+    def capacity(self):
+        """
+        :return: desired capacity of the group
+        """
+        return len(self.alive()) - self.pending_terminations
+
+    def serving_capacity(self):
+        return sum(i.capacity for i in self.instances
+                   if i.termination is None and i.ready <= self.now)
+
+    def advance(self, to):
+        """
+        Count the load served between now and `to`, during which neither the
+        demand nor the serving instances change
+        """
+        if to <= self.now:
+            return
+        minute = min(int(self.now // 60), len(self.demand) - 1)
+        capacity = self.serving_capacity()
+        served = min(self.demand[minute], capacity)
+        elapsed = to - self.now
+        self.minute_served += served * elapsed
+        self.period_served += served * elapsed
+        self.period_capacity += capacity * elapsed
+        self.now = to
+
+    def launch(self, count):
+        for _ in range(count):
+            jitter = self.random.uniform(-self.capacity_jitter, self.capacity_jitter)
+            instance = SimulatedInstance(self.now, self.now + self.boot_delay,
+                                         self.instance_capacity * (1 + jitter),
+                                         self.now + self.warmup)
+            self.instances.append(instance)
+            self.schedule(instance.ready, READY)
+
+    def terminate(self, count):
+        # Oldest first, like the Default termination policy in a single AZ
+        candidates = sorted(self.alive(), key=lambda i: i.launch, reverse=self.newest_first)
+        # Instances protected from scale in until they served min_lifetime
+        eligible = [i for i in candidates
+                    if not self.min_lifetime or self.now - i.ready >= self.min_lifetime]
+        for instance in eligible[:count]:
+            instance.termination = self.now
+        self.pending_terminations += max(0, count - len(eligible))
+
+    def release(self):
+        """
+        Run the scale-ins that were waiting for instances to reach min_lifetime
+        """
+        count, self.pending_terminations = self.pending_terminations, 0
+        if count:
+            self.terminate(count)
+
+    def set_desired(self, desired):
+        current = self.capacity()
+        desired = max(self.min_size, min(self.max_size, desired))
+        if desired > current:
+            # Raising the desired capacity cancels the pending scale-ins first
+            cancelled = min(self.pending_terminations, desired - current)
+            self.pending_terminations -= cancelled
+            self.launch(desired - current - cancelled)
+            self.scale_outs += 1
+        elif desired < current:
+            self.terminate(current - desired)
+            self.scale_ins += 1
+        self.peak_instances = max(self.peak_instances, desired)
+        return desired != current
+
+    def metric_value(self):
+        """
+        :return: datapoint of the period that just ended, None if missing
+        """
+        if self.rps_metric:
+            if not self.period_samples:
+                return None
+            return sum(self.period_samples) / len(self.period_samples)
+        if not self.period_capacity:
+            return None
+        return 100 * self.period_served / self.period_capacity
+
+    def execute(self, policy, value, threshold):
+        """
+        Run a scaling policy invoked by its alarm
+        :param policy: put_scaling_policy arguments
+        :param value: metric value that breached
+        :param threshold: alarm threshold
+        :return: None
+        """
+        current = self.capacity()
+        if policy['PolicyType'] == SIMPLE_SCALING:
+            if self.now < self.cooldown_until:
+                return
+            if self.set_desired(current + policy['ScalingAdjustment']):
+                self.cooldown_until = self.now + policy['Cooldown']
+            return
+        # Step scaling: the step whose bounds contain the breach size
+        breach = value - threshold
+        adjustment = 0
+        for step in policy['StepAdjustments']:
+            if step.get('MetricIntervalLowerBound', float('-inf')) <= breach \
+                    < step.get('MetricIntervalUpperBound', float('inf')):
+                adjustment = step['ScalingAdjustment']
+                break
+        if adjustment > 0:
+            # Instances still warming up already cover part of the step
+            warming = sum(1 for i in self.alive() if i.warmup_end > self.now)
+            adjustment = max(0, adjustment - warming)
+        if adjustment:
+            self.set_desired(current + adjustment)
+
+    def track_target(self, policy, value):
+        """
+        Target tracking: size the group so that the metric meets the target,
+        scaling in only after a sustained period below it
+        """
+        if value is None:
+            return
+        configuration = policy['TargetTrackingConfiguration']
+        target = configuration['TargetValue']
+        current = self.capacity()
+        warming = sum(1 for i in self.alive() if i.warmup_end > self.now)
+        desired = math.ceil(current * value / target)
+        self.below_target.append(desired < current)
+        if desired > current and not warming:
+            self.set_desired(desired)
+        elif desired < current and not configuration.get('DisableScaleIn') and \
+                len(self.below_target) == self.below_target.maxlen and all(self.below_target):
+            if self.set_desired(desired):
+                self.below_target.clear()
+
+    def on_start(self):
+        """
+        Called once the initial instances are up, before the first event
+        """
+
+    def on_minute(self):
+        self.release()
+        rps = self.minute_served / 60
+        self.minute_rps.append(rps)
+        self.minute_served = 0.0
+        # The bridge divides by the instances the ASG reports in service
+        alive = len(self.alive())
+        if alive:
+            self.period_samples.append(rps / alive)
+
+    def on_evaluate(self):
+        self.release()
+        value = self.metric_value()
+        self.period_samples = []
+        self.period_served = self.period_capacity = 0.0
+        for policy, alarm in self.policies:
+            if alarm is None:
+                self.track_target(policy, value)
+            elif alarm.evaluate(value):
+                # The ASG re-runs the policy every period the alarm stays in ALARM
+                self.execute(policy, value, alarm.threshold)
+
+    def run(self):
+        """
+        Simulate the whole test
+        :return: dict with one value per RESULT_COLUMNS entry
+        """
+        duration = len(self.demand) * 60
+        # The warmup test leaves the minimum size booted
+        self.launch(self.min_size)
+        for instance in self.instances:
+            instance.ready = instance.warmup_end = 0.0
+        self.peak_instances = self.min_size
+        self.on_start()
+        for minute in range(1, len(self.demand) + 1):
+            self.schedule(minute * 60, MINUTE)
+        for index in range(1, int(duration // self.period) + 1):
+            self.schedule(index * self.period, EVALUATE)
+
+        while self.events:
+            at, kind, _, _ = heapq.heappop(self.events)
+            if at > duration:
+                break
+            self.advance(at)
+            if kind == MINUTE:
+                self.on_minute()
+            elif kind == EVALUATE:
+                self.on_evaluate()
+
+        seconds = sum(min(i.termination if i.termination is not None else duration, duration)
+                      - i.launch for i in self.instances)
+        ih = seconds / IH_SECONDS_PER_UNIT
+        average_rps = sum(self.minute_rps) / len(self.minute_rps)
+        return {
+            'average_rps': average_rps,
+            'max_rps': max(self.minute_rps),
+            'ih': ih,
+            'rps_per_ih': average_rps / ih if ih else None,
+            'peak_instances': self.peak_instances,
+            'scale_outs': self.scale_outs,
+            'scale_ins': self.scale_ins
+        }
+
+
+########################################
+# Search
+########################################
+# Set in every worker process by init_worker
+_worker = {}
+
+
+def init_worker(configuration, demand, instance_capacity, boot_delay, seed):
+    _worker.update(configuration=configuration, demand=demand,
+                   instance_capacity=instance_capacity, boot_delay=boot_delay, seed=seed)
+
+
+def evaluate(overrides):
+    """
+    Score one candidate over every demand pattern (runs in a worker process)
+    :param overrides: config overrides of the candidate
+    :return: (overrides, averaged result dict), or (overrides, None) if the
+        candidate is not a valid configuration
+    """
+    configuration = apply_overrides(_worker['configuration'], overrides)
+    if not valid(configuration):
+        return overrides, None
+    try:
+        results = [AsgSimulation(configuration, demand, _worker['instance_capacity'],
+                                 boot_delay=_worker['boot_delay'], seed=_worker['seed']).run()
+                   for demand in _worker['demand'].values()]
+    except ValueError:
+        # e.g. scaling steps that do not tile the metric range
+        return overrides, None
+    return overrides, {column: sum(r[column] or 0 for r in results) / len(results)
+                       for column in RESULT_COLUMNS}
+
+
+def valid(configuration):
+    if configuration['asg_min_size'] > configuration['asg_max_size']:
+        return False
+    # Equal thresholds flap, build_stack() rejects them
+    if configuration['scaling_metric'] == 'rps':
+        return configuration['rps_per_instance_lower_threshold'] < \
+            configuration['rps_per_instance_upper_threshold']
+    return configuration['cpu_lower_threshold'] < configuration['cpu_upper_threshold']
+
+
+def search(configuration, demand, space, instance_capacity, boot_delay=DEFAULT_BOOT_DELAY,
+           samples=None, seed=0, workers=None):
+    """
+    Score every candidate of the search space on a process pool
+    :return: list of (overrides, result) of the valid candidates
+    """
+    todo = candidates(space, samples, seed)
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, len(todo) // (workers * 8))
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(configuration, demand, instance_capacity,
+                                       boot_delay, seed)) as executor:
+        scored = executor.map(evaluate, todo, chunksize=chunksize)
+        return [(overrides, result) for overrides, result in scored if result is not None]
+
+
+def pareto_front(scored):
+    """
+    Keep the candidates no other candidate beats on both average RPS
+    (higher is better) and instance-hours (lower is better)
+    :param scored: list of (overrides, result)
+    :return: front sorted by instance-hours
+    """
+    front = []
+    best_rps = float('-inf')
+    for overrides, result in sorted(scored, key=lambda s: (s[1]['ih'], -s[1]['average_rps'])):
+        if result['average_rps'] > best_rps:
+            front.append((overrides, result))
+            best_rps = result['average_rps']
+    return front
+
+
+def pick_best(front, min_rps_share):
+    """
+    :return: the cheapest front entry within min_rps_share of the best average RPS
+    """
+    best_rps = max(result['average_rps'] for _, result in front)
+    return next((overrides, result) for overrides, result in front
+                if result['average_rps'] >= min_rps_share * best_rps)
+
+
+def print_front(front, keys):
+    print('{:>10} {:>8} {:>10}  {}'.format('avg rps', 'ih', 'rps/ih', 'config'))
+    for overrides, result in front:
+        print('{:>10.2f} {:>8.1f} {:>10.4f}  {}'.format(
+            result['average_rps'], result['ih'], result['rps_per_ih'] or 0,
+            ' '.join('{}={}'.format(key, overrides[key]) for key in keys)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('logs', nargs='*',
+                        help='auto scaling test.*.log files; the simulator pattern if none')
+    parser.add_argument('--config', default=CONFIG_FILE)
+    parser.add_argument('--space', metavar='PATH',
+                        help='JSON search space, {"config_key": [values, ...]}')
+    parser.add_argument('--samples', type=int,
+                        help='score this many random candidates instead of the full grid')
+    parser.add_argument('--workers', type=int, help='worker processes, one per CPU by default')
+    parser.add_argument('--instance-capacity', type=float,
+                        help='RPS one instance serves; estimated from the logs by default')
+    parser.add_argument('--boot-delay', type=float, default=DEFAULT_BOOT_DELAY)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--min-rps-share', type=float, default=0.95,
+                        help='pick the cheapest config within this share of the best average RPS')
+    parser.add_argument('--calibration-tolerance', type=float, default=CALIBRATION_TOLERANCE,
+                        help='warn when the simulated current config is further than this '
+                             'share from the logged runs')
+    parser.add_argument('--output', default=OUTPUT_FILE)
+    parser.add_argument('--csv', metavar='PATH', help='write every scored candidate to a CSV file')
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        configuration = json.load(f)
+    demand, estimated_capacity = load_demand(args.logs)
+    if not demand:
+        print('No auto scaling log given, using the simulator demand pattern')
+        demand = {'simulator': DEFAULT_PATTERN}
+    instance_capacity = args.instance_capacity or estimated_capacity or DEFAULT_INSTANCE_CAPACITY
+    if args.space:
+        with open(args.space) as f:
+            space = json.load(f)
+    else:
+        space = default_space(configuration)
+    keys = sorted(space)
+    print('{} pattern(s), {:.2f} RPS per instance, {} candidate(s)'.format(
+        len(demand), instance_capacity,
+        args.samples or math.prod(len(values) for values in space.values())))
+
+    init_worker(configuration, demand, instance_capacity, args.boot_delay, args.seed)
+    _, baseline = evaluate({})
+    scored = search(configuration, demand, space, instance_capacity, args.boot_delay,
+                    args.samples, args.seed, args.workers)
+    if not scored:
+        raise SystemExit('No valid candidate in the search space')
+    front = pareto_front(scored)
+
+    print('\nPareto front of {} scored candidates:'.format(len(scored)))
+    print_front(front, keys)
+    measured = measure_runs(args.logs)
+    if measured:
+        print('\nLogged runs: {:.2f} average RPS, {:.1f} ih (measured)'.format(
+            measured['average_rps'], measured['ih']))
+    if baseline:
+        print('{}Current config: {:.2f} average RPS, {:.1f} ih (simulated)'.format(
+            '' if measured else '\n', baseline['average_rps'], baseline['ih']))
+    if measured and baseline:
+        off = {column: abs(baseline[column] - measured[column]) / measured[column]
+               for column in measured}
+        if max(off.values()) > args.calibration_tolerance:
+            print('WARNING: the simulation is {:.0%} off the measured RPS and {:.0%} off the '
+                  'measured ih. The logs may come from another config, or --instance-capacity '
+                  'and --boot-delay do not fit them. Compare the candidates with the simulated '
+                  'current config, not with the logged runs.'.format(
+                      off['average_rps'], off['ih']))
+    overrides, result = pick_best(front, args.min_rps_share)
+    print('Best config: {:.2f} average RPS, {:.1f} ih (simulated)'.format(
+        result['average_rps'], result['ih']))
+
+    with open(args.output, 'w') as f:
+        json.dump(apply_overrides(configuration, overrides), f, indent=2)
+        f.write('\n')
+    print('Tuned config written to {}'.format(args.output))
+
+    if args.csv:
+        table = Table(keys + list(RESULT_COLUMNS))
+        for candidate, scores in scored:
+            table.append({**candidate, **scores})
+        table.to_csv(args.csv)
+        print('Scored candidates written to {}'.format(args.csv))
+
+
+if __name__ == '__main__':
+    main()
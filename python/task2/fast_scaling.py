@@ -0,0 +1,188 @@
+"""
+In-process scaling controller reacting within seconds of a new LG sample.
+
+CloudWatch alarms only see a breach once the metric of a whole period is
+published and evaluated, minutes before a new instance even starts to
+boot. FastScalingController instead reads the RPS of every minute as soon
+as the test log reports it, and checks the target group health every
+"interval" seconds, then sets the desired capacity of the ASG directly:
+
+  scale out  when the RPS per healthy capacity unit is above the upper
+             RPS per instance threshold and the capacity already launching
+             does not cover it, by at most "max_step_out" units every
+             "scale_out_cooldown" seconds
+  scale in   one instance at a time, once the RPS per instance has stayed
+             below the lower threshold for "scale_in_delay" seconds, at most
+             every "scale_in_cooldown" seconds, and never to fewer instances
+             than the upper threshold needs
+
+Capacity is counted in the weighted units of the desired capacity, so
+instances of a mixed instances policy count for their WeightedCapacity;
+launching capacity is that of the Pending and InService instances whose
+target is not healthy yet. The thresholds are the rps_per_instance_* keys
+of the config, so the gap between them is the hysteresis band. The alarms and policies stay deployed
+as a safety net, and a minimum size raised by predictive scaling is
+honoured.
+"""
+import math
+
+import botocore
+
+from utilities.clock import get_clock
+from utilities.log_parser import CurrentRps
+
+
+class FastScalingController:
+    """
+    Set the desired capacity of the ASG from the LG RPS and the target
+    health, without waiting for CloudWatch.
+    """
+
+    def __init__(self, asg_client, elb_client, asg_name, target_group_arn,
+                 lower_threshold, upper_threshold, interval=5, max_step_out=2,
+                 scale_out_cooldown=30, scale_in_delay=90, scale_in_cooldown=120):
+        """
+        :param asg_client: boto3 autoscaling client
+        :param elb_client: boto3 elbv2 client
+        :param asg_name: name of the Auto Scaling Group
+        :param target_group_arn: ARN of the target group of the ASG
+        :param lower_threshold: RPS per instance below which to scale in
+        :param upper_threshold: RPS per instance above which to scale out
+        :param interval: seconds between two checks of the group
+        :param max_step_out: most capacity units added by one scale out
+        :param scale_out_cooldown: minimum seconds between two scale outs
+        :param scale_in_delay: seconds the load must stay low before a scale in
+        :param scale_in_cooldown: minimum seconds between two scale ins
+        """
+        self.asg_client = asg_client
+        self.elb_client = elb_client
+        self.asg_name = asg_name
+        self.target_group_arn = target_group_arn
+        self.lower_threshold = lower_threshold
+        self.upper_threshold = upper_threshold
+        self.interval = interval
+        self.max_step_out = max_step_out
+        self.scale_out_cooldown = scale_out_cooldown
+        self.scale_in_delay = scale_in_delay
+        self.scale_in_cooldown = scale_in_cooldown
+
+        self.rps = None
+        self.next_check = 0.0
+        self.last_scale_out = float('-inf')
+        self.last_scale_in = float('-inf')
+        self.low_since = None
+        self.actions = []
+
+    def attach(self, log_tail):
+        """
+        Follow the RPS of a test
+        :param log_tail: LogTail of the test
+        :return: self
+        """
+        log_tail.subscribe(self.on_event)
+        return self
+
+    def on_event(self, event):
+        if isinstance(event, CurrentRps):
+            self.rps = event.rps
+            # A new sample is worth a check right away
+            self.next_check = 0.0
+
+    def healthy_targets(self):
+        """
+        :return: set of the instance ids of the healthy targets
+        """
+        health = self.elb_client.describe_target_health(TargetGroupArn=self.target_group_arn)
+        return {target['Target']['Id'] for target in health['TargetHealthDescriptions']
+                if target['TargetHealth']['State'] == 'healthy'}
+
+    def group_state(self):
+        """
+        :return: (desired capacity, minimum size, maximum size, dict of the
+            weighted capacity of the Pending and InService instances by id)
+        """
+        group = self.asg_client.describe_auto_scaling_groups(
+            AutoScalingGroupNames=[self.asg_name]
+        )['AutoScalingGroups'][0]
+        weights = {instance['InstanceId']: int(instance.get('WeightedCapacity', 1))
+                   for instance in group['Instances']
+                   if instance['LifecycleState'].startswith(('Pending', 'InService'))}
+        return group['DesiredCapacity'], group['MinSize'], group['MaxSize'], weights
+
+    def decide(self, now, rps, healthy, desired, launching=0):
+        """
+        :param now: monotonic seconds
+        :param rps: latest RPS the LG reported
+        :param healthy: weighted capacity of the healthy targets
+        :param desired: current desired capacity of the ASG
+        :param launching: weighted capacity of the instances not healthy yet
+        :return: new desired capacity, before clamping to the group size limits
+        """
+        # Fewest instances keeping every one under the upper threshold
+        needed = math.ceil(rps / self.upper_threshold)
+        if rps / max(healthy, 1) > self.upper_threshold:
+            self.low_since = None
+            # Served RPS understates the demand of a saturated group
+            wanted = max(needed, healthy + 1)
+            coming = healthy + launching
+            if wanted > coming and now - self.last_scale_out >= self.scale_out_cooldown:
+                return min(max(desired, coming) + wanted - coming,
+                           desired + self.max_step_out)
+            return desired
+        if healthy >= desired and rps / max(desired, 1) < self.lower_threshold:
+            if self.low_since is None:
+                self.low_since = now
+            if now - self.low_since >= self.scale_in_delay and \
+                    now - self.last_scale_in >= self.scale_in_cooldown:
+                return max(needed, desired - 1)
+            return desired
+        self.low_since = None
+        return desired
+
+    def tick(self):
+        """
+        Check the group if the interval elapsed or a new sample arrived
+        :return: None
+        """
+        clock = get_clock()
+        now = clock.monotonic()
+        if self.rps is None or now < self.next_check:
+            return
+        self.next_check = now + self.interval
+        try:
+            healthy_ids = self.healthy_targets()
+            desired, min_size, max_size, weights = self.group_state()
+            healthy = sum(weight for instance_id, weight in weights.items()
+                          if instance_id in healthy_ids)
+            launching = sum(weights.values()) - healthy
+            target = max(min_size, min(max_size,
+                                       self.decide(now, self.rps, healthy, desired, launching)))
+            if target == desired:
+                return
+            self.asg_client.set_desired_capacity(
+                AutoScalingGroupName=self.asg_name,
+                DesiredCapacity=target,
+                # The controller applies its own cooldowns
+                HonorCooldown=False
+            )
+        except botocore.exceptions.ClientError as e:
+            # Retried on the next check; the alarms still scale meanwhile
+            print(f"Fast scaling check failed: {e}")
+            return
+        if target > desired:
+            self.last_scale_out = now
+        else:
+            self.last_scale_in = now
+            self.low_since = None
+        self.actions.append((clock.time(), desired, target))
+        print("Fast scaling: {} -> {} capacity at {:.2f} RPS, {} healthy, {} launching".format(
+            desired, target, self.rps, healthy, launching))
+
+    def report(self):
+        """
+        Print the capacity changes the controller made
+        :return: None
+        """
+        outs = sum(1 for _, before, after in self.actions if after > before)
+        print("Fast scaling made {} scale outs and {} scale ins".format(
+            outs, len(self.actions) - outs))
@@ -0,0 +1,336 @@
+"""
+Predictive scaling from the demand of past auto scaling tests.
+
+The LG replays the same minute-by-minute demand for a given pattern, so
+the curve learned from earlier logs says how many web services the next
+minutes need before the alarms could notice. The forecast capacity is set
+as the minimum size of the ASG "lead_minutes" ahead of the demand, to
+cover the boot time:
+
+  scheduled   the whole plan is registered up front as ASG scheduled actions,
+              following the highest demand seen at every minute
+  controller  autoscaling.py updates the minimum size every minute, following
+              the learned pattern that best matches the RPS observed so far
+
+Raising the minimum size raises the desired capacity with it, while the
+alarms and policies stay deployed: they scale out when the forecast falls
+short and scale in down to the forecast, never below it.
+
+Modes are compared on the ASG simulation of autotune.py, replaying the
+demand of the logs (or the simulator pattern when none is given):
+
+    python forecast.py test.*.log
+    python forecast.py --headroom 1.2 --lead-minutes 2 --schedule test.*.log
+"""
+import argparse
+import json
+import math
+from datetime import datetime, timedelta, timezone
+
+import botocore
+
+from analyze_logs import Table
+from autotune import (
+    CONFIG_FILE, DEFAULT_BOOT_DELAY, DEFAULT_INSTANCE_CAPACITY, AsgSimulation, load_demand
+)
+from utilities.clock import get_clock
+from utilities.lg_simulator import DEFAULT_PATTERN
+from utilities.log_parser import CurrentRps
+
+SCHEDULED = 'scheduled'
+CONTROLLER = 'controller'
+REACTIVE = 'reactive'
+
+EVALUATION_COLUMNS = ('pattern', 'mode', 'average_rps', 'max_rps', 'ih', 'rps_per_ih',
+                      'peak_instances', 'scale_outs', 'scale_ins')
+
+
+class DemandForecast:
+    """
+    Per-minute demand curves of the patterns seen in past runs, and the
+    capacity they call for.
+    """
+
+    def __init__(self, curves, instance_capacity=DEFAULT_INSTANCE_CAPACITY,
+                 headroom=1.1, lead_minutes=1):
+        """
+        :param curves: dict of pattern to list of per-minute RPS
+        :param instance_capacity: RPS one web service serves
+        :param headroom: capacity provisioned per unit of forecast demand
+        :param lead_minutes: minutes ahead of the demand the capacity is raised
+        """
+        if not curves:
+            raise ValueError('Predictive scaling needs the demand of at least one run')
+        self.curves = curves
+        self.instance_capacity = instance_capacity
+        self.headroom = headroom
+        self.lead_minutes = lead_minutes
+        # Highest demand of every minute over all patterns
+        length = max(len(curve) for curve in curves.values())
+        self.envelope = [max(curve[minute] for curve in curves.values() if minute < len(curve))
+                         for minute in range(length)]
+
+    @classmethod
+    def learn(cls, paths, instance_capacity=None, **kwargs):
+        """
+        :param paths: test.*.log files; only auto scaling tests are used
+        :param instance_capacity: RPS one web service serves, estimated from the logs if None
+        :return: DemandForecast
+        """
+        curves, estimated_capacity = load_demand(paths)
+        return cls(curves, instance_capacity or estimated_capacity or DEFAULT_INSTANCE_CAPACITY,
+                   **kwargs)
+
+    def match(self, observed):
+        """
+        :param observed: RPS of the minutes so far, None for a minute not reported
+        :return: the learned curve closest to the observed minutes, the
+            envelope before any observation
+        """
+        seen = [(minute, rps) for minute, rps in enumerate(observed or []) if rps is not None]
+        if not seen:
+            return self.envelope
+
+        def error(curve):
+            return sum((curve[minute] - rps) ** 2 if minute < len(curve) else rps ** 2
+                       for minute, rps in seen)
+
+        return min(self.curves.values(), key=error)
+
+    def desired_capacity(self, minute, observed=None):
+        """
+        :param minute: 1-based minute of the test the capacity is set at
+        :param observed: RPS of the minutes so far, None to follow the envelope
+        :return: web services needed over the next lead_minutes
+        """
+        curve = self.match(observed)
+        window = curve[minute - 1:minute + self.lead_minutes]
+        demand = max(window, default=0.0)
+        if observed and observed[-1] is not None:
+            # The LG reports served RPS: a saturated group only gives a lower bound
+            demand = max(demand, observed[-1])
+        return math.ceil(demand * self.headroom / self.instance_capacity)
+
+    def schedule(self, min_size, max_size):
+        """
+        :return: list of (1-based minute, capacity), one per capacity change of the envelope
+        """
+        actions = []
+        for minute in range(1, len(self.envelope) + 1):
+            capacity = max(min_size, min(max_size, self.desired_capacity(minute)))
+            if not actions or actions[-1][1] != capacity:
+                actions.append((minute, capacity))
+        return actions
+
+
+########################################
+# Deployment
+########################################
+def put_scheduled_actions(asg_client, asg_name, forecast, min_size, max_size):
+    """
+    Register the capacity plan of the envelope as scheduled actions setting
+    the minimum size, timed from now, the start of the auto scaling test
+    :return: list of (minute, capacity) scheduled
+    """
+    actions = forecast.schedule(min_size, max_size)
+    start = datetime.fromtimestamp(get_clock().time(), timezone.utc)
+    # Scheduled actions must start in the future: apply the first one now
+    first_minute, first_capacity = actions[0]
+    asg_client.update_auto_scaling_group(AutoScalingGroupName=asg_name,
+                                         MinSize=first_capacity)
+    later = [{
+        'ScheduledActionName': '{}-forecast-{}'.format(asg_name, minute),
+        'StartTime': start + timedelta(minutes=minute - 1),
+        'MinSize': capacity
+    } for minute, capacity in actions[1:]]
+    # The batch call takes up to 50 actions
+    for index in range(0, len(later), 50):
+        response = asg_client.batch_put_scheduled_update_group_action(
+            AutoScalingGroupName=asg_name,
+            ScheduledUpdateGroupActions=later[index:index + 50]
+        )
+        for failed in response.get('FailedScheduledUpdateGroupActions', []):
+            print("Scheduled action {} failed: {}".format(
+                failed['ScheduledActionName'], failed.get('ErrorMessage')))
+    print("Scheduled {} capacity changes from the demand of past runs".format(len(actions)))
+    return actions
+
+
+class PredictiveController:
+    """
+    Set the minimum size of the ASG once a minute from the forecast,
+    matching the RPS the test log reports against the learned patterns.
+    """
+
+    def __init__(self, asg_client, asg_name, forecast, min_size, max_size):
+        """
+        :param asg_client: boto3 autoscaling client
+        :param asg_name: name of the Auto Scaling Group
+        :param forecast: DemandForecast
+        :param min_size: minimum size of the group
+        :param max_size: maximum size of the group
+        """
+        self.asg_client = asg_client
+        self.asg_name = asg_name
+        self.forecast = forecast
+        self.min_size = min_size
+        self.max_size = max_size
+        self.observed = []
+        self.start = None
+        self.minute = None
+        self.floor = None
+
+    def attach(self, log_tail):
+        """
+        Follow the RPS of a test that has just started
+        :param log_tail: LogTail of the auto scaling test
+        :return: self
+        """
+        log_tail.subscribe(self.on_event)
+        self.start = get_clock().monotonic()
+        return self
+
+    def on_event(self, event):
+        if isinstance(event, CurrentRps):
+            self.observed.extend([None] * (event.minute - len(self.observed)))
+            self.observed[event.minute - 1] = event.rps
+
+    def tick(self):
+        """
+        Update the minimum size once per minute of the test
+        :return: None
+        """
+        minute = int((get_clock().monotonic() - self.start) // 60) + 1
+        if minute == self.minute:
+            return
+        floor = max(self.min_size, min(self.max_size,
+                                       self.forecast.desired_capacity(minute, self.observed)))
+        if floor != self.floor:
+            try:
+                # The ASG raises the desired capacity to a higher minimum
+                self.asg_client.update_auto_scaling_group(
+                    AutoScalingGroupName=self.asg_name,
+                    MinSize=floor
+                )
+            except botocore.exceptions.ClientError as e:
+                # Retried on the next tick
+                print(f"Predictive scaling could not set the minimum size to {floor}: {e}")
+                return
+            print("Predictive scaling: minute {}, minimum size {}".format(minute, floor))
+            self.floor = floor
+        self.minute = minute
+
+
+########################################
+# Evaluation
+########################################
+class PredictiveSimulation(AsgSimulation):
+    """
+    AsgSimulation whose minimum size is set by the forecast at the start of
+    every minute, under the alarms and policies of the configuration.
+    """
+
+    def __init__(self, configuration, demand, forecast, mode, **kwargs):
+        super().__init__(configuration, demand, **kwargs)
+        self.forecast = forecast
+        self.mode = mode
+        self.base_min_size = self.min_size
+
+    def plan(self):
+        minute = len(self.minute_rps) + 1
+        if minute > len(self.demand):
+            return
+        observed = self.minute_rps if self.mode == CONTROLLER else None
+        self.min_size = max(self.base_min_size, min(
+            self.max_size, self.forecast.desired_capacity(minute, observed)))
+        if self.capacity() < self.min_size:
+            self.set_desired(self.min_size)
+
+    def on_start(self):
+        self.plan()
+
+    def on_minute(self):
+        super().on_minute()
+        self.plan()
+
+
+def evaluate(configuration, demand, forecast, instance_capacity, boot_delay, seed=0):
+    """
+    Simulate every pattern reactively and with both predictive modes
+    :param demand: dict of pattern to list of per-minute RPS
+    :return: Table of EVALUATION_COLUMNS
+    """
+    table = Table(EVALUATION_COLUMNS)
+    for pattern, curve in demand.items():
+        for mode in (REACTIVE, SCHEDULED, CONTROLLER):
+            kwargs = dict(instance_capacity=instance_capacity, boot_delay=boot_delay, seed=seed)
+            if mode == REACTIVE:
+                simulation = AsgSimulation(configuration, curve, **kwargs)
+            else:
+                simulation = PredictiveSimulation(configuration, curve, forecast, mode, **kwargs)
+            table.append(dict(simulation.run(), pattern=pattern, mode=mode))
+    return table
+
+
+def print_evaluation(table):
+    print('{:>10} {:>10} {:>10} {:>10} {:>8} {:>10} {:>6} {:>5} {:>5}'.format(
+        'pattern', 'mode', 'avg rps', 'max rps', 'ih', 'rps/ih', 'peak', 'out', 'in'))
+    for row in table.rows():
+        print('{:>10} {:>10} {:>10.2f} {:>10.2f} {:>8.1f} {:>10.4f} {:>6} {:>5} {:>5}'.format(
+            str(row['pattern']), row['mode'], row['average_rps'], row['max_rps'], row['ih'],
+            row['rps_per_ih'] or 0, row['peak_instances'], row['scale_outs'], row['scale_ins']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('logs', nargs='*',
+                        help='auto scaling test.*.log files; the simulator pattern if none')
+    parser.add_argument('--config', default=CONFIG_FILE)
+    parser.add_argument('--headroom', type=float,
+                        help='override "predictive_scaling.headroom" of the config')
+    parser.add_argument('--lead-minutes', type=int,
+                        help='override "predictive_scaling.lead_minutes" of the config')
+    parser.add_argument('--instance-capacity', type=float,
+                        help='RPS one instance serves; estimated from the logs by default')
+    parser.add_argument('--boot-delay', type=float, default=DEFAULT_BOOT_DELAY)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--schedule', action='store_true',
+                        help='print the scheduled actions the config would register')
+    parser.add_argument('--csv', metavar='PATH', help='write the evaluation to a CSV file')
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        configuration = json.load(f)
+    settings = configuration['predictive_scaling']
+    demand, estimated_capacity = load_demand(args.logs)
+    if not demand:
+        print('No auto scaling log given, using the simulator demand pattern')
+        demand = {'simulator': DEFAULT_PATTERN}
+    instance_capacity = args.instance_capacity or settings['instance_capacity'] \
+        or estimated_capacity or DEFAULT_INSTANCE_CAPACITY
+    forecast = DemandForecast(
+        demand, instance_capacity,
+        headroom=args.headroom or settings['headroom'],
+        lead_minutes=args.lead_minutes if args.lead_minutes is not None
+        else settings['lead_minutes'])
+    print('{} pattern(s), {:.2f} RPS per instance, headroom {}, {} lead minute(s)'.format(
+        len(demand), instance_capacity, forecast.headroom, forecast.lead_minutes))
+
+    if args.schedule:
+        print('\nScheduled actions:')
+        for minute, capacity in forecast.schedule(configuration['asg_min_size'],
+                                                  configuration['asg_max_size']):
+            print('  minute {:>3}: {} web services'.format(minute, capacity))
+        print()
+
+    table = evaluate(configuration, demand, forecast, instance_capacity, args.boot_delay,
+                     args.seed)
+    print_evaluation(table)
+    if args.csv:
+        table.to_csv(args.csv)
+        print('Evaluation written to {}'.format(args.csv))
+
+
+if __name__ == '__main__':
+    main()
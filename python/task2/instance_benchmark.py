@@ -0,0 +1,214 @@
+"""
+Offline benchmark of the instance types of a mixed instances group.
+
+Every candidate type is replayed alone on the ASG simulation of
+autotune.py, with the demand of past auto scaling tests, and ranked by the
+RPS it serves per instance-hour and per dollar:
+
+    python instance_benchmark.py test.*.log
+    python instance_benchmark.py --types m5.large:1,c5.large:1,m5.xlarge:2 test.*.log
+
+The weight of a type is the RPS it serves relative to "instance_type", as
+the WeightedCapacity of the mixed instances policy. A type of weight w
+serves w times the RPS measured in the logs, its RPS thresholds are scaled
+by w and the group size divided by w, so every type is scaled to the same
+load per capacity unit. Without a measured weight the vCPU ratio is used,
+so the ranking mostly reflects the price per capacity unit and how coarse
+each scaling step is; confirm a type with a real run before listing it.
+
+Prices are on-demand Linux prices of us-east-1, override them with --price.
+"""
+import argparse
+import json
+import math
+
+from analyze_logs import Table
+from autotune import (
+    CONFIG_FILE, DEFAULT_BOOT_DELAY, DEFAULT_INSTANCE_CAPACITY, AsgSimulation, apply_overrides,
+    load_demand
+)
+from utilities.lg_simulator import DEFAULT_PATTERN, IH_SECONDS_PER_UNIT
+
+# vCPUs and on-demand $/hour in us-east-1
+INSTANCE_TYPES = {
+    't3.large': (2, 0.0832),
+    'm5.large': (2, 0.096),
+    'm5a.large': (2, 0.086),
+    'm6i.large': (2, 0.096),
+    'm6a.large': (2, 0.0864),
+    'm7i.large': (2, 0.1008),
+    'c5.large': (2, 0.085),
+    'c5a.large': (2, 0.077),
+    'c6i.large': (2, 0.085),
+    'c6a.large': (2, 0.0765),
+    'r5.large': (2, 0.126),
+    'm5.xlarge': (4, 0.192),
+    'c5.xlarge': (4, 0.17),
+    'm6i.xlarge': (4, 0.192),
+}
+
+# Compared when the config lists no mixed instance types
+DEFAULT_CANDIDATES = ('m5.large', 'm5a.large', 'm6i.large', 'c5.large', 'c6i.large',
+                      't3.large', 'm5.xlarge', 'c5.xlarge')
+
+BENCHMARK_COLUMNS = ('pattern', 'instance_type', 'weight', 'price', 'average_rps',
+                     'instance_hours', 'rps_per_instance_hour', 'cost', 'rps_per_dollar',
+                     'peak_instances')
+
+
+def default_weight(instance_type, base_type):
+    """
+    :return: vCPUs of instance_type relative to base_type
+    """
+    if instance_type not in INSTANCE_TYPES or base_type not in INSTANCE_TYPES:
+        raise ValueError('No vCPU count for {}, give its weight'.format(
+            instance_type if instance_type not in INSTANCE_TYPES else base_type))
+    return INSTANCE_TYPES[instance_type][0] / INSTANCE_TYPES[base_type][0]
+
+
+def weighted_configuration(configuration, weight):
+    """
+    Scale the per-instance settings of a configuration to instances serving
+    `weight` times the RPS of "instance_type"
+    :param configuration: base configuration
+    :param weight: relative capacity of the instance type
+    :return: a new configuration
+    """
+    overrides = {
+        'asg_min_size': max(1, math.ceil(configuration['asg_min_size'] / weight)),
+        'asg_max_size': max(1, math.ceil(configuration['asg_max_size'] / weight)),
+    }
+    if configuration['scaling_metric'] == 'rps':
+        # CPU thresholds are already relative to the instance size
+        policy = configuration.get('scaling_policy') or {}
+        overrides.update({
+            'rps_per_instance_lower_threshold':
+                configuration['rps_per_instance_lower_threshold'] * weight,
+            'rps_per_instance_upper_threshold':
+                configuration['rps_per_instance_upper_threshold'] * weight,
+        })
+        if policy.get('target_value') is not None:
+            overrides['scaling_policy.target_value'] = policy['target_value'] * weight
+        for key in ('scale_out_steps', 'scale_in_steps'):
+            if policy.get(key):
+                overrides['scaling_policy.' + key] = [dict(step, **{
+                    bound: None if step[bound] is None else step[bound] * weight
+                    for bound in ('lower', 'upper')
+                }) for step in policy[key]]
+    return apply_overrides(configuration, overrides)
+
+
+def benchmark(configuration, demand, candidates, prices, instance_capacity, boot_delay,
+              seed=0):
+    """
+    Simulate every pattern with a group of each candidate type
+    :param demand: dict of pattern to list of per-minute RPS
+    :param candidates: list of (instance type, weight)
+    :param prices: dict of instance type to $/hour
+    :param instance_capacity: RPS one instance of "instance_type" serves
+    :return: Table of BENCHMARK_COLUMNS
+    """
+    table = Table(BENCHMARK_COLUMNS)
+    for pattern, curve in demand.items():
+        for instance_type, weight in candidates:
+            simulation = AsgSimulation(weighted_configuration(configuration, weight), curve,
+                                       instance_capacity * weight, boot_delay=boot_delay,
+                                       seed=seed)
+            result = simulation.run()
+            hours = result['ih'] * IH_SECONDS_PER_UNIT / 3600
+            cost = hours * prices[instance_type]
+            table.append({
+                'pattern': pattern,
+                'instance_type': instance_type,
+                'weight': weight,
+                'price': prices[instance_type],
+                'average_rps': result['average_rps'],
+                'instance_hours': hours,
+                'rps_per_instance_hour': result['average_rps'] / hours if hours else None,
+                'cost': cost,
+                'rps_per_dollar': result['average_rps'] / cost if cost else None,
+                'peak_instances': result['peak_instances'],
+            })
+    return table
+
+
+def print_benchmark(table):
+    print('{:>10} {:>10} {:>6} {:>7} {:>8} {:>8} {:>10} {:>7} {:>9} {:>5}'.format(
+        'pattern', 'type', 'weight', '$/h', 'avg rps', 'inst h', 'rps/inst h', 'cost $',
+        'rps/$', 'peak'))
+    rows = sorted(table.rows(), key=lambda row: (str(row['pattern']),
+                                                 -(row['rps_per_dollar'] or 0)))
+    for row in rows:
+        print('{:>10} {:>10} {:>6.2f} {:>7.4f} {:>8.2f} {:>8.2f} {:>10.2f} {:>7.3f} {:>9.1f} '
+              '{:>5}'.format(str(row['pattern']), row['instance_type'], row['weight'],
+                             row['price'], row['average_rps'], row['instance_hours'],
+                             row['rps_per_instance_hour'] or 0, row['cost'],
+                             row['rps_per_dollar'] or 0, row['peak_instances']))
+
+
+def parse_types(value):
+    """
+    :param value: comma separated "type" or "type:weight"
+    :return: list of (type, weight or None)
+    """
+    types = []
+    for item in value.split(','):
+        instance_type, _, weight = item.partition(':')
+        types.append((instance_type, float(weight) if weight else None))
+    return types
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('logs', nargs='*',
+                        help='auto scaling test.*.log files; the simulator pattern if none')
+    parser.add_argument('--config', default=CONFIG_FILE)
+    parser.add_argument('--types', type=parse_types,
+                        help='comma separated type[:weight] to compare; the '
+                             '"mixed_instances" types of the config, else a default set')
+    parser.add_argument('--price', action='append', default=[], metavar='TYPE=PRICE',
+                        help='on-demand $/hour of a type')
+    parser.add_argument('--instance-capacity', type=float,
+                        help='RPS one "instance_type" instance serves; estimated from '
+                             'the logs by default')
+    parser.add_argument('--boot-delay', type=float, default=DEFAULT_BOOT_DELAY)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--csv', metavar='PATH', help='write the benchmark to a CSV file')
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        configuration = json.load(f)
+    base_type = configuration['instance_type']
+    types = args.types or [(entry['instance_type'], entry['weight'])
+                           for entry in configuration['mixed_instances']['instance_types']] \
+        or [(instance_type, None) for instance_type in DEFAULT_CANDIDATES]
+    candidates = [(instance_type, weight or default_weight(instance_type, base_type))
+                  for instance_type, weight in types]
+
+    prices = {instance_type: price for instance_type, (_, price) in INSTANCE_TYPES.items()}
+    for item in args.price:
+        instance_type, _, price = item.partition('=')
+        prices[instance_type] = float(price)
+    unknown = [instance_type for instance_type, _ in candidates if instance_type not in prices]
+    if unknown:
+        parser.error('no price for {}, give it with --price'.format(', '.join(unknown)))
+
+    demand, estimated_capacity = load_demand(args.logs)
+    if not demand:
+        print('No auto scaling log given, using the simulator demand pattern')
+        demand = {'simulator': DEFAULT_PATTERN}
+    instance_capacity = args.instance_capacity or estimated_capacity or DEFAULT_INSTANCE_CAPACITY
+    print('{} pattern(s), {:.2f} RPS per {} instance'.format(
+        len(demand), instance_capacity, base_type))
+
+    table = benchmark(configuration, demand, candidates, prices, instance_capacity,
+                      args.boot_delay, args.seed)
+    print_benchmark(table)
+    if args.csv:
+        table.to_csv(args.csv)
+        print('Benchmark written to {}'.format(args.csv))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""
+Publish the request rate the LG reports as custom CloudWatch metrics, so
+the ASG can scale on load instead of CPU.
+
+The bridge subscribes to a LogTail, turns every [Minute N] sample into
+metric data and sends them in batched put_metric_data calls. A background
+thread flushes every flush_interval seconds, so data buffered between two
+log samples is not held back until the next one arrives. Only needs a
+CloudWatch client, so it runs against moto as well as AWS.
+"""
+import threading
+
+import botocore
+
+from utilities.clock import get_clock
+from utilities.log_parser import CurrentRps, MinuteSample
+
+DEFAULT_NAMESPACE = 'VMScaling'
+REQUEST_RATE = 'RequestRate'
+REQUEST_RATE_PER_INSTANCE = 'RequestRatePerInstance'
+LATENCY = 'Latency'
+
+# Fields of a minute block that carry a latency, in milliseconds
+LATENCY_FIELDS = ('latency', 'responseTime')
+
+# put_metric_data accepts up to 1000 datums; stay well below
+MAX_BATCH_SIZE = 20
+
+
+class MetricsBridge:
+    """
+    Buffer metric data parsed from the LG log and flush it to CloudWatch.
+    """
+
+    def __init__(self, cw_client, namespace=DEFAULT_NAMESPACE, dimensions=None,
+                 capacity_fn=None, batch_size=MAX_BATCH_SIZE, flush_interval=30):
+        """
+        :param cw_client: CloudWatch client
+        :param namespace: namespace of the custom metrics
+        :param dimensions: list of {'Name', 'Value'} dicts added to every datum
+        :param capacity_fn: function returning the number of in-service instances,
+            used for RequestRatePerInstance; None to skip that metric
+        :param batch_size: number of buffered datums that triggers a flush
+        :param flush_interval: seconds between two background flushes
+        """
+        self.cw_client = cw_client
+        self.namespace = namespace
+        self.dimensions = dimensions or []
+        self.capacity_fn = capacity_fn
+        self.batch_size = min(batch_size, MAX_BATCH_SIZE)
+        self.flush_interval = flush_interval
+        self.buffer = []
+        self.lock = threading.RLock()
+        self.timer = None
+        self.stopped = threading.Event()
+        self.published = 0
+        self.calls = 0
+
+    def start(self):
+        """
+        Start flushing every flush_interval seconds in the background
+        :return: self
+        """
+        if self.timer is None:
+            # Registered with the clock before the thread starts
+            self.timer = threading.Thread(target=self.flush_periodically,
+                                          args=(get_clock().actor(),),
+                                          name='metrics-bridge', daemon=True)
+            self.timer.start()
+        return self
+
+    def flush_periodically(self, actor):
+        clock = get_clock()
+        with actor:
+            while True:
+                clock.sleep(self.flush_interval)
+                if self.stopped.is_set():
+                    return
+                self.flush()
+
+    def attach(self, log_tail):
+        """
+        Publish the metrics of every minute parsed by a LogTail
+        :param log_tail: LogTail following a warmup or auto scaling test
+        :return: self
+        """
+        log_tail.subscribe(self.on_event)
+        return self
+
+    def on_event(self, event):
+        """
+        LogTail listener
+        :param event: event emitted by the LogParser
+        :return: None
+        """
+        if isinstance(event, CurrentRps):
+            self.add(REQUEST_RATE, event.rps, 'Count/Second')
+            if self.capacity_fn is not None:
+                capacity = self.capacity_fn()
+                if capacity:
+                    self.add(REQUEST_RATE_PER_INSTANCE, event.rps / capacity, 'Count/Second')
+        elif isinstance(event, MinuteSample):
+            for field in LATENCY_FIELDS:
+                if field in event.instance_rps:
+                    self.add(LATENCY, event.instance_rps[field], 'Milliseconds')
+                    break
+        else:
+            return
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def add(self, name, value, unit):
+        """
+        Buffer one datum stamped with the current time
+        :param name: metric name
+        :param value: metric value
+        :param unit: CloudWatch unit
+        :return: None
+        """
+        datum = {
+            'MetricName': name,
+            'Dimensions': self.dimensions,
+            'Timestamp': get_clock().now(),
+            'Value': value,
+            'Unit': unit,
+            # High resolution so that alarms can use periods under a minute
+            'StorageResolution': 1
+        }
+        with self.lock:
+            self.buffer.append(datum)
+
+    def flush(self):
+        """
+        Send every buffered datum, batch_size datums per call
+        :return: None
+        """
+        with self.lock:
+            while self.buffer:
+                batch = self.buffer[:self.batch_size]
+                try:
+                    self.cw_client.put_metric_data(Namespace=self.namespace, MetricData=batch)
+                except (botocore.exceptions.BotoCoreError,
+                        botocore.exceptions.ClientError) as e:
+                    # Keep the data and try again on the next flush rather
+                    # than interrupting the test
+                    print(f"Publishing metrics failed, retrying later: {e}")
+                    return
+                del self.buffer[:len(batch)]
+                self.published += len(batch)
+                self.calls += 1
+
+    def close(self):
+        """
+        Stop the background flushes, flush what is left and report how
+        much was published
+        :return: None
+        """
+        self.stopped.set()
+        self.flush()
+        print("Published {} metric data points to {} in {} calls".format(
+            self.published, self.namespace, self.calls))
@@ -0,0 +1,285 @@
+"""
+Minimum lifetime of the web services of the ASG.
+
+An instance scaled in a minute or two after it was launched is billed for
+its boot without ever serving steady traffic. With "min_instance_lifetime"
+set, the ASG protects new instances from scale in and ScaleInProtection
+lifts the protection once an instance has been in service that long. A
+scale in meanwhile lowers the desired capacity, and the ASG terminates the
+instance as soon as it is no longer protected. "termination_policies"
+picks which unprotected instance goes first.
+
+The rule is replayed on the Instance-Hour Usage rows of the logs: each
+instance terminated before the minimum lifetime is kept until it reaches
+it, and stands in for the next instance launched meanwhile. The net saving
+is the instance-minutes of the relaunches avoided minus the extra minutes
+of the instances kept; it is negative when the rule only adds capacity.
+The rule is also replayed on
+the ASG simulation of autotune.py, with the demand of the logs, to show
+what it costs in capacity kept:
+
+    python scale_in_protection.py test.*.log
+    python scale_in_protection.py --min-lifetime 120,300,600 test.*.log
+"""
+import argparse
+import json
+
+import botocore
+
+from analyze_logs import read_run
+from autotune import (
+    CONFIG_FILE, DEFAULT_BOOT_DELAY, DEFAULT_INSTANCE_CAPACITY, AsgSimulation, apply_overrides,
+    load_demand
+)
+from utilities.clock import get_clock
+from utilities.lg_simulator import DEFAULT_PATTERN
+
+# Terminated instances that lived less than this never served steady traffic
+SHORT_LIVED = 180
+
+# set_instance_protection takes up to 50 instances per call
+PROTECTION_BATCH = 50
+
+
+class ScaleInProtection:
+    """
+    Keep instances protected from scale in until they have been in service
+    for min_lifetime seconds.
+    """
+
+    def __init__(self, asg_client, asg_name, min_lifetime, interval=10):
+        """
+        :param asg_client: boto3 autoscaling client
+        :param asg_name: name of the Auto Scaling Group
+        :param min_lifetime: seconds an instance serves before it may be scaled in
+        :param interval: seconds between two checks of the group
+        """
+        self.asg_client = asg_client
+        self.asg_name = asg_name
+        self.min_lifetime = min_lifetime
+        self.interval = interval
+        self.in_service_since = {}
+        self.next_check = 0.0
+        self.released = 0
+
+    def set_protection(self, instance_ids, protected):
+        for index in range(0, len(instance_ids), PROTECTION_BATCH):
+            self.asg_client.set_instance_protection(
+                InstanceIds=instance_ids[index:index + PROTECTION_BATCH],
+                AutoScalingGroupName=self.asg_name,
+                ProtectedFromScaleIn=protected
+            )
+
+    def tick(self):
+        """
+        Protect young instances and release the ones that served min_lifetime
+        :return: None
+        """
+        now = get_clock().monotonic()
+        if now < self.next_check:
+            return
+        self.next_check = now + self.interval
+        try:
+            groups = self.asg_client.describe_auto_scaling_groups(
+                AutoScalingGroupNames=[self.asg_name]
+            )['AutoScalingGroups']
+            if not groups:
+                return
+            protect, release = [], []
+            for instance in groups[0]['Instances']:
+                instance_id = instance['InstanceId']
+                if instance['LifecycleState'] == 'InService':
+                    self.in_service_since.setdefault(instance_id, now)
+                served = now - self.in_service_since.get(instance_id, now)
+                if served >= self.min_lifetime:
+                    if instance['ProtectedFromScaleIn']:
+                        release.append(instance_id)
+                elif not instance['ProtectedFromScaleIn'] and \
+                        instance['LifecycleState'] in ('Pending', 'InService'):
+                    # e.g. instances coming back from the warm pool
+                    protect.append(instance_id)
+            if protect:
+                self.set_protection(protect, True)
+            if release:
+                self.set_protection(release, False)
+                self.released += len(release)
+                print("Scale-in protection lifted from {} instance(s) after {} s in service".format(
+                    len(release), self.min_lifetime))
+        except botocore.exceptions.ClientError as e:
+            # Retried on the next check; protected instances just live longer
+            print(f"Scale-in protection check failed: {e}")
+
+
+########################################
+# Replay
+########################################
+def log_churn(paths, short_lived=SHORT_LIVED):
+    """
+    Count the short-lived instances of the Instance-Hour Usage tables
+    :param paths: test.*.log files
+    :param short_lived: lifetime in seconds under which an instance counts as churn
+    :return: list of (run, instances, short-lived instances, their instance-minutes)
+    """
+    rows = []
+    for path in paths:
+        run = read_run(path)
+        if not run['instances']:
+            continue
+        lifetimes = [termination - launch for launch, termination in run['instances']
+                     if termination is not None]
+        short = [lifetime for lifetime in lifetimes if lifetime < short_lived]
+        rows.append((run['run'], len(run['instances']), len(short), sum(short) / 60))
+    return rows
+
+
+def lifetime_effect(instances, min_lifetime):
+    """
+    Replay a minimum lifetime on the instances of one log: every instance
+    terminated younger than min_lifetime is kept until it reaches it, and
+    the first instance launched meanwhile is not launched, the kept one
+    serving in its place for as long as it would have lived
+    :param instances: (launch, termination) timestamps, termination None
+        for instances still running at the end of the log
+    :param min_lifetime: minimum lifetime in seconds
+    :return: (instances kept longer, relaunches avoided, instance-seconds
+        saved), negative when keeping costs more than the relaunches avoided
+    """
+    instances = sorted(instances, key=lambda instance: instance[0])
+    avoided = set()
+    kept = 0
+    saved = 0.0
+    for index, (launch, termination) in enumerate(instances):
+        if index in avoided or termination is None or termination - launch >= min_lifetime:
+            continue
+        kept += 1
+        until = launch + min_lifetime
+        replacement = next((other for other, (other_launch, _) in enumerate(instances)
+                            if other not in avoided and termination <= other_launch < until),
+                           None)
+        if replacement is None:
+            saved -= until - termination
+            continue
+        avoided.add(replacement)
+        other_launch, other_termination = instances[replacement]
+        # The kept instance idles from its termination to the relaunch, then
+        # lives as long as the relaunched one would have
+        if other_termination is None or other_termination >= until:
+            saved += termination - other_launch
+        else:
+            saved += termination + other_termination - other_launch - until
+    return kept, len(avoided), saved
+
+
+def log_savings(paths, lifetimes):
+    """
+    Net effect of minimum lifetimes on the instances of the logs
+    :param paths: test.*.log files
+    :param lifetimes: minimum lifetimes in seconds
+    :return: list of (lifetime, instances kept longer, relaunches avoided,
+        instance-minutes saved), see lifetime_effect()
+    """
+    runs = [read_run(path)['instances'] for path in paths]
+    rows = []
+    for lifetime in lifetimes:
+        kept = avoided = 0
+        saved = 0.0
+        for instances in runs:
+            run_kept, run_avoided, run_saved = lifetime_effect(instances, lifetime)
+            kept += run_kept
+            avoided += run_avoided
+            saved += run_saved
+        rows.append((lifetime, kept, avoided, saved / 60))
+    return rows
+
+
+def replay(configuration, demand, instance_capacity, boot_delay, short_lived=SHORT_LIVED,
+           seed=0):
+    """
+    Simulate every demand pattern with one configuration
+    :return: dict of launches, short-lived instances, instance-minutes and average RPS
+        summed (average RPS averaged) over the patterns
+    """
+    totals = {'launches': 0, 'short_lived': 0, 'instance_minutes': 0.0, 'average_rps': 0.0}
+    for curve in demand.values():
+        simulation = AsgSimulation(configuration, curve, instance_capacity,
+                                   boot_delay=boot_delay, seed=seed)
+        result = simulation.run()
+        duration = len(curve) * 60
+        for instance in simulation.instances:
+            end = min(instance.termination if instance.termination is not None
+                      else duration, duration)
+            totals['instance_minutes'] += (end - instance.launch) / 60
+            if instance.termination is not None and end - instance.launch < short_lived:
+                totals['short_lived'] += 1
+        totals['launches'] += len(simulation.instances)
+        totals['average_rps'] += result['average_rps'] / len(demand)
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('logs', nargs='*',
+                        help='test.*.log files; the simulator pattern is replayed if none')
+    parser.add_argument('--config', default=CONFIG_FILE)
+    parser.add_argument('--min-lifetime', type=lambda s: [float(x) for x in s.split(',')],
+                        help='comma separated lifetimes to replay, '
+                             '"min_instance_lifetime" of the config by default')
+    parser.add_argument('--short-lived', type=float, default=SHORT_LIVED,
+                        help='seconds under which a terminated instance counts as churn')
+    parser.add_argument('--instance-capacity', type=float,
+                        help='RPS one instance serves; estimated from the logs by default')
+    parser.add_argument('--boot-delay', type=float, default=DEFAULT_BOOT_DELAY)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        configuration = json.load(f)
+
+    churn = log_churn(args.logs, args.short_lived)
+    if churn:
+        print('Instances of the logs living under {:.0f} s:'.format(args.short_lived))
+        print('{:<32} {:>10} {:>12} {:>10}'.format('run', 'instances', 'short-lived', 'minutes'))
+        for run, instances, short, minutes in churn:
+            print('{:<32} {:>10} {:>12} {:>10.1f}'.format(run, instances, short, minutes))
+        print()
+        print('Net effect of the minimum lifetime on the instances of the logs:')
+        print('{:>12} {:>10} {:>10} {:>10}'.format('lifetime s', 'kept', 'avoided', 'saved min'))
+        savings = log_savings(args.logs,
+                              args.min_lifetime or [configuration['min_instance_lifetime']])
+        for lifetime, kept, avoided, minutes in savings:
+            print('{:>12.0f} {:>10} {:>10} {:>10.1f}'.format(lifetime, kept, avoided, minutes))
+        if all(minutes <= 0 for _, _, _, minutes in savings):
+            print('The logs show no saving: keeping the short-lived instances costs more '
+                  'instance-minutes than the relaunches it avoids.')
+        print()
+
+    demand, estimated_capacity = load_demand(args.logs)
+    if not demand:
+        print('No auto scaling log given, replaying the simulator demand pattern')
+        demand = {'simulator': DEFAULT_PATTERN}
+    instance_capacity = args.instance_capacity or estimated_capacity or DEFAULT_INSTANCE_CAPACITY
+    lifetimes = args.min_lifetime or [configuration['min_instance_lifetime']]
+
+    baseline = replay(apply_overrides(configuration, {'min_instance_lifetime': 0}), demand,
+                      instance_capacity, args.boot_delay, args.short_lived, args.seed)
+    print('Replay of {} pattern(s), {} termination policies:'.format(
+        len(demand), ','.join(configuration['termination_policies']) or 'Default'))
+    print('{:>12} {:>9} {:>12} {:>10} {:>10} {:>10}'.format(
+        'lifetime s', 'launches', 'short-lived', 'inst-min', 'saved min', 'avg rps'))
+    for lifetime in [0] + [lifetime for lifetime in lifetimes if lifetime]:
+        totals = replay(apply_overrides(configuration, {'min_instance_lifetime': lifetime}),
+                        demand, instance_capacity, args.boot_delay, args.short_lived,
+                        args.seed) if lifetime else baseline
+        print('{:>12.0f} {:>9} {:>12} {:>10.1f} {:>10.1f} {:>10.2f}'.format(
+            lifetime, totals['launches'], totals['short_lived'], totals['instance_minutes'],
+            baseline['instance_minutes'] - totals['instance_minutes'], totals['average_rps']))
+    logged_short = sum(short for _, _, short, _ in churn)
+    if logged_short and not baseline['short_lived']:
+        print('Note: the simulated baseline has no short-lived instance while the logs have {}, '
+              'so the replay does not reproduce the logged churn; use the saving measured '
+              'on the logs above.'.format(logged_short))
+
+
+if __name__ == '__main__':
+    main()
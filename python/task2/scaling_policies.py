@@ -0,0 +1,230 @@
+"""
+Generate the ASG scaling policies and their CloudWatch alarms from the
+"scaling_policy" section of auto-scaling-config.json.
+
+    "scaling_policy": {
+        "type": "StepScaling",
+        "estimated_instance_warmup": 60,
+        "scale_out_steps": [
+            {"lower": 0, "upper": 2, "adjustment": 1},
+            {"lower": 2, "upper": null, "adjustment": 3}
+        ],
+        "scale_in_steps": [{"lower": null, "upper": 0, "adjustment": -1}],
+        "scale_in_evaluation_periods": 3
+    }
+
+"type" is one of:
+  SimpleScaling          one +/- adjustment per alarm, the original setup
+                         (scale_out_adjustment, cool_down_period_* and
+                         alarm_evaluation_periods_* keys; the other keys of
+                         the section are ignored)
+  StepScaling            the adjustment grows with how far the metric is past
+                         the alarm threshold; step bounds are offsets from it
+  TargetTrackingScaling  the ASG keeps the metric at "target_value" and
+                         manages its own alarms
+"""
+from typing import NamedTuple, Optional
+
+from metrics_bridge import REQUEST_RATE_PER_INSTANCE
+
+SIMPLE_SCALING = 'SimpleScaling'
+STEP_SCALING = 'StepScaling'
+TARGET_TRACKING_SCALING = 'TargetTrackingScaling'
+
+
+class PolicySpec(NamedTuple):
+    name: str
+    policy: dict
+    alarm: Optional[dict]
+    description: str
+
+
+def alarm_metric(configuration):
+    """
+    Describe the metric the scaling alarms watch
+    :param configuration: the whole auto-scaling-config.json
+    :return: (put_metric_alarm keyword arguments, lower threshold, upper threshold, label)
+    """
+    dimensions = [{'Name': 'AutoScalingGroupName',
+                   'Value': configuration['auto_scaling_group_name']}]
+    if configuration['scaling_metric'] == 'rps':
+        return {
+            'MetricName': REQUEST_RATE_PER_INSTANCE,
+            'Namespace': configuration['metrics_namespace'],
+            # The LG reports the request rate once a minute
+            'Period': max(configuration['alarm_period'], 60),
+            'Statistic': 'Average',
+            'Dimensions': dimensions,
+            'Unit': 'Count/Second',
+            # No sample yet (e.g. between tests) must not scale in or out
+            'TreatMissingData': 'notBreaching'
+        }, configuration['rps_per_instance_lower_threshold'], \
+            configuration['rps_per_instance_upper_threshold'], 'RPS per instance'
+    return {
+        'MetricName': 'CPUUtilization',
+        'Namespace': 'AWS/EC2',
+        'Period': configuration['alarm_period'],
+        'Statistic': 'Average',
+        'Dimensions': dimensions,
+        'Unit': 'Percent'
+    }, configuration['cpu_lower_threshold'], configuration['cpu_upper_threshold'], 'CPU'
+
+
+def format_threshold(metric, threshold):
+    """
+    :return: threshold with the unit of the metric, e.g. "50%" for CPU
+    """
+    return '{}%'.format(threshold) if metric.get('Unit') == 'Percent' else str(threshold)
+
+
+def step_adjustments(steps):
+    """
+    Convert config steps to StepAdjustments, checking that they tile the
+    metric range without gaps
+    :param steps: list of {"lower", "upper", "adjustment"} dicts, null for unbounded
+    :return: list of StepAdjustment dicts
+    """
+    if not steps:
+        raise ValueError('Step scaling needs at least one step')
+    steps = sorted(steps, key=lambda s: float('-inf') if s['lower'] is None else s['lower'])
+    for previous, step in zip(steps, steps[1:]):
+        if previous['upper'] is None or previous['upper'] != step['lower']:
+            raise ValueError('Scaling steps must be contiguous: {} then {}'.format(previous, step))
+    adjustments = []
+    for step in steps:
+        adjustment = {'ScalingAdjustment': step['adjustment']}
+        if step['lower'] is not None:
+            adjustment['MetricIntervalLowerBound'] = step['lower']
+        if step['upper'] is not None:
+            adjustment['MetricIntervalUpperBound'] = step['upper']
+        adjustments.append(adjustment)
+    return adjustments
+
+
+def describe_steps(steps, threshold, label):
+    return ', '.join(
+        '{:+d} when {} in [{}, {})'.format(
+            step['adjustment'], label,
+            '-inf' if step['lower'] is None else threshold + step['lower'],
+            'inf' if step['upper'] is None else threshold + step['upper'])
+        for step in steps
+    )
+
+
+def alarm_spec(asg_name, direction, metric, operator, threshold, evaluation_periods, label):
+    return dict(
+        AlarmName=f'{asg_name}-{direction}-alarm',
+        ComparisonOperator=operator,
+        EvaluationPeriods=evaluation_periods,
+        Threshold=threshold,
+        ActionsEnabled=True,
+        AlarmDescription=f'Trigger {direction.replace("-", " ")} when {label} '
+                         f'{">" if operator == "GreaterThanThreshold" else "<"} '
+                         f'{format_threshold(metric, threshold)}',
+        **metric
+    )
+
+
+def build_policy_specs(configuration, metric, lower, upper, label):
+    """
+    Build the scaling policies, and the alarms invoking them, of the ASG
+    :param configuration: the whole auto-scaling-config.json
+    :param metric: put_metric_alarm keyword arguments describing the scaling metric
+    :param lower: scale in threshold of the metric
+    :param upper: scale out threshold of the metric
+    :param label: human readable metric name
+    :return: list of PolicySpec
+    """
+    asg_name = configuration['auto_scaling_group_name']
+    policy_config = configuration.get('scaling_policy') or {'type': SIMPLE_SCALING}
+    policy_type = policy_config['type']
+    out_periods = configuration['alarm_evaluation_periods_scale_out']
+    in_periods = configuration['alarm_evaluation_periods_scale_in']
+    if policy_type != TARGET_TRACKING_SCALING and upper <= lower:
+        # Without a gap both alarms fire around the threshold and the group flaps
+        raise ValueError('The scale out threshold of {} ({}) must be above the scale in '
+                         'threshold ({})'.format(label, upper, lower))
+
+    if policy_type == SIMPLE_SCALING:
+        out_adjustment = configuration['scale_out_adjustment']
+        in_adjustment = configuration['scale_in_adjustment']
+        return [
+            PolicySpec(
+                'scale_out',
+                dict(AutoScalingGroupName=asg_name,
+                     PolicyName=f'{asg_name}-scale-out',
+                     PolicyType=SIMPLE_SCALING,
+                     AdjustmentType='ChangeInCapacity',
+                     ScalingAdjustment=out_adjustment,
+                     Cooldown=configuration['cool_down_period_scale_out']),
+                alarm_spec(asg_name, 'scale-out', metric, 'GreaterThanThreshold',
+                           upper, out_periods, label),
+                f'adds {out_adjustment} instances when {label} > '
+                f'{format_threshold(metric, upper)}'
+            ),
+            PolicySpec(
+                'scale_in',
+                dict(AutoScalingGroupName=asg_name,
+                     PolicyName=f'{asg_name}-scale-in',
+                     PolicyType=SIMPLE_SCALING,
+                     AdjustmentType='ChangeInCapacity',
+                     ScalingAdjustment=in_adjustment,
+                     Cooldown=configuration['cool_down_period_scale_in']),
+                alarm_spec(asg_name, 'scale-in', metric, 'LessThanThreshold',
+                           lower, in_periods, label),
+                f'removes {abs(in_adjustment)} instances when {label} < '
+                f'{format_threshold(metric, lower)}'
+            )
+        ]
+
+    warmup = policy_config.get('estimated_instance_warmup')
+    extra = {'EstimatedInstanceWarmup': warmup} if warmup is not None else {}
+    out_periods = policy_config.get('scale_out_evaluation_periods', out_periods)
+    in_periods = policy_config.get('scale_in_evaluation_periods', in_periods)
+
+    if policy_type == STEP_SCALING:
+        specs = []
+        for direction, steps_key, operator, threshold, periods in (
+                ('scale-out', 'scale_out_steps', 'GreaterThanThreshold', upper, out_periods),
+                ('scale-in', 'scale_in_steps', 'LessThanThreshold', lower, in_periods)):
+            steps = policy_config[steps_key]
+            specs.append(PolicySpec(
+                direction.replace('-', '_'),
+                dict(AutoScalingGroupName=asg_name,
+                     PolicyName=f'{asg_name}-{direction}',
+                     PolicyType=STEP_SCALING,
+                     AdjustmentType='ChangeInCapacity',
+                     MetricAggregationType=metric['Statistic'],
+                     StepAdjustments=step_adjustments(steps),
+                     **extra),
+                alarm_spec(asg_name, direction, metric, operator, threshold, periods, label),
+                describe_steps(steps, threshold, label)
+            ))
+        return specs
+
+    if policy_type == TARGET_TRACKING_SCALING:
+        if metric['Namespace'] == 'AWS/EC2' and metric['MetricName'] == 'CPUUtilization':
+            metric_spec = {'PredefinedMetricSpecification': {
+                'PredefinedMetricType': 'ASGAverageCPUUtilization'}}
+        else:
+            metric_spec = {'CustomizedMetricSpecification': {
+                key: metric[key]
+                for key in ('MetricName', 'Namespace', 'Dimensions', 'Statistic', 'Unit')
+                if key in metric}}
+        target = policy_config['target_value']
+        return [PolicySpec(
+            'target_tracking',
+            dict(AutoScalingGroupName=asg_name,
+                 PolicyName=f'{asg_name}-target-tracking',
+                 PolicyType=TARGET_TRACKING_SCALING,
+                 TargetTrackingConfiguration=dict(
+                     TargetValue=target,
+                     DisableScaleIn=policy_config.get('disable_scale_in', False),
+                     **metric_spec),
+                 **extra),
+            # Target tracking creates and deletes its own alarms
+            None,
+            f'keeps {label} at {target}'
+        )]
+
+    raise ValueError('Unknown scaling policy type: {}'.format(policy_type))
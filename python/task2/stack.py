@@ -0,0 +1,1002 @@
+"""
+Single definition of the auto scaling stack.
+
+build_stack() turns auto-scaling-config.json into the keyword arguments of
+every boto3 call autoscaling.py makes to provision the scaling stack. The
+same definition is emitted as Terraform JSON, so parameters tuned in the
+config (or by autotune.py) reach both deployments:
+
+    python stack.py terraform -o ../task3/generated/main.tf.json
+    python stack.py check ../task3/task3-terraform.tf
+
+The ASG launches "instance_type" in one zone, as the original script did.
+Both are opt-in: with "availability_zones" above 1 it spreads over the
+default subnets of that many zones, and it launches the weighted
+"mixed_instances" types when any are listed.
+
+Nothing publishes the request rate under Terraform, so with "scaling_metric"
+"rps" the Terraform stack scales on CPU instead, with SimpleScaling policies
+and the cpu_* thresholds: step bounds and evaluation periods tuned for the
+request rate do not carry over. Everything else is identical.
+
+Values only known once a resource exists (security group ids, ARNs,
+subnets) are Ref placeholders: autoscaling.py resolves them to the ids it
+created, the emitter to Terraform references.
+
+"check" compares the scaling parameters of the Terraform stack with the
+ones of the emitted Terraform, then with those of every Terraform file
+given (.tf or .tf.json), and exits with status 1 on any difference. Write the
+Terraform to its own directory: Terraform loads every .tf and .tf.json of
+a directory, so it cannot sit next to task3-terraform.tf.
+"""
+import argparse
+import json
+import re
+import sys
+from typing import NamedTuple, Optional
+
+from scaling_policies import (
+    SIMPLE_SCALING, TARGET_TRACKING_SCALING, alarm_metric, build_policy_specs
+)
+
+CONFIG_FILE = 'auto-scaling-config.json'
+REGION = 'us-east-1'
+# An ALB needs subnets in at least two availability zones
+MIN_LB_ZONES = 2
+
+tag_pairs = [
+    ("Project", "vm-scaling"),
+]
+TAGS = [{'Key': k, 'Value': v} for k, v in tag_pairs]
+
+ASG_METRICS = [
+    'GroupMinSize',
+    'GroupMaxSize',
+    'GroupDesiredCapacity',
+    'GroupInServiceInstances',
+    'GroupTotalInstances'
+]
+
+
+class Ref(NamedTuple):
+    """
+    Placeholder for the id or ARN of a resource created by the stack
+    """
+    name: str
+
+
+class Stack(NamedTuple):
+    launch_template: dict
+    target_group: dict
+    load_balancer: dict
+    listener: dict
+    auto_scaling_group: dict
+    metrics_collection: dict
+    warm_pool: Optional[dict]
+    # PolicySpec list, alarms invoking their policy through AlarmActions
+    policies: list
+
+
+def lb_zone_count(configuration):
+    """
+    :return: availability zones of the load balancer, which covers every zone of the ASG
+    """
+    return max(MIN_LB_ZONES, configuration['availability_zones'])
+
+
+def instance_type_overrides(configuration):
+    """
+    :return: LaunchTemplate Overrides of the mixed instances policy, empty for
+        a group of the single instance_type
+    """
+    return [{
+        'InstanceType': entry['instance_type'],
+        # Capacity units of the type; thresholds per instance are per unit
+        'WeightedCapacity': str(entry['weight'])
+    } for entry in configuration['mixed_instances']['instance_types']]
+
+
+def build_stack(configuration):
+    """
+    Build the boto3 keyword arguments of every call provisioning the stack
+    :param configuration: the whole auto-scaling-config.json
+    :return: Stack
+    """
+    asg_name = configuration['auto_scaling_group_name']
+    min_size = configuration['asg_min_size']
+    max_size = configuration['asg_max_size']
+
+    launch_template = dict(
+        LaunchTemplateName=configuration['launch_template_name'],
+        LaunchTemplateData={
+            'ImageId': configuration['web_service_ami'],
+            'InstanceType': configuration['instance_type'],
+            'SecurityGroupIds': [Ref('asg_security_group')],
+            'Monitoring': {
+                'Enabled': True
+            },
+            'TagSpecifications': [
+                {
+                    'ResourceType': 'instance',
+                    'Tags': TAGS
+                },
+                {
+                    'ResourceType': 'volume',
+                    'Tags': TAGS
+                }
+            ]
+        },
+        TagSpecifications=[
+            {
+                'ResourceType': 'launch-template',
+                'Tags': TAGS
+            }
+        ]
+    )
+
+    target_group = dict(
+        Name=configuration['auto_scaling_target_group'],
+        Protocol='HTTP',
+        Port=80,
+        VpcId=Ref('vpc'),
+        HealthCheckEnabled=True,
+        HealthCheckProtocol='HTTP',
+        HealthCheckPort='80',
+        HealthCheckPath='/',
+        HealthCheckIntervalSeconds=30,
+        HealthCheckTimeoutSeconds=5,
+        HealthyThresholdCount=2,
+        UnhealthyThresholdCount=3,
+        TargetType='instance',
+        Tags=TAGS
+    )
+
+    load_balancer = dict(
+        Name=configuration['load_balancer_name'],
+        Subnets=Ref('lb_subnets'),
+        SecurityGroups=[Ref('asg_security_group')],
+        Scheme='internet-facing',
+        Tags=TAGS,
+        Type='application',
+        IpAddressType='ipv4'
+    )
+
+    listener = dict(
+        LoadBalancerArn=Ref('load_balancer_arn'),
+        Protocol='HTTP',
+        Port=80,
+        DefaultActions=[
+            {
+                'Type': 'forward',
+                'TargetGroupArn': Ref('target_group')
+            }
+        ]
+    )
+
+    launch_template_specification = {
+        'LaunchTemplateId': Ref('launch_template'),
+        'Version': '$Latest'
+    }
+    overrides = instance_type_overrides(configuration)
+    if overrides and configuration['warm_pool_size']:
+        raise ValueError('A warm pool cannot be added to a group with mixed instance types')
+    if overrides:
+        # The launch template instance type only applies to types without an override
+        template = dict(MixedInstancesPolicy={
+            'LaunchTemplate': {
+                'LaunchTemplateSpecification': launch_template_specification,
+                'Overrides': overrides
+            },
+            'InstancesDistribution': {
+                'OnDemandAllocationStrategy':
+                    configuration['mixed_instances']['on_demand_allocation_strategy']
+            }
+        })
+    else:
+        template = dict(LaunchTemplate=launch_template_specification)
+
+    auto_scaling_group = dict(
+        AutoScalingGroupName=asg_name,
+        **template,
+        MinSize=min_size,
+        MaxSize=max_size,
+        DesiredCapacity=min_size,
+        DefaultCooldown=configuration['asg_default_cool_down_period'],
+        HealthCheckType='EC2',
+        HealthCheckGracePeriod=configuration['health_check_grace_period'],
+        # Comma separated subnets, one per availability zone
+        VPCZoneIdentifier=Ref('asg_subnets'),
+        TargetGroupARNs=[Ref('target_group')],
+        Tags=[
+            {
+                'Key': tag['Key'],
+                'Value': tag['Value'],
+                'PropagateAtLaunch': True,
+                'ResourceId': asg_name,
+                'ResourceType': 'auto-scaling-group'
+            } for tag in TAGS
+        ]
+    )
+
+    # Options left out by default, so the default config makes the
+    # original calls
+    if configuration['termination_policies']:
+        auto_scaling_group['TerminationPolicies'] = configuration['termination_policies']
+    if configuration['min_instance_lifetime']:
+        # autoscaling.py lifts the protection once an instance served
+        # min_instance_lifetime seconds
+        auto_scaling_group['NewInstancesProtectedFromScaleIn'] = True
+
+    metrics_collection = dict(
+        AutoScalingGroupName=asg_name,
+        Metrics=ASG_METRICS,
+        Granularity='1Minute'
+    )
+
+    warm_pool = None
+    warm_pool_size = configuration['warm_pool_size']
+    if warm_pool_size:
+        warm_pool = dict(
+            AutoScalingGroupName=asg_name,
+            MinSize=warm_pool_size,
+            MaxGroupPreparedCapacity=min(min_size + warm_pool_size, max_size),
+            PoolState=configuration['warm_pool_state'],
+            # Scaled-in instances go back to the pool instead of terminating
+            InstanceReusePolicy={'ReuseOnScaleIn': True}
+        )
+
+    metric, lower, upper, label = alarm_metric(configuration)
+    policies = [
+        spec if spec.alarm is None else spec._replace(
+            alarm=dict(spec.alarm, AlarmActions=[Ref(spec.name + '_policy')]))
+        for spec in build_policy_specs(configuration, metric, lower, upper, label)
+    ]
+
+    return Stack(launch_template, target_group, load_balancer, listener,
+                 auto_scaling_group, metrics_collection, warm_pool, policies)
+
+
+def build_terraform_stack(configuration):
+    """
+    Build the stack Terraform deploys: an "rps" config scales on CPU with
+    SimpleScaling policies, since only autoscaling.py publishes the request rate
+    :param configuration: the whole auto-scaling-config.json
+    :return: Stack
+    """
+    if configuration['scaling_metric'] == 'rps':
+        configuration = dict(configuration, scaling_metric='cpu',
+                             scaling_policy={'type': SIMPLE_SCALING})
+    return build_stack(configuration)
+
+
+def resolve(value, lookup):
+    """
+    Replace the Ref placeholders of boto3 keyword arguments
+    :param value: keyword arguments, or any value nested in them
+    :param lookup: function returning the id or ARN of a Ref name
+    :return: a copy of value without placeholders
+    """
+    if isinstance(value, Ref):
+        return lookup(value.name)
+    if isinstance(value, dict):
+        return {key: resolve(item, lookup) for key, item in value.items()}
+    if isinstance(value, list):
+        return [resolve(item, lookup) for item in value]
+    if isinstance(value, tuple):
+        # PolicySpec and the other named tuples of the stack
+        return value._make(resolve(item, lookup) for item in value)
+    return value
+
+
+########################################
+# Terraform JSON
+########################################
+TERRAFORM_REFS = {
+    'lg_security_group': 'aws_security_group.lg.id',
+    'asg_security_group': 'aws_security_group.elb_asg.id',
+    'vpc': 'aws_default_vpc.default.id',
+    'launch_template': 'aws_launch_template.lt.id',
+    'target_group': 'aws_lb_target_group.tg.arn',
+    'load_balancer_arn': 'aws_lb.alb.arn',
+}
+ASG_NAME_REF = '${aws_autoscaling_group.asg.name}'
+
+
+def default_subnet_name(index):
+    return 'default_az{}'.format(index + 1)
+
+
+def terraform_ref(name, configuration):
+    if name in ('lb_subnets', 'asg_subnets'):
+        zones = lb_zone_count(configuration) if name == 'lb_subnets' \
+            else configuration['availability_zones']
+        return ['${{aws_default_subnet.{}.id}}'.format(default_subnet_name(index))
+                for index in range(zones)]
+    if name.endswith('_policy'):
+        return '${{aws_autoscaling_policy.{}.arn}}'.format(name[:-len('_policy')])
+    target = TERRAFORM_REFS[name]
+    if isinstance(target, list):
+        return ['${{{}}}'.format(item) for item in target]
+    return '${{{}}}'.format(target)
+
+
+def terraform_tags(tags):
+    return {tag['Key']: tag['Value'] for tag in tags}
+
+
+def snake_case(name):
+    return re.sub(r'(?<=[a-z0-9])([A-Z])', r'_\1', name).lower()
+
+
+def without_none(attributes):
+    return {key: value for key, value in attributes.items() if value is not None}
+
+
+def http_rule(from_port, to_port, protocol):
+    # JSON gives every attribute of these attribute-as-block rules
+    return {
+        'from_port': from_port,
+        'to_port': to_port,
+        'protocol': protocol,
+        'cidr_blocks': ['0.0.0.0/0'],
+        'ipv6_cidr_blocks': [],
+        'prefix_list_ids': [],
+        'security_groups': [],
+        'self': False,
+        'description': ''
+    }
+
+
+def terraform_policy(policy):
+    """
+    :param policy: put_scaling_policy keyword arguments
+    :return: aws_autoscaling_policy attributes
+    """
+    attributes = {
+        'name': policy['PolicyName'],
+        'autoscaling_group_name': ASG_NAME_REF,
+        'policy_type': policy['PolicyType'],
+    }
+    for key in ('AdjustmentType', 'ScalingAdjustment', 'Cooldown',
+                'MetricAggregationType', 'EstimatedInstanceWarmup'):
+        if key in policy:
+            attributes[snake_case(key)] = policy[key]
+    if 'StepAdjustments' in policy:
+        attributes['step_adjustment'] = [
+            without_none({
+                'scaling_adjustment': step['ScalingAdjustment'],
+                'metric_interval_lower_bound': step.get('MetricIntervalLowerBound'),
+                'metric_interval_upper_bound': step.get('MetricIntervalUpperBound')
+            }) for step in policy['StepAdjustments']
+        ]
+    if 'TargetTrackingConfiguration' in policy:
+        tracking = policy['TargetTrackingConfiguration']
+        configuration = {
+            'target_value': tracking['TargetValue'],
+            'disable_scale_in': tracking['DisableScaleIn']
+        }
+        if 'PredefinedMetricSpecification' in tracking:
+            configuration['predefined_metric_specification'] = [{
+                'predefined_metric_type':
+                    tracking['PredefinedMetricSpecification']['PredefinedMetricType']
+            }]
+        else:
+            metric = tracking['CustomizedMetricSpecification']
+            configuration['customized_metric_specification'] = [without_none({
+                'metric_name': metric['MetricName'],
+                'namespace': metric['Namespace'],
+                'statistic': metric['Statistic'],
+                'unit': metric.get('Unit'),
+                'metric_dimension': [
+                    {'name': d['Name'], 'value': ASG_NAME_REF
+                        if d['Name'] == 'AutoScalingGroupName' else d['Value']}
+                    for d in metric.get('Dimensions', [])
+                ]
+            })]
+        attributes['target_tracking_configuration'] = [configuration]
+    return attributes
+
+
+def terraform_alarm(alarm):
+    """
+    :param alarm: put_metric_alarm keyword arguments
+    :return: aws_cloudwatch_metric_alarm attributes
+    """
+    return without_none({
+        'alarm_name': alarm['AlarmName'],
+        'alarm_description': alarm['AlarmDescription'],
+        'comparison_operator': alarm['ComparisonOperator'],
+        'evaluation_periods': alarm['EvaluationPeriods'],
+        'metric_name': alarm['MetricName'],
+        'namespace': alarm['Namespace'],
+        'period': alarm['Period'],
+        'statistic': alarm['Statistic'],
+        'threshold': alarm['Threshold'],
+        'unit': alarm.get('Unit'),
+        'treat_missing_data': alarm.get('TreatMissingData'),
+        'actions_enabled': alarm['ActionsEnabled'],
+        'alarm_actions': alarm['AlarmActions'],
+        'dimensions': {
+            d['Name']: ASG_NAME_REF if d['Name'] == 'AutoScalingGroupName' else d['Value']
+            for d in alarm['Dimensions']
+        }
+    })
+
+
+def terraform_document(stack, configuration):
+    """
+    Describe the stack, with the load generator and the security groups
+    task3-terraform.tf fixes, as a Terraform JSON configuration
+    :param stack: Stack
+    :param configuration: the whole auto-scaling-config.json
+    :return: dict to dump as a .tf.json file
+    """
+    def ref(name):
+        return terraform_ref(name, configuration)
+
+    stack = resolve(stack._asdict(), ref)
+    common_tags = terraform_tags(TAGS)
+
+    lt = stack['launch_template']
+    data = lt['LaunchTemplateData']
+    tg = stack['target_group']
+    lb = stack['load_balancer']
+    listener = stack['listener']
+    asg = stack['auto_scaling_group']
+    metrics = stack['metrics_collection']
+
+    asg_attributes = without_none({
+        'name': asg['AutoScalingGroupName'],
+        'min_size': asg['MinSize'],
+        'max_size': asg['MaxSize'],
+        'desired_capacity': asg['DesiredCapacity'],
+        'default_cooldown': asg['DefaultCooldown'],
+        'health_check_type': asg['HealthCheckType'],
+        'health_check_grace_period': asg['HealthCheckGracePeriod'],
+        # No process lifts the scale-in protection under Terraform, so
+        # NewInstancesProtectedFromScaleIn is not emitted
+        'termination_policies': asg.get('TerminationPolicies'),
+        'vpc_zone_identifier': asg['VPCZoneIdentifier'],
+        'target_group_arns': asg['TargetGroupARNs'],
+        'enabled_metrics': metrics['Metrics'],
+        'metrics_granularity': metrics['Granularity'],
+        'tag': [{
+            'key': tag['Key'],
+            'value': tag['Value'],
+            'propagate_at_launch': tag['PropagateAtLaunch']
+        } for tag in asg['Tags']]
+    })
+    mixed = asg.get('MixedInstancesPolicy')
+    if mixed:
+        specification = mixed['LaunchTemplate']['LaunchTemplateSpecification']
+        asg_attributes['mixed_instances_policy'] = [{
+            'instances_distribution': [{
+                'on_demand_allocation_strategy':
+                    mixed['InstancesDistribution']['OnDemandAllocationStrategy']
+            }],
+            'launch_template': [{
+                'launch_template_specification': [{
+                    'launch_template_id': specification['LaunchTemplateId'],
+                    'version': specification['Version']
+                }],
+                'override': [{
+                    'instance_type': override['InstanceType'],
+                    'weighted_capacity': override['WeightedCapacity']
+                } for override in mixed['LaunchTemplate']['Overrides']]
+            }]
+        }]
+    else:
+        asg_attributes['launch_template'] = [{
+            'id': asg['LaunchTemplate']['LaunchTemplateId'],
+            'version': asg['LaunchTemplate']['Version']
+        }]
+    warm_pool = stack['warm_pool']
+    if warm_pool:
+        asg_attributes['warm_pool'] = [{
+            'pool_state': warm_pool['PoolState'],
+            'min_size': warm_pool['MinSize'],
+            'max_group_prepared_capacity': warm_pool['MaxGroupPreparedCapacity'],
+            'instance_reuse_policy': [{
+                'reuse_on_scale_in': warm_pool['InstanceReusePolicy']['ReuseOnScaleIn']
+            }]
+        }]
+
+    resources = {
+        'aws_security_group': {
+            name: {
+                'ingress': [http_rule(80, 80, 'tcp')],
+                'egress': [http_rule(0, 0, '-1')],
+                'tags': common_tags
+            } for name in ('lg', 'elb_asg')
+        },
+        'aws_default_vpc': {'default': {'tags': common_tags}},
+        'aws_default_subnet': {
+            default_subnet_name(index): {
+                'availability_zone': REGION + 'abcdef'[index],
+                'tags': common_tags
+            } for index in range(lb_zone_count(configuration))
+        },
+        'aws_instance': {
+            'lg': {
+                'ami': configuration['load_generator_ami'],
+                'instance_type': configuration['instance_type'],
+                'vpc_security_group_ids': [ref('lg_security_group')],
+                'tags': dict(common_tags, Name='load-generator')
+            }
+        },
+        'aws_launch_template': {
+            'lt': {
+                'name': lt['LaunchTemplateName'],
+                'image_id': data['ImageId'],
+                'instance_type': data['InstanceType'],
+                'vpc_security_group_ids': data['SecurityGroupIds'],
+                'monitoring': [{'enabled': data['Monitoring']['Enabled']}],
+                'tag_specifications': [{
+                    'resource_type': spec['ResourceType'],
+                    'tags': terraform_tags(spec['Tags'])
+                } for spec in data['TagSpecifications']],
+                'tags': terraform_tags(lt['TagSpecifications'][0]['Tags'])
+            }
+        },
+        'aws_lb_target_group': {
+            'tg': {
+                'name': tg['Name'],
+                'port': tg['Port'],
+                'protocol': tg['Protocol'],
+                'vpc_id': tg['VpcId'],
+                'target_type': tg['TargetType'],
+                'health_check': [{
+                    'enabled': tg['HealthCheckEnabled'],
+                    'protocol': tg['HealthCheckProtocol'],
+                    'port': tg['HealthCheckPort'],
+                    'path': tg['HealthCheckPath'],
+                    'interval': tg['HealthCheckIntervalSeconds'],
+                    'timeout': tg['HealthCheckTimeoutSeconds'],
+                    'healthy_threshold': tg['HealthyThresholdCount'],
+                    'unhealthy_threshold': tg['UnhealthyThresholdCount']
+                }],
+                'tags': terraform_tags(tg['Tags'])
+            }
+        },
+        'aws_lb': {
+            'alb': {
+                'name': lb['Name'],
+                'internal': lb['Scheme'] == 'internal',
+                'load_balancer_type': lb['Type'],
+                'ip_address_type': lb['IpAddressType'],
+                'security_groups': lb['SecurityGroups'],
+                'subnets': lb['Subnets'],
+                'tags': terraform_tags(lb['Tags'])
+            }
+        },
+        'aws_lb_listener': {
+            'front_end': {
+                'load_balancer_arn': listener['LoadBalancerArn'],
+                'port': listener['Port'],
+                'protocol': listener['Protocol'],
+                'default_action': [{
+                    'type': action['Type'],
+                    'target_group_arn': action['TargetGroupArn']
+                } for action in listener['DefaultActions']]
+            }
+        },
+        'aws_autoscaling_group': {'asg': asg_attributes},
+        'aws_autoscaling_policy': {
+            spec.name: terraform_policy(spec.policy) for spec in stack['policies']
+        },
+    }
+    alarms = {spec.name: terraform_alarm(spec.alarm)
+              for spec in stack['policies'] if spec.alarm is not None}
+    if alarms:
+        resources['aws_cloudwatch_metric_alarm'] = alarms
+
+    return {
+        'provider': {'aws': {'region': REGION}},
+        'resource': resources
+    }
+
+
+########################################
+# Terraform (.tf) reader
+########################################
+HCL_TOKEN = re.compile(r'''
+    (?P<skip>\s+|\#[^\n]*|//[^\n]*|/\*.*?\*/)
+  | (?P<string>"(?:[^"\\]|\\.)*")
+  | (?P<number>-?\d+(?:\.\d+)?(?![\w.]))
+  | (?P<name>[A-Za-z_][\w\-]*(?:\.[\w\-]+|\[\d+\])*)
+  | (?P<punct>[{}\[\]()=,:])
+''', re.VERBOSE | re.DOTALL)
+
+
+def hcl_tokens(text):
+    position = 0
+    while position < len(text):
+        match = HCL_TOKEN.match(text, position)
+        if not match:
+            raise ValueError('Cannot read Terraform at: {!r}'.format(text[position:position + 40]))
+        position = match.end()
+        if match.lastgroup != 'skip':
+            yield match.lastgroup, match.group()
+
+
+class HclReader:
+    """
+    Read the subset of HCL task3-terraform.tf uses into the structure of
+    the equivalent .tf.json: labelled blocks nest by label, unlabelled
+    blocks become lists and expressions "${...}" strings.
+    """
+
+    def __init__(self, text):
+        self.tokens = list(hcl_tokens(text))
+        self.position = 0
+
+    def peek(self):
+        if self.position < len(self.tokens):
+            return self.tokens[self.position][1]
+        return None
+
+    def next(self):
+        token = self.tokens[self.position]
+        self.position += 1
+        return token
+
+    def expect(self, text):
+        kind, token = self.next()
+        if token != text:
+            raise ValueError('Expected {!r} in Terraform, got {!r}'.format(text, token))
+
+    def read(self):
+        return self.body(None)
+
+    def body(self, end):
+        body = {}
+        while self.peek() != end:
+            _, key = self.next()
+            if self.peek() == '=':
+                self.next()
+                body[key] = self.value()
+                continue
+            labels = []
+            while self.peek() != '{':
+                labels.append(json.loads(self.next()[1]))
+            self.expect('{')
+            block = self.body('}')
+            self.expect('}')
+            if not labels:
+                body.setdefault(key, []).append(block)
+                continue
+            target = body.setdefault(key, {})
+            for label in labels[:-1]:
+                target = target.setdefault(label, {})
+            target[labels[-1]] = block
+        return body
+
+    def value(self):
+        kind, token = self.next()
+        if kind == 'string':
+            return json.loads(token)
+        if kind == 'number':
+            return float(token) if '.' in token else int(token)
+        if token == '[':
+            items = []
+            while self.peek() != ']':
+                items.append(self.value())
+                if self.peek() == ',':
+                    self.next()
+            self.next()
+            return items
+        if token == '{':
+            items = {}
+            while self.peek() != '}':
+                key = self.value() if self.tokens[self.position][0] == 'string' else self.next()[1]
+                self.next()  # = or :
+                items[key] = self.value()
+                if self.peek() == ',':
+                    self.next()
+            self.next()
+            return items
+        if kind == 'name':
+            if token in ('true', 'false', 'null'):
+                return json.loads(token)
+            if self.peek() == '(':
+                # Function calls are kept as opaque expressions
+                start = self.position
+                depth = 0
+                while True:
+                    _, part = self.next()
+                    depth += part in '([{'
+                    depth -= part in ')]}'
+                    if depth == 0:
+                        break
+                return '${{{}({})}}'.format(
+                    token, ' '.join(t for _, t in self.tokens[start + 1:self.position - 1]))
+            return '${{{}}}'.format(token)
+        raise ValueError('Unexpected {!r} in Terraform'.format(token))
+
+
+def read_terraform(path):
+    """
+    :param path: .tf or .tf.json file
+    :return: the file as a Terraform JSON dict
+    """
+    with open(path) as f:
+        text = f.read()
+    if path.endswith('.json'):
+        return json.loads(text)
+    return HclReader(text).read()
+
+
+########################################
+# Drift check
+########################################
+def normal(value):
+    """
+    Make boto3, JSON and HCL values comparable: Terraform accepts numbers
+    and booleans as strings
+    """
+    if isinstance(value, str):
+        if value in ('true', 'false'):
+            return value == 'true'
+        try:
+            value = float(value)
+        except ValueError:
+            return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def block(value):
+    """
+    :return: the only nested block of a .tf.json attribute, {} if absent
+    """
+    if isinstance(value, list):
+        return value[0] if value else {}
+    return value or {}
+
+
+def policy_role(policy_type, adjustments):
+    if policy_type == TARGET_TRACKING_SCALING:
+        return 'target_tracking'
+    return 'scale_out' if sum(adjustments) > 0 else 'scale_in'
+
+
+def format_steps(steps):
+    def bound(value):
+        return '' if value is None else str(normal(value))
+    return ' '.join('[{},{}):{:+d}'.format(bound(lower), bound(upper), normal(adjustment))
+                    for lower, upper, adjustment in sorted(
+                        steps, key=lambda s: float('-inf') if s[0] is None else normal(s[0])))
+
+
+def format_overrides(overrides):
+    return ','.join('{}:{}'.format(instance_type, normal(weight))
+                    for instance_type, weight in overrides)
+
+
+def stack_parameters(stack):
+    """
+    :param stack: Stack
+    :return: {parameter: value} of the tuning parameters the boto3 calls set
+    """
+    asg = stack.auto_scaling_group
+    data = stack.launch_template['LaunchTemplateData']
+    tg = stack.target_group
+    parameters = {
+        'asg.min_size': asg['MinSize'],
+        'asg.max_size': asg['MaxSize'],
+        'asg.desired_capacity': asg['DesiredCapacity'],
+        'asg.default_cooldown': asg['DefaultCooldown'],
+        'asg.health_check_type': asg['HealthCheckType'],
+        'asg.health_check_grace_period': asg['HealthCheckGracePeriod'],
+        'asg.termination_policies': ','.join(asg.get('TerminationPolicies', ['Default'])),
+        'launch_template.image_id': data['ImageId'],
+        'launch_template.instance_type': data['InstanceType'],
+        'target_group.health_check.interval': tg['HealthCheckIntervalSeconds'],
+        'target_group.health_check.timeout': tg['HealthCheckTimeoutSeconds'],
+        'target_group.health_check.healthy_threshold': tg['HealthyThresholdCount'],
+        'target_group.health_check.unhealthy_threshold': tg['UnhealthyThresholdCount'],
+        'target_group.health_check.path': tg['HealthCheckPath'],
+    }
+    mixed = asg.get('MixedInstancesPolicy')
+    if mixed:
+        parameters['asg.instance_types'] = format_overrides(
+            (o['InstanceType'], o['WeightedCapacity']) for o in mixed['LaunchTemplate']['Overrides'])
+        parameters['asg.on_demand_allocation_strategy'] = \
+            mixed['InstancesDistribution']['OnDemandAllocationStrategy']
+    if stack.warm_pool:
+        parameters.update({
+            'warm_pool.pool_state': stack.warm_pool['PoolState'],
+            'warm_pool.min_size': stack.warm_pool['MinSize'],
+            'warm_pool.max_group_prepared_capacity': stack.warm_pool['MaxGroupPreparedCapacity'],
+        })
+    for spec in stack.policies:
+        policy = spec.policy
+        steps = [(s.get('MetricIntervalLowerBound'), s.get('MetricIntervalUpperBound'),
+                  s['ScalingAdjustment']) for s in policy.get('StepAdjustments', [])]
+        role = policy_role(policy['PolicyType'],
+                           [policy.get('ScalingAdjustment', 0)] + [s[2] for s in steps])
+        tracking = policy.get('TargetTrackingConfiguration', {})
+        parameters.update({
+            role + '.policy_type': policy['PolicyType'],
+            role + '.adjustment_type': policy.get('AdjustmentType'),
+            role + '.scaling_adjustment': policy.get('ScalingAdjustment'),
+            role + '.cooldown': policy.get('Cooldown'),
+            role + '.estimated_instance_warmup': policy.get('EstimatedInstanceWarmup'),
+            role + '.steps': format_steps(steps) if steps else None,
+            role + '.target_value': tracking.get('TargetValue'),
+        })
+        if spec.alarm is not None:
+            alarm = spec.alarm
+            for key in ('ComparisonOperator', 'EvaluationPeriods', 'MetricName',
+                        'Namespace', 'Period', 'Statistic', 'Threshold'):
+                parameters['{}.alarm.{}'.format(role, snake_case(key))] = alarm[key]
+    return {key: normal(value) for key, value in parameters.items() if value is not None}
+
+
+def terraform_parameters(document):
+    """
+    :param document: Terraform JSON dict, as emitted or read by read_terraform()
+    :return: {parameter: value} of the tuning parameters, named as stack_parameters() does
+    """
+    resources = document.get('resource', {})
+
+    def first(resource_type):
+        return next(iter(resources.get(resource_type, {}).values()), {})
+
+    asg = first('aws_autoscaling_group')
+    lt = first('aws_launch_template')
+    health_check = block(first('aws_lb_target_group').get('health_check'))
+    parameters = {
+        'asg.min_size': asg.get('min_size'),
+        'asg.max_size': asg.get('max_size'),
+        'asg.desired_capacity': asg.get('desired_capacity'),
+        'asg.default_cooldown': asg.get('default_cooldown'),
+        'asg.health_check_type': asg.get('health_check_type'),
+        'asg.health_check_grace_period': asg.get('health_check_grace_period'),
+        'asg.termination_policies': ','.join(asg.get('termination_policies') or ['Default']),
+        'launch_template.image_id': lt.get('image_id'),
+        'launch_template.instance_type': lt.get('instance_type'),
+    }
+    for key in ('interval', 'timeout', 'healthy_threshold', 'unhealthy_threshold', 'path'):
+        parameters['target_group.health_check.' + key] = health_check.get(key)
+    mixed = block(asg.get('mixed_instances_policy'))
+    if mixed:
+        overrides = block(mixed.get('launch_template')).get('override', [])
+        parameters['asg.instance_types'] = format_overrides(
+            (o['instance_type'], o.get('weighted_capacity', 1))
+            for o in (overrides if isinstance(overrides, list) else [overrides]))
+        parameters['asg.on_demand_allocation_strategy'] = block(
+            mixed.get('instances_distribution')).get('on_demand_allocation_strategy')
+    warm_pool = block(asg.get('warm_pool'))
+    for key in ('pool_state', 'min_size', 'max_group_prepared_capacity'):
+        parameters['warm_pool.' + key] = warm_pool.get(key)
+
+    roles = {}
+    for name, policy in resources.get('aws_autoscaling_policy', {}).items():
+        steps = [(s.get('metric_interval_lower_bound'), s.get('metric_interval_upper_bound'),
+                  s['scaling_adjustment']) for s in policy.get('step_adjustment', [])]
+        policy_type = policy.get('policy_type', 'SimpleScaling')
+        role = roles[name] = policy_role(
+            policy_type, [normal(policy.get('scaling_adjustment', 0))] + [normal(s[2]) for s in steps])
+        tracking = block(policy.get('target_tracking_configuration'))
+        parameters.update({
+            role + '.policy_type': policy_type,
+            role + '.adjustment_type': policy.get('adjustment_type'),
+            role + '.scaling_adjustment': policy.get('scaling_adjustment'),
+            role + '.cooldown': policy.get('cooldown'),
+            role + '.estimated_instance_warmup': policy.get('estimated_instance_warmup'),
+            role + '.steps': format_steps(steps) if steps else None,
+            role + '.target_value': tracking.get('target_value'),
+        })
+    for alarm in resources.get('aws_cloudwatch_metric_alarm', {}).values():
+        for action in alarm.get('alarm_actions', []):
+            match = re.search(r'aws_autoscaling_policy\.([\w\-]+)\.arn', action)
+            if match and match.group(1) in roles:
+                role = roles[match.group(1)]
+                for key in ('comparison_operator', 'evaluation_periods', 'metric_name',
+                            'namespace', 'period', 'statistic', 'threshold'):
+                    parameters['{}.alarm.{}'.format(role, key)] = alarm.get(key)
+    return {key: normal(value) for key, value in parameters.items() if value is not None}
+
+
+def threshold_gap(parameters):
+    """
+    :return: (scale out threshold, scale in threshold) if the scale out
+        alarm does not fire strictly above the scale in alarm, else None
+    """
+    upper = parameters.get('scale_out.alarm.threshold')
+    lower = parameters.get('scale_in.alarm.threshold')
+    if upper is not None and lower is not None and upper <= lower:
+        return upper, lower
+    return None
+
+
+def diff_parameters(expected, actual):
+    """
+    :return: sorted list of (parameter, expected value, actual value) that differ
+    """
+    return [(key, expected.get(key), actual.get(key))
+            for key in sorted(set(expected) | set(actual))
+            if expected.get(key) != actual.get(key)]
+
+
+def print_diff(differences, expected_label, actual_label):
+    width = max(len(key) for key, _, _ in differences)
+    print('{:<{}} {:>24} {:>24}'.format('parameter', width, expected_label, actual_label))
+    for key, expected, actual in differences:
+        print('{:<{}} {:>24} {:>24}'.format(
+            key, width, '-' if expected is None else str(expected),
+            '-' if actual is None else str(actual)))
+
+
+def check(configuration, paths):
+    """
+    Compare the tuning parameters of the Terraform stack with the emitted
+    Terraform and with every Terraform file given
+    :return: True if they all agree
+    """
+    stack = build_terraform_stack(configuration)
+    expected = stack_parameters(stack)
+    boto3_only = diff_parameters(stack_parameters(build_stack(configuration)), expected)
+    if boto3_only:
+        print('Terraform scales on CPU where autoscaling.py scales on the request rate '
+              '({} parameters differ)'.format(len(boto3_only)))
+    in_sync = True
+    emitted = diff_parameters(expected, terraform_parameters(terraform_document(stack, configuration)))
+    if emitted:
+        print('The emitted Terraform does not match the stack:')
+        print_diff(emitted, 'stack', 'emitted')
+        in_sync = False
+    else:
+        print('Stack and emitted Terraform agree on {} parameters'.format(len(expected)))
+    for path in paths:
+        actual = terraform_parameters(read_terraform(path))
+        overlap = threshold_gap(actual)
+        if overlap:
+            print('\n{} scales out above {} and in below {}: without a gap the group '
+                  'flaps'.format(path, *overlap))
+            in_sync = False
+        differences = diff_parameters(expected, actual)
+        if differences:
+            print('\n{} has drifted from the config in {} parameters:'.format(
+                path, len(differences)))
+            print_diff(differences, 'config', 'terraform')
+            in_sync = False
+        else:
+            print('{} matches the config'.format(path))
+    return in_sync
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--config', default=CONFIG_FILE)
+    commands = parser.add_subparsers(dest='command', required=True)
+    emit = commands.add_parser('terraform', help='write the stack as Terraform JSON')
+    emit.add_argument('-o', '--output', help='.tf.json file, stdout by default')
+    drift = commands.add_parser('check', help='diff the boto3 stack against Terraform')
+    drift.add_argument('terraform', nargs='*', help='.tf or .tf.json files to compare too')
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        configuration = json.load(f)
+    if args.command == 'check':
+        sys.exit(0 if check(configuration, args.terraform) else 1)
+
+    if configuration['scaling_metric'] == 'rps':
+        print('Warning: nothing publishes the request rate under Terraform, the alarms '
+              'watch CPU with SimpleScaling and the cpu_* thresholds instead', file=sys.stderr)
+    document = terraform_document(build_terraform_stack(configuration), configuration)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(document, f, indent=2)
+            f.write('\n')
+        print('Terraform written to {}'.format(args.output))
+    else:
+        json.dump(document, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
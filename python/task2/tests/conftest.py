@@ -0,0 +1,89 @@
+import os
+import sys
+from typing import NamedTuple
+
+import pytest
+
+TASK_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TASK_DIR)
+
+from utilities import aws  # noqa: E402
+from utilities.clock import RealClock, SimulatedClock, set_clock  # noqa: E402
+
+# Image moto launches instances from
+MOTO_AMI = 'ami-12c6146b'
+
+HORIZONTAL_LOG = """; Horizontal Scaling Test
+[Test]
+type=horizontal
+testId=1
+testFile=test.1.log
+startTime=2025-09-08T16:43:50+00:00
+
+[Minute 1]
+ws-1=12.06
+[Current rps=12.06]
+
+[Minute 2]
+ws-1=10.01
+ws-2=14.35
+[Current rps=24.36]
+
+"""
+HORIZONTAL_END = """[Test End]
+rps=24.36
+[Test finished]
+"""
+
+
+class Response(NamedTuple):
+    status_code: int
+    content: bytes
+
+
+class LogServer:
+    """
+    Stand-in for the /log endpoint of an LGClient: serves `text`, honouring
+    Range headers unless `ranges` is False, after answering the statuses
+    queued in `errors`
+    """
+
+    def __init__(self, text='', ranges=True):
+        self.text = text
+        self.ranges = ranges
+        self.errors = []
+        self.calls = 0
+
+    def log(self, name, headers=None):
+        self.calls += 1
+        if self.errors:
+            return Response(self.errors.pop(0), b'<html>Bad Gateway</html>')
+        body = self.text.encode()
+        requested = (headers or {}).get('Range')
+        if requested and self.ranges:
+            start = int(requested[len('bytes='):-1])
+            if start >= len(body):
+                return Response(416, b'')
+            return Response(206, body[start:])
+        return Response(200, body)
+
+
+@pytest.fixture
+def mocked_aws(monkeypatch):
+    """
+    Run the test against moto on a simulated clock, so waiters and
+    cooldowns cost no real time
+    """
+    moto = pytest.importorskip('moto')
+    for name, value in (('AWS_ACCESS_KEY_ID', 'testing'), ('AWS_SECRET_ACCESS_KEY', 'testing'),
+                        ('AWS_SESSION_TOKEN', 'testing'), ('AWS_DEFAULT_REGION', 'us-east-1')):
+        monkeypatch.setenv(name, value)
+    # autoscaling.py reads its config from the working directory
+    monkeypatch.chdir(TASK_DIR)
+    clock = SimulatedClock()
+    set_clock(clock)
+    aws.reset()
+    with moto.mock_aws(), clock.actor():
+        yield clock
+    aws.reset()
+    set_clock(RealClock())
@@ -0,0 +1,104 @@
+"""
+Decisions of the in-process scaling controller.
+"""
+import pytest
+
+from fast_scaling import FastScalingController
+from utilities.clock import RealClock, SimulatedClock, set_clock
+from utilities.log_parser import CurrentRps
+
+
+class StubAsgClient:
+    def __init__(self, desired, instances):
+        self.desired = desired
+        self.instances = instances
+        self.calls = []
+
+    def describe_auto_scaling_groups(self, AutoScalingGroupNames):
+        return {'AutoScalingGroups': [{
+            'DesiredCapacity': self.desired, 'MinSize': 1, 'MaxSize': 20,
+            'Instances': self.instances
+        }]}
+
+    def set_desired_capacity(self, **kwargs):
+        self.calls.append(kwargs['DesiredCapacity'])
+        self.desired = kwargs['DesiredCapacity']
+
+
+class StubElbClient:
+    def __init__(self, healthy_ids):
+        self.healthy_ids = healthy_ids
+
+    def describe_target_health(self, TargetGroupArn):
+        return {'TargetHealthDescriptions': [
+            {'Target': {'Id': instance_id}, 'TargetHealth': {'State': 'healthy'}}
+            for instance_id in self.healthy_ids
+        ]}
+
+
+def instance(instance_id, state='InService', weight=None):
+    described = {'InstanceId': instance_id, 'LifecycleState': state}
+    if weight is not None:
+        described['WeightedCapacity'] = str(weight)
+    return described
+
+
+def controller(asg_client=None, elb_client=None):
+    return FastScalingController(asg_client, elb_client, 'asg', 'tg',
+                                 lower_threshold=5, upper_threshold=10, max_step_out=2,
+                                 scale_out_cooldown=30, scale_in_delay=90,
+                                 scale_in_cooldown=120)
+
+
+@pytest.fixture
+def clock():
+    clock = SimulatedClock(start=0)
+    set_clock(clock)
+    with clock.actor():
+        yield clock
+    set_clock(RealClock())
+
+
+def test_scale_out_covers_the_shortfall_once():
+    fast = controller()
+    # 40 RPS need 4 units, 2 are healthy
+    assert fast.decide(100, 40, healthy=2, desired=2) == 4
+    # The same shortfall with 2 units launching is already covered
+    assert fast.decide(100, 40, healthy=2, desired=4, launching=2) == 4
+    # Only the part launching capacity does not cover is added
+    assert fast.decide(100, 50, healthy=2, desired=4, launching=2) == 5
+
+
+def test_scale_out_is_limited_by_step_and_cooldown():
+    fast = controller()
+    assert fast.decide(100, 100, healthy=2, desired=2) == 4
+    fast.last_scale_out = 90
+    assert fast.decide(100, 100, healthy=2, desired=2) == 2
+
+
+def test_scale_in_after_the_delay_but_not_below_the_need():
+    fast = controller()
+    assert fast.decide(0, 12, healthy=4, desired=4) == 4
+    assert fast.decide(60, 12, healthy=4, desired=4) == 4
+    assert fast.decide(90, 12, healthy=4, desired=4) == 3
+    fast.low_since = 0
+    assert fast.decide(90, 12, healthy=2, desired=2) == 2
+
+
+def test_tick_counts_weighted_and_launching_capacity(clock):
+    asg_client = StubAsgClient(desired=8, instances=[
+        instance('i-large', weight=2), instance('i-xlarge', weight=4),
+        instance('i-booting', state='Pending', weight=2),
+        instance('i-leaving', state='Terminating', weight=4)
+    ])
+    fast = controller(asg_client, StubElbClient({'i-large', 'i-xlarge'}))
+    # 6 healthy units at 65 RPS need 7: the 2 launching units cover it
+    fast.on_event(CurrentRps(minute=1, rps=65))
+    fast.tick()
+    assert asg_client.calls == []
+
+    # 95 RPS need 10 units, 8 are coming: 2 more
+    clock.sleep(fast.interval)
+    fast.on_event(CurrentRps(minute=2, rps=95))
+    fast.tick()
+    assert asg_client.calls == [10]
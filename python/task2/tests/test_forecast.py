@@ -0,0 +1,91 @@
+from types import SimpleNamespace
+
+import pytest
+
+from forecast import DemandForecast, PredictiveController, put_scheduled_actions
+from utilities.clock import RealClock, SimulatedClock, set_clock
+from utilities.log_parser import CurrentRps
+
+CURVES = {
+    1: [10, 20, 40, 20],
+    2: [30, 30, 10]
+}
+
+
+class StubAsgClient:
+    def __init__(self):
+        self.min_sizes = []
+        self.scheduled = []
+
+    def update_auto_scaling_group(self, AutoScalingGroupName, MinSize):
+        self.min_sizes.append(MinSize)
+
+    def batch_put_scheduled_update_group_action(self, AutoScalingGroupName,
+                                                ScheduledUpdateGroupActions):
+        self.scheduled.extend(ScheduledUpdateGroupActions)
+        return {}
+
+
+@pytest.fixture
+def clock():
+    clock = SimulatedClock(start=0)
+    set_clock(clock)
+    with clock.actor():
+        yield clock
+    set_clock(RealClock())
+
+
+def forecast(lead_minutes, headroom=1.0):
+    return DemandForecast(CURVES, instance_capacity=10, headroom=headroom,
+                          lead_minutes=lead_minutes)
+
+
+def test_envelope_is_the_highest_demand_of_every_minute():
+    assert forecast(lead_minutes=0).envelope == [30, 30, 40, 20]
+    with pytest.raises(ValueError):
+        DemandForecast({})
+
+
+def test_capacity_covers_the_lead_minutes():
+    assert forecast(lead_minutes=0).desired_capacity(1) == 3
+    # Minute 2 already provisions for the 40 RPS of minute 3
+    assert forecast(lead_minutes=1).desired_capacity(2) == 4
+    assert forecast(lead_minutes=1, headroom=1.2).desired_capacity(4) == 3
+
+
+def test_observed_minutes_pick_the_closest_pattern():
+    predicted = forecast(lead_minutes=0)
+    assert predicted.match([12, None]) == CURVES[1]
+    assert predicted.desired_capacity(2, [12]) == 2
+    # Served RPS above the forecast is a lower bound of the demand
+    assert predicted.desired_capacity(2, [12, 35]) == 4
+
+
+def test_schedule_lists_the_capacity_changes():
+    assert forecast(lead_minutes=0).schedule(min_size=1, max_size=3) == \
+        [(1, 3), (4, 2)]
+
+
+def test_scheduled_actions_start_now(clock):
+    asg_client = StubAsgClient()
+    put_scheduled_actions(asg_client, 'asg', forecast(lead_minutes=0), 1, 10)
+    # The first capacity is applied right away, the next ones are scheduled
+    assert asg_client.min_sizes == [3]
+    assert [(action['MinSize'], action['StartTime'].timestamp())
+            for action in asg_client.scheduled] == [(4, 120), (2, 180)]
+
+
+def test_controller_updates_the_minimum_size_once_per_minute(clock):
+    asg_client = StubAsgClient()
+    controller = PredictiveController(asg_client, 'asg', forecast(lead_minutes=0), 1, 10)
+    subscribers = []
+    controller.attach(SimpleNamespace(subscribe=subscribers.append))
+    controller.tick()
+    controller.tick()
+    assert asg_client.min_sizes == [3]
+
+    clock.sleep(60)
+    subscribers[0](CurrentRps(1, 10))
+    controller.tick()
+    # Minute 2 of pattern 1 needs 2 web services
+    assert asg_client.min_sizes == [3, 2]
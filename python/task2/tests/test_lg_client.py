@@ -0,0 +1,75 @@
+import pytest
+import requests
+
+from conftest import Response
+from utilities.clock import RealClock, SimulatedClock, set_clock
+from utilities.lg_client import BACKOFF_CAP, LGClient, backoff_delay
+
+
+class StubSession:
+    """
+    Stand-in for requests.Session answering the queued statuses, or raising
+    the queued exceptions, then 200
+    """
+
+    def __init__(self, *answers):
+        self.answers = list(answers)
+        self.calls = []
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        self.calls.append((url, params, timeout))
+        answer = self.answers.pop(0) if self.answers else 200
+        if isinstance(answer, Exception):
+            raise answer
+        return Response(answer, b'')
+
+
+@pytest.fixture
+def clock():
+    clock = SimulatedClock(start=0)
+    set_clock(clock)
+    with clock.actor():
+        yield clock
+    set_clock(RealClock())
+
+
+def test_requests_share_the_session_and_timeouts():
+    session = StubSession()
+    client = LGClient('lg.example', connect_timeout=1, read_timeout=2, session=session)
+    client.add_web_service('ws-1')
+    client.log('test.1.log')
+    assert session.calls == [
+        ('http://lg.example/test/horizontal/add', {'dns': 'ws-1'}, (1, 2)),
+        ('http://lg.example/log', {'name': 'test.1.log'}, (1, 2))
+    ]
+
+
+def test_stats_count_server_errors_per_endpoint():
+    client = LGClient('lg.example', session=StubSession(502, 400))
+    client.log('test.1.log')
+    client.log('test.1.log')
+    client.add_web_service('ws-1')
+    log_stats = client.stats['/log']
+    assert (log_stats.count, log_stats.errors) == (2, 1)
+    assert client.stats['/test/horizontal/add'].count == 1
+
+
+def test_get_with_retry_backs_off_until_the_lg_answers(clock):
+    session = StubSession(503, requests.exceptions.ConnectionError(), 503)
+    client = LGClient('lg.example', session=session)
+    assert client.start_horizontal_test('ws-1').status_code == 200
+    assert len(session.calls) == 4
+    # Three backoffs, the longest BACKOFF_BASE * 4
+    assert 0 <= clock.monotonic() <= 0.5 + 1 + 2
+
+
+def test_get_with_retry_gives_up_at_the_deadline(clock):
+    client = LGClient('lg.example', session=StubSession(*[503] * 100))
+    with pytest.raises(TimeoutError):
+        client.get_with_retry('/warmup', deadline=clock.time() + 30)
+    assert clock.time() <= 30
+
+
+def test_backoff_delay_is_capped():
+    assert all(0 <= backoff_delay(attempt) <= BACKOFF_CAP for attempt in range(20))
+    assert all(backoff_delay(0) <= 0.5 for _ in range(20))
@@ -0,0 +1,54 @@
+import importlib.util
+
+import pytest
+
+from conftest import HORIZONTAL_END, HORIZONTAL_LOG, LogServer
+from utilities.log_mirror import BACKUP_SUFFIX, BINARY, PARQUET, LogMirror, Sample, read_samples
+from utilities.log_tail import LogTail
+
+
+def follow(server, path, sidecar_format=None):
+    log_tail = LogTail(server, 'test.1.log')
+    return log_tail, LogMirror(str(path), fsync_interval=0,
+                               sidecar_format=sidecar_format).attach(log_tail)
+
+
+def test_mirror_appends_what_each_poll_fetched(tmp_path):
+    server = LogServer(HORIZONTAL_LOG)
+    path = tmp_path / 'test.1.log'
+    log_tail, mirror = follow(server, path)
+    log_tail.poll()
+    server.text += HORIZONTAL_END
+    log_tail.poll()
+    mirror.close()
+    assert path.read_text() == HORIZONTAL_LOG + HORIZONTAL_END
+    assert not (tmp_path / 'test.1.log.log').exists()
+
+
+def test_replaced_log_is_kept_as_backup(tmp_path):
+    server = LogServer(HORIZONTAL_LOG, ranges=False)
+    path = tmp_path / 'test.1.log'
+    log_tail, mirror = follow(server, path)
+    log_tail.poll()
+    server.text = '; A new test\n'
+    log_tail.poll()
+    mirror.close()
+    assert (tmp_path / ('test.1.log' + BACKUP_SUFFIX)).read_text() == HORIZONTAL_LOG
+    assert path.read_text() == '; A new test\n'
+
+
+def test_binary_sidecar_holds_every_minute(tmp_path):
+    server = LogServer(HORIZONTAL_LOG + HORIZONTAL_END)
+    path = tmp_path / 'test.1.log'
+    log_tail, mirror = follow(server, path, BINARY)
+    log_tail.poll()
+    mirror.close()
+    assert read_samples(mirror.sidecar_path) == [Sample(1, 12.06, 1), Sample(2, 24.36, 2)]
+
+
+def test_parquet_sidecar_fails_early_without_pyarrow(tmp_path, monkeypatch):
+    find_spec = importlib.util.find_spec
+    monkeypatch.setattr(importlib.util, 'find_spec',
+                        lambda name, *args: None if name == 'pyarrow' else find_spec(name, *args))
+    with pytest.raises(ImportError):
+        LogMirror(str(tmp_path / 'test.1.log'), sidecar_format=PARQUET)
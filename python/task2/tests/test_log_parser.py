@@ -0,0 +1,75 @@
+from conftest import HORIZONTAL_END, HORIZONTAL_LOG
+# TestStart, TestEnd and TestFinished are used through the module so that
+# pytest does not try to collect them
+from utilities import log_parser
+from utilities.log_parser import (
+    CurrentRps, InstanceHour, LogParser, MinuteSample, Section, parse_lines
+)
+
+AUTOSCALING_LOG = """; MSB AutoScaling Test
+
+[Test Start]
+time=2025-09-15 05:13:01
+type=autoscaling
+testId=1757913180876
+testFile=test.1757913180876.log
+
+[Minute 1]
+rps=20.00
+
+[Load Generator]
+dns=lg.example
+
+[Test End]
+time=2025-09-15 05:37:55
+averageRps=13.68
+maxRps=44.58
+pattern=746
+ih=190.47
+; Instance-Hour Usage
+; i-01e751377e5fa70d2\tm5.large\t6.33\t2025-09-15 05:13:01\t2025-09-15 05:14:36
+; not a row
+[Test finished]
+"""
+
+
+def test_horizontal_log_events():
+    events = list(parse_lines((HORIZONTAL_LOG + HORIZONTAL_END).splitlines(True)))
+    assert events == [
+        log_parser.TestStart('horizontal', '1', 'test.1.log', '2025-09-08T16:43:50+00:00'),
+        MinuteSample(1, {'ws-1': 12.06}),
+        CurrentRps(1, 12.06),
+        MinuteSample(2, {'ws-1': 10.01, 'ws-2': 14.35}),
+        CurrentRps(2, 24.36),
+        log_parser.TestEnd(None, None, None, 24.36, None, None, None),
+        log_parser.TestFinished()
+    ]
+
+
+def test_autoscaling_log_events():
+    events = list(parse_lines(AUTOSCALING_LOG.splitlines()))
+    assert events == [
+        log_parser.TestStart('autoscaling', '1757913180876', 'test.1757913180876.log',
+                             '2025-09-15 05:13:01'),
+        # The aggregate is inside the minute block
+        MinuteSample(1, {}),
+        CurrentRps(1, 20.0),
+        Section('Load Generator', {'dns': 'lg.example'}),
+        InstanceHour('i-01e751377e5fa70d2', 'm5.large', 6.33,
+                     '2025-09-15 05:13:01', '2025-09-15 05:14:36'),
+        log_parser.TestEnd('2025-09-15 05:37:55', 13.68, 44.58, None, '746', 190.47, None),
+        log_parser.TestFinished()
+    ]
+
+
+def test_events_are_emitted_once_their_block_is_complete():
+    parser = LogParser()
+    assert parser.feed('[Minute 3]') == ()
+    assert parser.feed('ws-1=9.5') == ()
+    # The next block closes the minute
+    assert parser.feed('[Current rps=9.50]\n') == (MinuteSample(3, {'ws-1': 9.5}),
+                                                   CurrentRps(3, 9.5))
+    assert parser.feed('[Minute 4]') == ()
+    assert parser.feed('ws-1=10') == ()
+    assert parser.close() == (MinuteSample(4, {'ws-1': 10.0}),)
+    assert parser.close() == ()
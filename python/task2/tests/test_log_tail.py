@@ -0,0 +1,62 @@
+import pytest
+import requests
+
+from conftest import HORIZONTAL_END, HORIZONTAL_LOG, LogServer
+from utilities.log_tail import LogTail
+
+
+def test_poll_fetches_only_the_new_bytes():
+    server = LogServer(HORIZONTAL_LOG)
+    log_tail = LogTail(server, 'test.1.log')
+    assert log_tail.poll() == HORIZONTAL_LOG.encode()
+    assert (log_tail.minute, log_tail.rps) == (2, 24.36)
+    assert log_tail.instance_rps == {'ws-1': 10.01, 'ws-2': 14.35}
+    assert log_tail.start_time == '2025-09-08T16:43:50+00:00'
+
+    assert log_tail.poll() == b''
+    server.text += HORIZONTAL_END
+    assert log_tail.poll() == HORIZONTAL_END.encode()
+    assert log_tail.finished
+
+
+def test_full_responses_are_diffed_against_the_cached_prefix():
+    server = LogServer(HORIZONTAL_LOG, ranges=False)
+    log_tail = LogTail(server, 'test.1.log')
+    log_tail.poll()
+    server.text += HORIZONTAL_END
+    assert log_tail.poll() == HORIZONTAL_END.encode()
+    assert log_tail.text == HORIZONTAL_LOG + HORIZONTAL_END
+
+
+def test_rewritten_log_starts_over():
+    server = LogServer(HORIZONTAL_LOG, ranges=False)
+    log_tail = LogTail(server, 'test.1.log')
+    log_tail.poll()
+    rewrites = []
+    log_tail.subscribe_bytes(lambda new_bytes, rewritten: rewrites.append(rewritten))
+    server.text = '[Minute 1]\n[Current rps=3.00]\n'
+    log_tail.poll()
+    assert rewrites == [True]
+    assert (log_tail.minute, log_tail.rps, log_tail.start_time) == (1, 3.0, None)
+
+
+@pytest.mark.parametrize('status', [500, 502, 503, 404])
+def test_error_responses_leave_the_state_untouched(status):
+    server = LogServer(HORIZONTAL_LOG)
+    log_tail = LogTail(server, 'test.1.log')
+    log_tail.poll()
+    server.errors.append(status)
+    with pytest.raises(requests.exceptions.HTTPError):
+        log_tail.poll()
+    assert log_tail.text == HORIZONTAL_LOG
+    assert (log_tail.minute, log_tail.rps) == (2, 24.36)
+
+    server.text += HORIZONTAL_END
+    assert log_tail.poll() == HORIZONTAL_END.encode()
+
+
+def test_final_marker_without_newline_finishes_the_test():
+    server = LogServer(HORIZONTAL_LOG + '[Test finished]')
+    log_tail = LogTail(server, 'test.1.log')
+    log_tail.poll()
+    assert log_tail.finished
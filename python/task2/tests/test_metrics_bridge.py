@@ -0,0 +1,64 @@
+import time
+
+import botocore
+
+from metrics_bridge import REQUEST_RATE, REQUEST_RATE_PER_INSTANCE, MetricsBridge
+from utilities import aws
+from utilities.log_parser import CurrentRps
+
+
+class RecordingCloudWatch:
+    def __init__(self):
+        self.calls = []
+
+    def put_metric_data(self, **kwargs):
+        self.calls.append(kwargs)
+
+
+def test_metrics_bridge_keeps_data_until_a_flush_succeeds(mocked_aws):
+    cw_client = aws.get_client('cloudwatch')
+    calls = []
+
+    class FailingOnce:
+        def put_metric_data(self, **kwargs):
+            calls.append(kwargs)
+            if len(calls) == 1:
+                raise botocore.exceptions.ClientError(
+                    {'Error': {'Code': 'Throttling', 'Message': 'Rate exceeded'}},
+                    'PutMetricData')
+            return cw_client.put_metric_data(**kwargs)
+
+    bridge = MetricsBridge(FailingOnce(), namespace='Test', flush_interval=3600)
+    bridge.on_event(CurrentRps(1, 20.0))
+    bridge.flush()
+    assert bridge.published == 0 and len(bridge.buffer) == 1
+
+    bridge.on_event(CurrentRps(2, 30.0))
+    bridge.close()
+    assert bridge.published == 2 and not bridge.buffer
+    metrics = cw_client.list_metrics(Namespace='Test')['Metrics']
+    assert {metric['MetricName'] for metric in metrics} == {REQUEST_RATE}
+
+
+def test_samples_are_flushed_on_a_timer_without_new_events():
+    cw_client = RecordingCloudWatch()
+    bridge = MetricsBridge(cw_client, namespace='Test', flush_interval=0.05).start()
+    bridge.on_event(CurrentRps(1, 20.0))
+    # No further log event arrives
+    deadline = time.monotonic() + 5
+    while not bridge.published and time.monotonic() < deadline:
+        time.sleep(0.01)
+    bridge.close()
+    assert bridge.published == 1
+    assert cw_client.calls[0]['MetricData'][0]['Value'] == 20.0
+
+
+def test_full_batches_are_sent_right_away():
+    cw_client = RecordingCloudWatch()
+    bridge = MetricsBridge(cw_client, namespace='Test', batch_size=2,
+                           capacity_fn=lambda: 4, flush_interval=3600)
+    bridge.on_event(CurrentRps(1, 20.0))
+    assert bridge.published == 2
+    assert [datum['MetricName'] for datum in cw_client.calls[0]['MetricData']] == \
+        [REQUEST_RATE, REQUEST_RATE_PER_INSTANCE]
+    assert cw_client.calls[0]['MetricData'][1]['Value'] == 5.0
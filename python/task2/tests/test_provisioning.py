@@ -0,0 +1,83 @@
+"""
+Provisioning against moto.
+"""
+import importlib.util
+import os
+
+import pytest
+
+from conftest import MOTO_AMI, TASK_DIR
+from stack import build_stack, resolve
+from utilities import aws
+
+
+def load_autoscaling(tmp_path):
+    # A fresh module, so the resources of another test are not reused
+    spec = importlib.util.spec_from_file_location(
+        'autoscaling', os.path.join(TASK_DIR, 'autoscaling.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.WEB_SERVICE_AMI = module.LOAD_GENERATOR_AMI = MOTO_AMI
+    module.configuration['web_service_ami'] = module.configuration['load_generator_ami'] = MOTO_AMI
+    module.TRACE_FILE = str(tmp_path / 'autoscaling.trace.jsonl')
+    # moto leaves PolicyARN out of the put_scaling_policy response
+    asg_client = aws.get_client('autoscaling')
+    put_scaling_policy = asg_client.put_scaling_policy
+    asg_client.put_scaling_policy = lambda **kwargs: dict(
+        put_scaling_policy(**kwargs),
+        PolicyARN='arn:aws:autoscaling:policy/' + kwargs['PolicyName'])
+    return module
+
+
+def test_main_creates_and_destroys_the_stack(mocked_aws, tmp_path):
+    autoscaling = load_autoscaling(tmp_path)
+    stack = build_stack(autoscaling.configuration)
+    seen = {}
+
+    def run_tests(lg_dns, lb_dns, metrics_bridge=None, forecast=None):
+        group = aws.get_client('autoscaling').describe_auto_scaling_groups(
+            AutoScalingGroupNames=[autoscaling.AUTO_SCALING_GROUP_NAME])['AutoScalingGroups'][0]
+        seen['group'] = group
+        seen['alarms'] = aws.get_client('cloudwatch').describe_alarms()['MetricAlarms']
+        seen['lb_dns'] = lb_dns
+
+    autoscaling.run_tests = run_tests
+    autoscaling.main()
+
+    group = seen['group']
+    expected = resolve(stack.auto_scaling_group, lambda name: None)
+    for key in ('MinSize', 'MaxSize', 'DefaultCooldown', 'HealthCheckGracePeriod'):
+        assert group[key] == expected[key]
+    assert group['TerminationPolicies'] == expected.get('TerminationPolicies', ['Default'])
+    assert len(group['VPCZoneIdentifier'].split(',')) == \
+        autoscaling.configuration['availability_zones']
+    assert group['TargetGroupARNs'] == [autoscaling.resources['tg_arn']]
+    alarms = {alarm['AlarmName']: alarm for alarm in seen['alarms']}
+    for spec in stack.policies:
+        if spec.alarm is not None:
+            assert alarms[spec.alarm['AlarmName']]['AlarmActions'] == \
+                ['arn:aws:autoscaling:policy/' + spec.policy['PolicyName']]
+    assert seen['lb_dns']
+
+    # destroy_resources ran once run_tests returned
+    assert not aws.get_client('autoscaling').describe_auto_scaling_groups(
+        AutoScalingGroupNames=[autoscaling.AUTO_SCALING_GROUP_NAME])['AutoScalingGroups']
+    assert not aws.get_client('cloudwatch').describe_alarms()['MetricAlarms']
+    assert not aws.get_client('elbv2').describe_load_balancers()['LoadBalancers']
+
+
+def test_main_destroys_the_stack_when_the_tests_fail(mocked_aws, tmp_path):
+    autoscaling = load_autoscaling(tmp_path)
+
+    def run_tests(lg_dns, lb_dns, metrics_bridge=None, forecast=None):
+        raise RuntimeError('LG unreachable')
+
+    autoscaling.run_tests = run_tests
+    with pytest.raises(RuntimeError):
+        autoscaling.main()
+
+    assert not aws.get_client('autoscaling').describe_auto_scaling_groups(
+        AutoScalingGroupNames=[autoscaling.AUTO_SCALING_GROUP_NAME])['AutoScalingGroups']
+    assert not aws.get_client('cloudwatch').describe_alarms()['MetricAlarms']
+    assert not aws.get_client('elbv2').describe_load_balancers()['LoadBalancers']
+
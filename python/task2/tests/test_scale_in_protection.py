@@ -0,0 +1,64 @@
+"""
+Scale-in protection against moto and the minimum lifetime replay.
+"""
+from conftest import MOTO_AMI
+from scale_in_protection import PROTECTION_BATCH, ScaleInProtection, lifetime_effect
+from utilities import aws
+
+
+def test_scale_in_protection_batches_and_releases(mocked_aws):
+    ec2_client = aws.get_client('ec2')
+    asg_client = aws.get_client('autoscaling')
+    ec2_client.create_launch_template(
+        LaunchTemplateName='protection-lt',
+        LaunchTemplateData={'ImageId': MOTO_AMI, 'InstanceType': 'm5.large'})
+    size = PROTECTION_BATCH + 10
+    asg_client.create_auto_scaling_group(
+        AutoScalingGroupName='protection-asg',
+        LaunchTemplate={'LaunchTemplateName': 'protection-lt'},
+        MinSize=size, MaxSize=size, DesiredCapacity=size,
+        AvailabilityZones=['us-east-1a'])
+    calls = []
+    set_instance_protection = asg_client.set_instance_protection
+
+    def counting(**kwargs):
+        calls.append((len(kwargs['InstanceIds']), kwargs['ProtectedFromScaleIn']))
+        return set_instance_protection(**kwargs)
+
+    asg_client.set_instance_protection = counting
+
+    def protected():
+        group = asg_client.describe_auto_scaling_groups(
+            AutoScalingGroupNames=['protection-asg'])['AutoScalingGroups'][0]
+        return sum(1 for instance in group['Instances'] if instance['ProtectedFromScaleIn'])
+
+    protection = ScaleInProtection(asg_client, 'protection-asg', min_lifetime=120, interval=10)
+    protection.tick()
+    assert calls == [(PROTECTION_BATCH, True), (10, True)]
+    assert protected() == size
+
+    mocked_aws.sleep(120)
+    calls.clear()
+    protection.tick()
+    assert calls == [(PROTECTION_BATCH, False), (10, False)]
+    assert protected() == 0 and protection.released == size
+
+
+def test_lifetime_effect_charges_instances_kept_without_a_relaunch():
+    # Kept from 60 s to 300 s, nothing launched meanwhile
+    assert lifetime_effect([(0, 60), (0, None)], 300) == (1, 0, -240)
+
+
+def test_lifetime_effect_nets_the_avoided_relaunch():
+    # The kept instance idles 40 s before standing in for the relaunch,
+    # which would have lived to 1000 s
+    assert lifetime_effect([(0, 60), (100, 1000)], 300) == (1, 1, -40)
+    # Relaunched right away: keeping costs nothing
+    assert lifetime_effect([(0, 60), (60, 1000)], 300) == (1, 1, 0)
+    # The relaunch dies before the minimum lifetime too: the kept
+    # instance outlives it by 300 - 200 s
+    assert lifetime_effect([(0, 60), (60, 200)], 300) == (1, 1, -100)
+
+
+def test_lifetime_effect_ignores_instances_old_enough():
+    assert lifetime_effect([(0, 600), (700, None)], 300) == (0, 0, 0)
@@ -0,0 +1,141 @@
+import json
+import os
+
+import pytest
+
+from conftest import TASK_DIR
+from scaling_policies import STEP_SCALING, TARGET_TRACKING_SCALING, step_adjustments
+from stack import TAGS, build_stack, resolve
+
+IDS = {
+    'asg_security_group': 'sg-2',
+    'launch_template': 'lt-1',
+    'target_group': 'tg-arn',
+    'asg_subnets': 'subnet-a',
+    'scale_out_policy': 'scale-out-arn',
+    'scale_in_policy': 'scale-in-arn',
+}
+
+
+@pytest.fixture
+def configuration():
+    with open(os.path.join(TASK_DIR, 'auto-scaling-config.json')) as f:
+        return json.load(f)
+
+
+def test_default_config_makes_the_original_calls(configuration):
+    """
+    The calls the original autoscaling.py made, with the values of the config
+    """
+    stack = resolve(build_stack(configuration), IDS.get)
+    name = configuration['auto_scaling_group_name']
+    assert stack.auto_scaling_group == dict(
+        AutoScalingGroupName=name,
+        LaunchTemplate={
+            'LaunchTemplateId': 'lt-1',
+            'Version': '$Latest'
+        },
+        MinSize=configuration['asg_min_size'],
+        MaxSize=configuration['asg_max_size'],
+        DesiredCapacity=configuration['asg_min_size'],
+        DefaultCooldown=configuration['asg_default_cool_down_period'],
+        HealthCheckType='EC2',
+        HealthCheckGracePeriod=configuration['health_check_grace_period'],
+        VPCZoneIdentifier='subnet-a',
+        TargetGroupARNs=['tg-arn'],
+        Tags=[
+            {
+                'Key': tag['Key'],
+                'Value': tag['Value'],
+                'PropagateAtLaunch': True,
+                'ResourceId': name,
+                'ResourceType': 'auto-scaling-group'
+            } for tag in TAGS
+        ]
+    )
+    assert stack.warm_pool is None
+
+    scale_out, scale_in = stack.policies
+    assert scale_out.policy == dict(
+        AutoScalingGroupName=name,
+        PolicyName=f'{name}-scale-out',
+        PolicyType='SimpleScaling',
+        AdjustmentType='ChangeInCapacity',
+        ScalingAdjustment=configuration['scale_out_adjustment'],
+        Cooldown=configuration['cool_down_period_scale_out']
+    )
+    assert scale_in.policy == dict(
+        AutoScalingGroupName=name,
+        PolicyName=f'{name}-scale-in',
+        PolicyType='SimpleScaling',
+        AdjustmentType='ChangeInCapacity',
+        ScalingAdjustment=configuration['scale_in_adjustment'],
+        Cooldown=configuration['cool_down_period_scale_in']
+    )
+    upper = configuration['cpu_upper_threshold']
+    lower = configuration['cpu_lower_threshold']
+    assert scale_out.alarm == dict(
+        AlarmName=f'{name}-scale-out-alarm',
+        ComparisonOperator='GreaterThanThreshold',
+        EvaluationPeriods=configuration['alarm_evaluation_periods_scale_out'],
+        MetricName='CPUUtilization',
+        Namespace='AWS/EC2',
+        Period=configuration['alarm_period'],
+        Statistic='Average',
+        Threshold=upper,
+        ActionsEnabled=True,
+        AlarmActions=['scale-out-arn'],
+        AlarmDescription=f'Trigger scale out when CPU > {upper}%',
+        Dimensions=[
+            {
+                'Name': 'AutoScalingGroupName',
+                'Value': name
+            }
+        ],
+        Unit='Percent'
+    )
+    assert scale_in.alarm == dict(
+        AlarmName=f'{name}-scale-in-alarm',
+        ComparisonOperator='LessThanThreshold',
+        EvaluationPeriods=configuration['alarm_evaluation_periods_scale_in'],
+        MetricName='CPUUtilization',
+        Namespace='AWS/EC2',
+        Period=configuration['alarm_period'],
+        Statistic='Average',
+        Threshold=lower,
+        ActionsEnabled=True,
+        AlarmActions=['scale-in-arn'],
+        AlarmDescription=f'Trigger scale in when CPU < {lower}%',
+        Dimensions=[
+            {
+                'Name': 'AutoScalingGroupName',
+                'Value': name
+            }
+        ],
+        Unit='Percent'
+    )
+
+
+def test_step_scaling_is_opt_in(configuration):
+    configuration['scaling_policy']['type'] = STEP_SCALING
+    scale_out, scale_in = build_stack(configuration).policies
+    assert scale_out.policy['PolicyType'] == STEP_SCALING
+    assert scale_out.policy['StepAdjustments'][-1] == \
+        {'ScalingAdjustment': 3, 'MetricIntervalLowerBound': 4}
+    assert scale_in.alarm['EvaluationPeriods'] == \
+        configuration['scaling_policy']['scale_in_evaluation_periods']
+
+
+def test_target_tracking_has_no_alarms(configuration):
+    configuration['scaling_policy']['type'] = TARGET_TRACKING_SCALING
+    spec, = build_stack(configuration).policies
+    assert spec.alarm is None
+    tracking = spec.policy['TargetTrackingConfiguration']
+    assert tracking['PredefinedMetricSpecification'] == \
+        {'PredefinedMetricType': 'ASGAverageCPUUtilization'}
+
+
+def test_steps_must_tile_the_metric_range():
+    with pytest.raises(ValueError):
+        step_adjustments([{'lower': 0, 'upper': 2, 'adjustment': 1},
+                          {'lower': 3, 'upper': None, 'adjustment': 2}])
@@ -0,0 +1,22 @@
+"""
+Each task is submitted on its own, so the utilities both scripts use are
+shipped in both task directories and must not drift apart.
+"""
+import filecmp
+import os
+
+import pytest
+
+from conftest import TASK_DIR
+
+SHARED_MODULES = ('__init__', 'clock', 'lg_client', 'lg_simulator', 'log_mirror',
+                  'log_parser', 'log_tail', 'tracing')
+TASK1_UTILITIES = os.path.join(os.path.dirname(TASK_DIR), 'task1', 'utilities')
+
+
+@pytest.mark.parametrize('module', SHARED_MODULES)
+def test_shared_module_is_identical_in_both_tasks(module):
+    name = module + '.py'
+    assert filecmp.cmp(os.path.join(TASK_DIR, 'utilities', name),
+                       os.path.join(TASK1_UTILITIES, name), shallow=False), \
+        'utilities/{} differs between task1 and task2'.format(name)
@@ -0,0 +1,97 @@
+import json
+import os
+
+import pytest
+
+from conftest import TASK_DIR
+from stack import (
+    HclReader, build_stack, build_terraform_stack, check, stack_parameters, terraform_document,
+    terraform_parameters
+)
+
+TERRAFORM_FILE = os.path.join(TASK_DIR, '..', 'task3', 'task3-terraform.tf')
+
+
+@pytest.fixture
+def configuration():
+    with open(os.path.join(TASK_DIR, 'auto-scaling-config.json')) as f:
+        return json.load(f)
+
+
+def test_hcl_reader_builds_the_json_structure():
+    document = HclReader('''
+        # comment
+        resource "aws_autoscaling_group" "asg" {
+          max_size            = 7
+          vpc_zone_identifier = [aws_default_subnet.default_az1.id]
+          tags                = merge(local.common_tags, { Name = "lg" })
+          launch_template {
+            id = aws_launch_template.lt.id
+          }
+          tag {
+            key = "Project"
+          }
+          tag {
+            key = "Owner"
+          }
+        }
+        resource "aws_cloudwatch_metric_alarm" "cpu_high" {
+          threshold  = "60"
+          dimensions = {
+            AutoScalingGroupName = aws_autoscaling_group.asg.name
+          }
+        }
+    ''').read()
+    asg = document['resource']['aws_autoscaling_group']['asg']
+    assert asg['max_size'] == 7
+    assert asg['vpc_zone_identifier'] == ['${aws_default_subnet.default_az1.id}']
+    assert asg['tags'].startswith('${merge(')
+    assert asg['launch_template'] == [{'id': '${aws_launch_template.lt.id}'}]
+    assert [tag['key'] for tag in asg['tag']] == ['Project', 'Owner']
+    alarm = document['resource']['aws_cloudwatch_metric_alarm']['cpu_high']
+    assert alarm['threshold'] == '60'
+    assert alarm['dimensions'] == {'AutoScalingGroupName': '${aws_autoscaling_group.asg.name}'}
+
+
+def test_hcl_reader_rejects_unknown_syntax():
+    with pytest.raises(ValueError):
+        HclReader('threshold = 60 ? 1 : 0').read()
+
+
+def test_emitted_terraform_matches_the_stack(configuration):
+    stack = build_terraform_stack(configuration)
+    assert terraform_parameters(terraform_document(stack, configuration)) == \
+        stack_parameters(stack)
+
+
+def test_task3_terraform_matches_the_config(configuration, capsys):
+    assert check(configuration, [TERRAFORM_FILE])
+
+
+def test_check_rejects_thresholds_without_a_gap(configuration, tmp_path, capsys):
+    with open(TERRAFORM_FILE) as f:
+        text = f.read()
+    upper = '  threshold           = "{}"'.format(configuration['cpu_upper_threshold'])
+    lower = '  threshold           = "{}"'.format(configuration['cpu_lower_threshold'])
+    flapping = tmp_path / 'flapping.tf'
+    flapping.write_text(text.replace(upper, lower))
+    assert not check(configuration, [str(flapping)])
+    assert 'without a gap' in capsys.readouterr().out
+
+
+def test_build_stack_rejects_thresholds_without_a_gap(configuration):
+    configuration['cpu_upper_threshold'] = configuration['cpu_lower_threshold']
+    with pytest.raises(ValueError):
+        build_stack(configuration)
+
+
+def test_rps_terraform_scales_on_cpu_with_simple_policies(configuration):
+    configuration.update(scaling_metric='rps')
+    configuration['scaling_policy']['type'] = 'StepScaling'
+    scale_out, scale_in = build_terraform_stack(configuration).policies
+    for spec in (scale_out, scale_in):
+        assert spec.policy['PolicyType'] == 'SimpleScaling'
+        assert spec.alarm['MetricName'] == 'CPUUtilization'
+    assert scale_out.alarm['Threshold'] == configuration['cpu_upper_threshold']
+    assert scale_in.alarm['EvaluationPeriods'] == \
+        configuration['alarm_evaluation_periods_scale_in']
@@ -0,0 +1,75 @@
+import pytest
+
+from utilities.clock import RealClock, SimulatedClock, set_clock
+from utilities.task_graph import DONE, FAILED, SKIPPED, TaskGraph
+
+
+@pytest.fixture
+def clock():
+    clock = SimulatedClock(start=0)
+    set_clock(clock)
+    with clock.actor():
+        yield clock
+    set_clock(RealClock())
+
+
+def sleeping(clock, seconds, order, name, value=None):
+    def step():
+        clock.sleep(seconds)
+        order.append(name)
+        return value
+    return step
+
+
+def failing():
+    raise RuntimeError('boom')
+
+
+def test_independent_steps_overlap(clock):
+    order = []
+    graph = TaskGraph()
+    graph.add('vpc', sleeping(clock, 10, order, 'vpc', 'vpc-1'))
+    graph.add('sg', sleeping(clock, 5, order, 'sg'), deps=['vpc'])
+    graph.add('lb', sleeping(clock, 60, order, 'lb'), deps=['vpc'])
+    graph.add('asg', sleeping(clock, 20, order, 'asg'), deps=['sg', 'lb'])
+    graph.run()
+
+    assert order == ['vpc', 'sg', 'lb', 'asg']
+    assert graph.result('vpc') == 'vpc-1'
+    # sg runs while lb is being created
+    assert graph.finished_at - graph.started_at == 10 + 60 + 20
+    assert graph.critical_path() == (['vpc', 'lb', 'asg'], 90)
+
+
+def test_dependents_of_a_failed_step_are_skipped(clock):
+    graph = TaskGraph()
+    graph.add('vpc', failing)
+    graph.add('sg', lambda: None, deps=['vpc'])
+    graph.add('asg', lambda: None, deps=['sg'])
+    graph.add('alarm', lambda: None)
+    steps = graph.run()
+
+    assert [steps[name].status for name in ('vpc', 'sg', 'asg', 'alarm')] == \
+        [FAILED, SKIPPED, SKIPPED, DONE]
+    assert list(graph.errors) == ['vpc']
+
+
+def test_best_effort_runs_dependents_of_a_failed_step(clock):
+    # Teardown: delete what can be deleted even if a step failed
+    graph = TaskGraph(skip_dependents_on_error=False)
+    graph.add('asg', failing)
+    graph.add('lt', lambda: 'deleted', deps=['asg'])
+    steps = graph.run()
+    assert (steps['asg'].status, steps['lt'].status) == (FAILED, DONE)
+
+
+def test_invalid_graphs_are_rejected():
+    graph = TaskGraph()
+    graph.add('a', lambda: None, deps=['b'])
+    with pytest.raises(ValueError, match='unknown'):
+        graph.run()
+    graph.add('b', lambda: None, deps=['a'])
+    with pytest.raises(ValueError, match='cycle'):
+        graph.run()
+    with pytest.raises(ValueError, match='Duplicate'):
+        graph.add('a', lambda: None)
@@ -0,0 +1,262 @@
+import threading
+import time
+
+import boto3
+import botocore
+from botocore.config import Config
+
+from utilities.clock import get_clock
+from utilities.tracing import instrument_client
+
+REGION = 'us-east-1'
+
+# One connection pool per client, sized for the provisioning threads, with
+# adaptive client-side retries so throttling backs off instead of failing.
+BOTO_CONFIG = Config(
+    region_name=REGION,
+    max_pool_connections=32,
+    connect_timeout=5,
+    read_timeout=30,
+    retries={'max_attempts': 8, 'mode': 'adaptive'}
+)
+
+# Seconds a cached lookup (default VPC, subnets, security groups) stays valid
+LOOKUP_TTL = 300
+
+_lock = threading.RLock()
+_session = None
+_clients = {}
+_thread_local = threading.local()
+
+
+########################################
+# Clients and resources
+########################################
+def get_session():
+    """
+    Return the process-wide boto3 session, creating it on first use
+    :return: boto3 Session
+    """
+    global _session
+    with _lock:
+        if _session is None:
+            _session = boto3.session.Session(region_name=REGION)
+        return _session
+
+
+def get_client(service):
+    """
+    Return the memoized low-level client for a service.
+    Clients are thread safe and shared by every caller.
+    :param service: service name, e.g. 'ec2' or 'elbv2'
+    :return: botocore client
+    """
+    client = _clients.get(service)
+    if client is None:
+        with _lock:
+            client = _clients.get(service)
+            if client is None:
+                client = instrument_client(
+                    get_session().client(service, config=BOTO_CONFIG))
+                _clients[service] = client
+    return client
+
+
+def get_resource(service):
+    """
+    Return a memoized resource for a service.
+    Resources are not thread safe, so each thread gets its own.
+    :param service: service name, e.g. 'ec2'
+    :return: boto3 ServiceResource
+    """
+    resources = getattr(_thread_local, 'resources', None)
+    if resources is None:
+        resources = _thread_local.resources = {}
+    resource = resources.get(service)
+    if resource is None:
+        with _lock:
+            resource = get_session().resource(service, config=BOTO_CONFIG)
+        instrument_client(resource.meta.client)
+        resources[service] = resource
+    return resource
+
+
+def reset():
+    """
+    Drop every memoized client, resource and cached lookup.
+    Call this when switching credentials or between moto-mocked tests.
+    :return: None
+    """
+    global _session, _thread_local
+    with _lock:
+        _session = None
+        _clients.clear()
+        _thread_local = threading.local()
+        lookups.invalidate()
+
+
+########################################
+# Cached lookups
+########################################
+class TTLCache:
+    """
+    Thread-safe cache whose entries expire after a fixed number of seconds.
+    """
+
+    def __init__(self, ttl):
+        """
+        :param ttl: lifetime of an entry in seconds
+        """
+        self.ttl = ttl
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def get_or_load(self, key, loader):
+        """
+        Return the cached value for key, calling loader() if it is missing or stale
+        :param key: cache key
+        :param loader: zero-argument function producing the value
+        :return: cached or freshly loaded value
+        """
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] > now:
+                return entry[1]
+        value = loader()
+        with self.lock:
+            self.entries[key] = (now + self.ttl, value)
+        return value
+
+    def invalidate(self, key=None):
+        """
+        Forget one entry, or every entry when key is None
+        :param key: cache key
+        :return: None
+        """
+        with self.lock:
+            if key is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(key, None)
+
+
+lookups = TTLCache(LOOKUP_TTL)
+
+
+def default_vpc_id():
+    """
+    Return the ID of the default VPC
+    :return: VPC ID
+    """
+    def load():
+        vpcs = get_client('ec2').describe_vpcs(
+            Filters=[{'Name': 'is-default', 'Values': ['true']}]
+        )
+        return vpcs['Vpcs'][0]['VpcId']
+    return lookups.get_or_load('default_vpc_id', load)
+
+
+def default_subnets():
+    """
+    Return the default subnet of every availability zone
+    :return: dict mapping availability zone to subnet ID, sorted by zone
+    """
+    def load():
+        subnets = get_client('ec2').describe_subnets(
+            Filters=[{'Name': 'default-for-az', 'Values': ['true']}]
+        )
+        return {
+            subnet['AvailabilityZone']: subnet['SubnetId']
+            for subnet in sorted(subnets['Subnets'],
+                                 key=lambda s: s['AvailabilityZone'])
+        }
+    return lookups.get_or_load('default_subnets', load)
+
+
+def default_subnet_id(preferred_az=None):
+    """
+    Return a default subnet, in the preferred availability zone if it has one
+    :param preferred_az: availability zone to prefer, e.g. 'us-east-1a'
+    :return: subnet ID
+    """
+    subnets = default_subnets()
+    if preferred_az in subnets:
+        return subnets[preferred_az]
+    return next(iter(subnets.values()))
+
+
+def security_group_id(name):
+    """
+    Return the ID of an existing security group by name
+    :param name: security group name
+    :return: security group ID
+    """
+    def load():
+        sgs = get_client('ec2').describe_security_groups(
+            Filters=[{'Name': 'group-name', 'Values': [name]}]
+        )
+        return sgs['SecurityGroups'][0]['GroupId']
+    return lookups.get_or_load(('security_group_id', name), load)
+
+
+########################################
+# Readiness checks
+########################################
+def wait_until(check, timeout, interval=5, description='condition'):
+    """
+    Poll check() until it returns a truthy value
+    :param check: zero-argument function
+    :param timeout: seconds to give up after
+    :param interval: seconds between two polls
+    :param description: what is being waited for, used in the error
+    :return: the truthy value returned by check()
+    """
+    clock = get_clock()
+    deadline = clock.monotonic() + timeout
+    while True:
+        result = check()
+        if result:
+            return result
+        if clock.monotonic() + interval > deadline:
+            raise TimeoutError('Timed out after {} s waiting for {}'.format(
+                timeout, description))
+        clock.sleep(interval)
+
+
+def wait_for(client, waiter_name, **kwargs):
+    """
+    Run a boto3 waiter, sleeping between its polls on the clock instead of
+    time.sleep(), so waiters cost no real time on a simulated clock
+    :param client: botocore client
+    :param waiter_name: waiter name, e.g. 'instance_running'
+    :param kwargs: arguments of the waiter, WaiterConfig included
+    :return: None
+    """
+    waiter = client.get_waiter(waiter_name)
+    config = kwargs.pop('WaiterConfig', {})
+    delay = config.get('Delay', waiter.config.delay)
+    max_attempts = config.get('MaxAttempts', waiter.config.max_attempts)
+    clock = get_clock()
+    for attempt in range(1, max_attempts + 1):
+        try:
+            # A single poll: botocore gives up once its only attempt is used
+            waiter.wait(WaiterConfig={'MaxAttempts': 1}, **kwargs)
+            return
+        except botocore.exceptions.WaiterError as e:
+            if attempt == max_attempts or \
+                    not e.kwargs.get('reason', '').startswith('Max attempts exceeded'):
+                raise
+        clock.sleep(delay)
+
+
+def network_interface_count(sg_id):
+    """
+    Count the network interfaces still using a security group
+    :param sg_id: security group ID
+    :return: number of network interfaces
+    """
+    interfaces = get_client('ec2').describe_network_interfaces(
+        Filters=[{'Name': 'group-id', 'Values': [sg_id]}]
+    )
+    return len(interfaces['NetworkInterfaces'])
@@ -0,0 +1,661 @@
+"""
+Offline simulator of the load generator HTTP API.
+
+Run it with
+
+    python -m utilities.lg_simulator --port 8080 --speedup 600
+
+and set "lg_base_url" in the task2 config to "127.0.0.1:8080" and
+"clock_speedup" to the same speedup, or pass --lg-address and --speedup to
+task1's simulate.py. The scaling scripts then talk to the simulator instead
+of a real LG, web services are "launched" through /sim/launch instead of
+EC2 (SimulatedEc2), and the log is produced in the MSB format on a clock
+running `speedup` times faster than real time.
+
+The simulator reads time from utilities.clock, so it can also run in-process
+on a SimulatedClock together with a controller (see simulate.py).
+"""
+import argparse
+import json
+import random
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import requests
+
+from utilities.clock import ScaledClock, get_clock, set_clock
+
+# Test rules of the real LG
+HORIZONTAL_TARGET_RPS = 50
+HORIZONTAL_DURATION = 30 * 60
+HORIZONTAL_ADD_INTERVAL = 100
+WARMUP_DURATION = 15 * 60
+
+# The LG reports instance usage in units of 15 instance-seconds
+IH_SECONDS_PER_UNIT = 15
+
+# Demand in RPS for each minute of the auto scaling test
+DEFAULT_PATTERN = [
+    20, 20, 12, 8, 10, 25, 30, 32, 28, 35, 40, 45,
+    45, 38, 30, 22, 18, 25, 35, 45, 40, 25, 12, 8
+]
+DEFAULT_PATTERN_ID = 746
+
+
+def _iso(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat(timespec='seconds')
+
+
+def _plain(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+class SimulatedInstance:
+    """
+    A web service known to the simulator. It serves traffic once booted.
+    """
+
+    def __init__(self, instance_id, dns, launch_time, ready_time):
+        self.instance_id = instance_id
+        self.dns = dns
+        self.launch_time = launch_time
+        self.ready_time = ready_time
+        self.termination_time = None
+        self.stopped = False
+
+    def serving(self, now):
+        return not self.stopped and self.ready_time <= now and \
+            (self.termination_time is None or now < self.termination_time)
+
+
+class SimulatedTest:
+    """
+    Common bookkeeping of a test: the log lines and per-minute sampling.
+    """
+
+    def __init__(self, sim, test_type, duration):
+        self.sim = sim
+        self.test_id = str(int(sim.clock.time() * 1000))
+        self.log_name = 'test.{}.log'.format(self.test_id)
+        self.start = sim.clock.time()
+        self.duration = duration
+        self.minute = 0
+        self.finished = False
+        self.lines = []
+        self.size = 0
+        self.samples = []
+        self.type = test_type
+
+    def write(self, text=''):
+        line = text + '\n'
+        self.lines.append(line)
+        self.size += len(line.encode())
+
+    def content(self):
+        return ''.join(self.lines).encode()
+
+    def advance(self, now):
+        """
+        Emit every minute block that is due at virtual time `now`
+        """
+        while not self.finished and now >= self.start + (self.minute + 1) * 60:
+            self.minute += 1
+            self.sample_minute(self.start + self.minute * 60)
+            if self.minute * 60 >= self.duration or self.done():
+                self.end(self.start + self.minute * 60)
+
+    def done(self):
+        return False
+
+    def sample_minute(self, at):
+        raise NotImplementedError
+
+    def end(self, at):
+        raise NotImplementedError
+
+
+class HorizontalTest(SimulatedTest):
+
+    def __init__(self, sim, first_dns):
+        super().__init__(sim, 'horizontal', HORIZONTAL_DURATION)
+        self.web_services = [sim.instance_for(first_dns)]
+        self.last_add = self.start
+        self.passed = False
+        self.rps = 0.0
+        self.write('; ' + _iso(self.start))
+        self.write('; Horizontal Scaling Test')
+        self.write('; isTestingThroughCode=true')
+        self.write('; Test launched. Please check every minute for update.')
+        self.write('; Your goal is to achieve rps={} in 30 min'.format(HORIZONTAL_TARGET_RPS))
+        self.write('; Minimal interval of adding instances is {} sec'.format(HORIZONTAL_ADD_INTERVAL))
+        self.write('[Test]')
+        self.write('type=horizontal')
+        self.write('testId=' + self.test_id)
+        self.write('testFile=' + self.log_name)
+        self.write('startTime=' + _iso(self.start))
+        self.write()
+
+    def add(self, dns, now):
+        if now - self.last_add < HORIZONTAL_ADD_INTERVAL:
+            return False
+        self.web_services.append(self.sim.instance_for(dns))
+        self.last_add = now
+        return True
+
+    def sample_minute(self, at):
+        self.write('[Minute {}]'.format(self.minute))
+        total = 0.0
+        for instance in self.web_services:
+            rps = self.sim.instance_rps() if instance.serving(at) else 0.0
+            total += rps
+            self.write('{}={:.2f}'.format(instance.dns, rps))
+        self.rps = total
+        self.samples.append(total)
+        self.write('[Current rps={:.2f}]'.format(total))
+        self.write()
+
+    def done(self):
+        self.passed = self.rps >= HORIZONTAL_TARGET_RPS
+        return self.passed
+
+    def end(self, at):
+        self.write('[Load Generator]')
+        self.write('username=null')
+        self.write('platform=AWS')
+        self.write('instanceId=i-simulated-lg')
+        self.write('instanceType=' + self.sim.instance_type)
+        self.write('hostname=' + self.sim.address)
+        self.write('passwd=')
+        self.write()
+        for i, instance in enumerate(self.web_services):
+            self.write('[Web Service {}]'.format(i))
+            self.write('username=null')
+            self.write('platform=AWS')
+            self.write('instanceId=' + instance.instance_id)
+            self.write('instanceType=' + self.sim.instance_type)
+            self.write('hostname=' + instance.dns)
+            self.write()
+        self.write('; MSB is validating....')
+        self.write('[Test End]')
+        self.write('endTime=' + _iso(at))
+        self.write('rps={:.2f}'.format(self.rps))
+        self.write('pass=' + ('true' if self.passed else 'false'))
+        self.write('[Test finished]')
+        self.finished = True
+
+
+class LoadBalancedTest(SimulatedTest):
+    """
+    Warmup and auto scaling tests send a demand pattern to the ELB; the
+    served RPS is capped by the capacity of the simulated backends.
+    """
+
+    def __init__(self, sim, test_type, duration, pattern, lb_dns):
+        super().__init__(sim, test_type, duration)
+        self.pattern = pattern
+        self.lb_dns = lb_dns
+
+    def served_rps(self, at):
+        demand = self.pattern[(self.minute - 1) % len(self.pattern)]
+        capacity = sum(self.sim.instance_rps()
+                       for instance in self.sim.backends if instance.serving(at))
+        return min(demand, capacity)
+
+    def sample_minute(self, at):
+        rps = self.served_rps(at)
+        self.samples.append(rps)
+        self.write('[Minute {}]'.format(self.minute))
+        self.write('rps={:.2f}'.format(rps))
+        self.write()
+
+    def write_resources(self):
+        self.write('[Load Generator]')
+        self.write('username=null')
+        self.write('platform=AWS')
+        self.write('instanceId=i-simulated-lg')
+        self.write('instanceType=' + self.sim.instance_type)
+        self.write('hostname=' + self.sim.address)
+        self.write()
+        self.write('[Elastic Load Balancer]')
+        self.write('dns=' + self.lb_dns)
+        self.write()
+
+
+class WarmupTest(LoadBalancedTest):
+
+    def __init__(self, sim, lb_dns):
+        super().__init__(sim, 'warmup', WARMUP_DURATION, sim.pattern, lb_dns)
+        self.write('; ' + _iso(self.start))
+        self.write('; Warmup Test')
+        self.write('; Test launched. Please check every minute for update, for 15 minutes')
+        self.write('[Test]')
+        self.write('type=warmup')
+        self.write('testId=' + self.test_id)
+        self.write('testFile=' + self.log_name)
+        self.write()
+
+    def end(self, at):
+        self.write_resources()
+        self.write('[Test finished]')
+        self.finished = True
+
+
+class AutoscalingTest(LoadBalancedTest):
+
+    def __init__(self, sim, lb_dns):
+        duration = len(sim.pattern) * 60
+        super().__init__(sim, 'autoscaling', duration, sim.pattern, lb_dns)
+        self.write('; MSB AutoScaling Test')
+        self.write()
+        self.write('; Test launched. Please check every minute for update.')
+        self.write('[Test Start]')
+        self.write('time=' + _plain(self.start))
+        self.write('type=autoscaling')
+        self.write('testId=' + self.test_id)
+        self.write('testFile=' + self.log_name)
+        self.write()
+        self.write()
+
+    def end(self, at):
+        self.write_resources()
+        rows = []
+        total = 0.0
+        for instance in self.sim.backends_history:
+            launch = max(instance.launch_time, self.start)
+            stop = min(instance.termination_time or at, at)
+            if stop <= launch:
+                continue
+            ih = (stop - launch) / IH_SECONDS_PER_UNIT
+            total += ih
+            rows.append('; {}\t{}\t{:.2f}\t{}\t{}'.format(
+                instance.instance_id, self.sim.instance_type, ih,
+                _plain(launch), _plain(stop)))
+        self.write('[Test End]')
+        self.write('time=' + _plain(at))
+        self.write('averageRps={:.2f}'.format(sum(self.samples) / len(self.samples)))
+        self.write('maxRps={:.2f}'.format(max(self.samples)))
+        self.write('pattern={}'.format(self.sim.pattern_id))
+        self.write('ih={:.2f}'.format(total))
+        self.write('; Instance-Hour Usage')
+        for row in sorted(rows):
+            self.write(row)
+        self.write()
+        self.write('; MSB is validating ......')
+        self.write('[Test finished]')
+        self.finished = True
+
+
+class LoadGeneratorSimulator:
+    """
+    In-memory model of the LG and of the web services it drives.
+    """
+
+    def __init__(self, instance_capacity=12.0, capacity_jitter=0.15,
+                 boot_delay=60, start_delay=15, pattern=None, pattern_id=DEFAULT_PATTERN_ID,
+                 backends=1, instance_type='m5.large', seed=0,
+                 address='127.0.0.1:8080'):
+        """
+        :param instance_capacity: mean RPS one web service can serve
+        :param capacity_jitter: relative random spread of that capacity per minute
+        :param boot_delay: virtual seconds between launch and serving traffic
+        :param start_delay: virtual seconds a stopped web service takes to serve again
+        :param pattern: per-minute demand of the warmup/auto scaling tests
+        :param backends: web services behind the simulated ELB at start
+        :param address: host:port the simulator is reachable on
+        """
+        self.clock = get_clock()
+        self.instance_capacity = instance_capacity
+        self.capacity_jitter = capacity_jitter
+        self.boot_delay = boot_delay
+        self.start_delay = start_delay
+        self.pattern = pattern or DEFAULT_PATTERN
+        self.pattern_id = pattern_id
+        self.instance_type = instance_type
+        self.address = address
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.tests = {}
+        self.instances = {}
+        self.horizontal = None
+        self.backends = []
+        self.backends_history = []
+        self.set_backends(backends)
+
+    ########################################
+    # Model
+    ########################################
+    def instance_rps(self):
+        jitter = self.random.uniform(-self.capacity_jitter, self.capacity_jitter)
+        return max(0.0, self.instance_capacity * (1 + jitter))
+
+    def launch(self, ready_delay=None):
+        now = self.clock.time()
+        index = len(self.instances) + 1
+        instance = SimulatedInstance(
+            'i-sim{:012x}'.format(index),
+            'ec2-10-0-{}-{}.sim.local'.format(index // 250, index % 250),
+            now,
+            now + (self.boot_delay if ready_delay is None else ready_delay)
+        )
+        self.instances[instance.instance_id] = instance
+        return instance
+
+    def instance_for(self, dns):
+        for instance in self.instances.values():
+            if instance.dns == dns:
+                return instance
+        # A DNS the simulator did not launch is assumed to be serving already
+        instance = self.launch(ready_delay=0)
+        instance.dns = dns
+        return instance
+
+    def terminate(self, instance_id):
+        instance = self.instances.get(instance_id)
+        if instance is not None and instance.termination_time is None:
+            instance.termination_time = self.clock.time()
+        return instance is not None
+
+    def stop(self, instance_id):
+        instance = self.instances.get(instance_id)
+        if instance is not None and instance.termination_time is None:
+            instance.stopped = True
+        return instance is not None
+
+    def start(self, instance_id):
+        instance = self.instances.get(instance_id)
+        if instance is not None and instance.stopped:
+            # Booted once already: only the OS resume and service start remain
+            instance.stopped = False
+            instance.ready_time = self.clock.time() + self.start_delay
+        return instance is not None
+
+    def set_backends(self, count):
+        """
+        Resize the simulated ELB target group to `count` web services
+        """
+        now = self.clock.time()
+        while len(self.backends) < count:
+            instance = self.launch(ready_delay=0 if not self.backends_history else None)
+            self.backends.append(instance)
+            self.backends_history.append(instance)
+        while len(self.backends) > count:
+            self.backends.pop().termination_time = now
+
+    def advance(self):
+        now = self.clock.time()
+        for test in self.tests.values():
+            test.advance(now)
+        return now
+
+    ########################################
+    # HTTP API
+    ########################################
+    def handle(self, path, params, headers):
+        """
+        Serve one request
+        :param path: URL path
+        :param params: dict of query parameters
+        :param headers: request headers
+        :return: (status code, body bytes, content type)
+        """
+        with self.lock:
+            now = self.advance()
+            dns = params.get('dns')
+
+            if path == '/test/horizontal':
+                test = HorizontalTest(self, dns)
+                self.horizontal = test
+                return self.started(test)
+            if path == '/test/horizontal/add':
+                if self.horizontal is None or self.horizontal.finished:
+                    return 400, b'No horizontal test running', 'text/plain'
+                if not self.horizontal.add(dns, now):
+                    return 400, b'Minimal interval of adding instances is 100 sec', 'text/plain'
+                return 200, b'Web service added', 'text/plain'
+            if path == '/warmup':
+                return self.started(WarmupTest(self, dns))
+            if path == '/autoscaling':
+                return self.started(AutoscalingTest(self, dns))
+            if path == '/log':
+                return self.log(params.get('name'), headers.get('Range'))
+
+            if path == '/sim/launch':
+                instance = self.launch()
+                return self.json(self.describe(instance))
+            if path == '/sim/instance':
+                instance = self.instances.get(params.get('id'))
+                if instance is None:
+                    return 404, b'Unknown instance', 'text/plain'
+                return self.json(self.describe(instance))
+            if path in ('/sim/terminate', '/sim/stop', '/sim/start'):
+                action = {'/sim/terminate': self.terminate, '/sim/stop': self.stop,
+                          '/sim/start': self.start}[path]
+                return (200, b'ok', 'text/plain') if action(params.get('id')) \
+                    else (404, b'Unknown instance', 'text/plain')
+            if path == '/sim/backends':
+                if 'count' in params:
+                    self.set_backends(int(params['count']))
+                return self.json({'backends': len(self.backends)})
+            return 404, b'Not found', 'text/plain'
+
+    def started(self, test):
+        self.tests[test.log_name] = test
+        body = "<a href='/log?name={0}'>Test</a> launched.".format(test.log_name)
+        return 200, body.encode(), 'text/html'
+
+    def log(self, name, range_header):
+        test = self.tests.get(name)
+        if test is None:
+            return 404, b'Unknown log', 'text/plain'
+        content = test.content()
+        if range_header and range_header.startswith('bytes='):
+            offset = int(range_header[len('bytes='):].split('-')[0])
+            if offset >= len(content):
+                return 416, b'', 'text/plain'
+            return 206, content[offset:], 'text/plain'
+        return 200, content, 'text/plain'
+
+    def describe(self, instance):
+        now = self.clock.time()
+        if instance.termination_time is not None and instance.termination_time <= now:
+            state = 'terminated'
+        elif instance.stopped:
+            state = 'stopped'
+        elif instance.ready_time <= now:
+            state = 'running'
+        else:
+            state = 'pending'
+        return {
+            'instance_id': instance.instance_id,
+            'public_dns_name': instance.dns,
+            'state': state
+        }
+
+    @staticmethod
+    def json(payload):
+        return 200, json.dumps(payload).encode(), 'application/json'
+
+
+########################################
+# Client side helper
+########################################
+class SimulatedEc2Instance:
+    """
+    Stand-in for a boto3 EC2 Instance launched through the simulator.
+    """
+
+    def __init__(self, base_url, payload):
+        self.base_url = base_url
+        self.instance_id = payload['instance_id']
+        self.public_dns_name = payload['public_dns_name']
+        self.state = {'Name': payload['state']}
+
+    @classmethod
+    def launch(cls, lg_address):
+        """
+        Launch a simulated web service
+        :param lg_address: host:port of the simulator
+        :return: SimulatedEc2Instance, still pending
+        """
+        base_url = 'http://{}'.format(lg_address)
+        payload = requests.get(base_url + '/sim/launch', timeout=10).json()
+        return cls(base_url, payload)
+
+    @classmethod
+    def load_generator(cls, lg_address):
+        """
+        The simulator itself, standing in for the LG instance
+        :param lg_address: host:port of the simulator
+        :return: SimulatedEc2Instance whose DNS is the simulator address
+        """
+        return cls('http://{}'.format(lg_address), {
+            'instance_id': 'i-simulated-lg',
+            'public_dns_name': lg_address,
+            'state': 'running'
+        })
+
+    def reload(self):
+        payload = requests.get(self.base_url + '/sim/instance',
+                               params={'id': self.instance_id}, timeout=10).json()
+        self.state = {'Name': payload['state']}
+
+    def wait_until_running(self, poll_interval=1):
+        while True:
+            self.reload()
+            if self.state['Name'] == 'running':
+                return
+            get_clock().sleep(poll_interval)
+
+    def terminate(self):
+        requests.get(self.base_url + '/sim/terminate',
+                     params={'id': self.instance_id}, timeout=10)
+
+    def stop(self):
+        requests.get(self.base_url + '/sim/stop',
+                     params={'id': self.instance_id}, timeout=10)
+        self.state = {'Name': 'stopped'}
+
+    def start(self):
+        requests.get(self.base_url + '/sim/start',
+                     params={'id': self.instance_id}, timeout=10)
+        self.state = {'Name': 'pending'}
+
+
+class SimulatedEc2:
+    """
+    Stand-in for the EC2 backend of horizontal-scaling.py: web services are
+    launched through the simulator and the LG is the simulator itself.
+    """
+
+    def __init__(self, lg_address, load_generator_ami):
+        """
+        :param lg_address: host:port of the simulator
+        :param load_generator_ami: AMI the script launches the LG from
+        """
+        self.lg_address = lg_address
+        self.load_generator_ami = load_generator_ami
+
+    def create_security_group(self, name, description):
+        """
+        :return: None, the simulator has no security groups
+        """
+        return None
+
+    def create_instances(self, ami, sg_id, count):
+        """
+        :return: list of running SimulatedEc2Instance
+        """
+        if ami == self.load_generator_ami:
+            return [SimulatedEc2Instance.load_generator(self.lg_address)]
+        # Launch the whole batch before waiting so that the boots overlap
+        instances = [SimulatedEc2Instance.launch(self.lg_address) for _ in range(count)]
+        for instance in instances:
+            instance.wait_until_running()
+        return instances
+
+    def stop_instances(self, instances):
+        for instance in instances:
+            instance.stop()
+
+    def start_instances(self, instances):
+        for instance in instances:
+            instance.start()
+        for instance in instances:
+            instance.wait_until_running()
+        return instances
+
+
+########################################
+# HTTP server
+########################################
+def make_handler(simulator):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = {k: v[0] for k, v in parse_qs(url.query).items()}
+            status, body, content_type = simulator.handle(url.path, params, self.headers)
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(simulator, host='127.0.0.1', port=8080):
+    """
+    Serve the simulator over HTTP until interrupted
+    :return: None
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(simulator))
+    print('LG simulator listening on {}:{}'.format(host, port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline load generator simulator')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--speedup', type=float, default=1.0,
+                        help='virtual seconds per real second')
+    parser.add_argument('--capacity', type=float, default=12.0,
+                        help='mean RPS served by one web service')
+    parser.add_argument('--jitter', type=float, default=0.15)
+    parser.add_argument('--boot-delay', type=float, default=60)
+    parser.add_argument('--start-delay', type=float, default=15,
+                        help='seconds a stopped web service takes to serve again')
+    parser.add_argument('--backends', type=int, default=1,
+                        help='web services behind the simulated ELB')
+    parser.add_argument('--pattern', type=lambda s: [float(x) for x in s.split(',')],
+                        help='comma separated per-minute demand of the ELB tests')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.speedup != 1:
+        set_clock(ScaledClock(args.speedup))
+    simulator = LoadGeneratorSimulator(
+        instance_capacity=args.capacity,
+        capacity_jitter=args.jitter,
+        boot_delay=args.boot_delay,
+        start_delay=args.start_delay,
+        pattern=args.pattern,
+        backends=args.backends,
+        seed=args.seed,
+        address='{}:{}'.format(args.host, args.port)
+    )
+    serve(simulator, args.host, args.port)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+import requests
+
+from utilities.log_parser import (
+    LogParser, TestStart, MinuteSample, CurrentRps, TestEnd, TestFinished,
+    TEST_FINISHED
+)
+
+# Number of cached bytes compared against a full (non-ranged) response to
+# decide whether the log only grew or was rewritten.
+PREFIX_CHECK_BYTES = 256
+
+
+class LogTail:
+    """
+    Follow a load generator test log by fetching only the bytes appended
+    since the previous poll.
+
+    A poll sends a Range header for the unseen suffix. If the LG ignores it
+    and returns the whole document, the new suffix is found by checking the
+    response against the cached prefix. Only complete lines are parsed, so
+    each poll costs O(new bytes) instead of O(log size).
+    """
+
+    def __init__(self, lg_client, log_name):
+        """
+        :param lg_client: LGClient of the load generator
+        :param log_name: name of the log file
+        """
+        self.lg_client = lg_client
+        self.log_name = log_name
+        self.listeners = []
+        self.byte_listeners = []
+        self.reset()
+
+    def subscribe(self, listener):
+        """
+        Call listener(event) for every event parsed from now on
+        :param listener: function taking one LogParser event
+        :return: None
+        """
+        self.listeners.append(listener)
+
+    def subscribe_bytes(self, listener):
+        """
+        Call listener(new_bytes, rewritten) after every poll that changed the
+        log; rewritten is True when the LG replaced the log instead of
+        appending to it, and new_bytes is then the whole new content
+        :param listener: function taking the new bytes and the rewritten flag
+        :return: None
+        """
+        self.byte_listeners.append(listener)
+
+    def reset(self):
+        """
+        Drop all cached content and parsed state
+        :return: None
+        """
+        self.content = bytearray()
+        self.parser = LogParser()
+        self.minute = 0
+        self.rps = 0.0
+        self.instance_rps = {}
+        self.start_time = None
+        self.test_end = None
+        self.finished = False
+        self._partial = b''
+
+    @property
+    def offset(self):
+        return len(self.content)
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+    def poll(self):
+        """
+        Fetch and parse whatever was appended to the log since the last poll
+        :return: the newly appended bytes
+        :raises requests.exceptions.HTTPError: the LG answered with an error;
+            the cached log and parsed state are left untouched
+        """
+        headers = {}
+        if self.offset:
+            headers['Range'] = 'bytes={}-'.format(self.offset)
+        response = self.lg_client.log(self.log_name, headers=headers)
+
+        rewritten = False
+        if response.status_code == 206:
+            new_bytes = response.content
+        elif response.status_code == 416:
+            # Nothing past our offset yet
+            new_bytes = b''
+        elif response.status_code != 200:
+            # An error page (e.g. 502 from a busy LG) is not a new log
+            raise requests.exceptions.HTTPError(
+                'LG answered {} for log {}'.format(response.status_code, self.log_name),
+                response=response)
+        else:
+            offset = self.offset
+            new_bytes = self._diff_full_response(response.content)
+            rewritten = offset > 0 and self.offset == 0
+
+        if new_bytes:
+            self.content += new_bytes
+            self._feed(new_bytes)
+        if new_bytes or rewritten:
+            for listener in self.byte_listeners:
+                listener(new_bytes, rewritten)
+        return new_bytes
+
+    def _diff_full_response(self, body):
+        """
+        Extract the unseen suffix from a full copy of the log
+        :param body: full log content returned by the LG
+        :return: bytes not seen before
+        """
+        offset = self.offset
+        check_from = max(0, offset - PREFIX_CHECK_BYTES)
+        if len(body) >= offset and \
+                body[check_from:offset] == self.content[check_from:]:
+            return body[offset:]
+        # The log was rewritten rather than appended to; start over
+        self.reset()
+        return body
+
+    def _feed(self, new_bytes):
+        """
+        Parse complete lines out of newly received bytes
+        :param new_bytes: bytes appended to the log
+        :return: None
+        """
+        lines = (self._partial + new_bytes).split(b'\n')
+        self._partial = lines.pop()
+        for raw in lines:
+            for event in self.parser.feed(raw.decode('utf-8', errors='replace')):
+                self._apply(event)
+        # The LG does not always terminate the final marker with a newline
+        if self._partial.strip() == TEST_FINISHED.encode():
+            self.finished = True
+
+    def _apply(self, event):
+        """
+        Update the tail state from a parsed log event
+        :param event: event emitted by the LogParser
+        :return: None
+        """
+        if isinstance(event, CurrentRps):
+            self.minute = event.minute
+            self.rps = event.rps
+        elif isinstance(event, MinuteSample):
+            self.minute = event.minute
+            self.instance_rps = event.instance_rps
+        elif isinstance(event, TestStart):
+            self.start_time = event.start_time
+        elif isinstance(event, TestEnd):
+            self.test_end = event
+        elif isinstance(event, TestFinished):
+            self.finished = True
+        for listener in self.listeners:
+            listener(event)
@@ -0,0 +1,200 @@
+"""
+Run interdependent steps concurrently, each as soon as its dependencies
+are done, and report how long every step took.
+"""
+import contextvars
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor
+
+from utilities import tracing
+from utilities.clock import get_clock
+
+DONE = 'done'
+FAILED = 'failed'
+SKIPPED = 'skipped'
+
+
+class Step:
+    """
+    One node of a TaskGraph and, once run, its outcome.
+    """
+
+    def __init__(self, name, fn, deps):
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+        self.status = None
+        self.result = None
+        self.error = None
+        self.start = None
+        self.end = None
+
+    @property
+    def duration(self):
+        if self.start is None or self.end is None:
+            return 0.0
+        return self.end - self.start
+
+
+class TaskGraph:
+    """
+    Dependency graph of blocking steps.
+
+    Steps are added with the names of the steps they depend on and run on
+    a thread pool in dependency order: independent branches overlap, so
+    the whole graph takes about as long as its critical path.
+    """
+
+    def __init__(self, max_workers=8, skip_dependents_on_error=True):
+        """
+        :param max_workers: maximum number of steps running at the same time
+        :param skip_dependents_on_error: do not run the dependents of a failed
+            step; when False, a failed step counts as finished (best effort)
+        """
+        self.max_workers = max_workers
+        self.skip_dependents_on_error = skip_dependents_on_error
+        self.steps = {}
+        self.started_at = None
+        self.finished_at = None
+
+    def add(self, name, fn, deps=()):
+        """
+        Add a step
+        :param name: unique step name
+        :param fn: zero-argument function doing the work
+        :param deps: names of the steps that must finish first
+        :return: None
+        """
+        if name in self.steps:
+            raise ValueError('Duplicate step: {}'.format(name))
+        self.steps[name] = Step(name, fn, deps)
+
+    def run(self):
+        """
+        Run every step once its dependencies are done
+        :return: dict mapping step name to Step
+        """
+        for step in self.steps.values():
+            missing = [dep for dep in step.deps if dep not in self.steps]
+            if missing:
+                raise ValueError('Step {} depends on unknown steps {}'.format(
+                    step.name, missing))
+        self._check_acyclic()
+
+        clock = get_clock()
+        self.started_at = clock.monotonic()
+        remaining = dict(self.steps)
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while remaining or running:
+                for step in list(remaining.values()):
+                    statuses = [self.steps[dep].status for dep in step.deps]
+                    if None in statuses:
+                        continue
+                    del remaining[step.name]
+                    if self.skip_dependents_on_error and \
+                            any(status != DONE for status in statuses):
+                        step.status = SKIPPED
+                        continue
+                    # Steps run in a copy of this context so their spans
+                    # nest under the caller's
+                    running[clock.submit(executor, contextvars.copy_context().run,
+                                         self._run_step, step)] = step
+                if not running:
+                    # Everything left was skipped in this pass
+                    continue
+                finished, _ = clock.wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    running.pop(future)
+        self.finished_at = clock.monotonic()
+        return self.steps
+
+    def _run_step(self, step):
+        clock = get_clock()
+        step.start = clock.monotonic()
+        try:
+            with tracing.span('step ' + step.name):
+                step.result = step.fn()
+            step.status = DONE
+        except Exception as e:
+            step.error = e
+            step.status = FAILED
+            print('  Step {} failed: {}'.format(step.name, e))
+        finally:
+            step.end = clock.monotonic()
+
+    def _check_acyclic(self):
+        visiting, visited = set(), set()
+
+        def visit(name):
+            if name in visited:
+                return
+            if name in visiting:
+                raise ValueError('Dependency cycle through step {}'.format(name))
+            visiting.add(name)
+            for dep in self.steps[name].deps:
+                visit(dep)
+            visiting.discard(name)
+            visited.add(name)
+
+        for name in self.steps:
+            visit(name)
+
+    def result(self, name):
+        """
+        :param name: step name
+        :return: the value returned by a finished step
+        """
+        return self.steps[name].result
+
+    @property
+    def errors(self):
+        return {name: step.error for name, step in self.steps.items()
+                if step.status == FAILED}
+
+    def critical_path(self):
+        """
+        Longest chain of dependent steps, by measured duration
+        :return: (list of step names, total seconds)
+        """
+        longest = {}
+
+        def chain(name):
+            if name not in longest:
+                step = self.steps[name]
+                best = max((chain(dep) for dep in step.deps),
+                           key=lambda c: c[1], default=([], 0.0))
+                longest[name] = (best[0] + [name], best[1] + step.duration)
+            return longest[name]
+
+        return max((chain(name) for name in self.steps),
+                   key=lambda c: c[1], default=([], 0.0))
+
+    def print_timings(self):
+        """
+        Print when each step started, how long it took, how much earlier it
+        finished than it would have in a serial run, and the critical path
+        :return: None
+        """
+        print('{:<28} {:>8} {:>9} {:>8} {:>8}'.format(
+            'step', 'start s', 'elapsed s', 'saved s', 'status'))
+        serial_end = 0.0
+        serial_ends = {}
+        # Serial baseline: the steps one after another in the order added
+        for step in self.steps.values():
+            serial_end += step.duration
+            serial_ends[step.name] = serial_end
+        ordered = sorted(self.steps.values(),
+                         key=lambda s: (s.start is None, s.start or 0.0))
+        for step in ordered:
+            if step.start is None:
+                start = saved = '-'
+            else:
+                start = '{:.1f}'.format(step.start - self.started_at)
+                saved = '{:.1f}'.format(serial_ends[step.name] - (step.end - self.started_at))
+            print('{:<28} {:>8} {:>9.1f} {:>8} {:>8}'.format(
+                step.name, start, step.duration, saved, step.status))
+        path, length = self.critical_path()
+        total = self.finished_at - self.started_at
+        print('Critical path: {} ({:.1f} s)'.format(' -> '.join(path), length))
+        print('Total: {:.1f} s, {:.1f} s serially, {:.1f} s saved'.format(
+            total, serial_end, serial_end - total))
@@ -0,0 +1,261 @@
+"""
+Lightweight tracing of where a run spends its time.
+
+Code under study is wrapped in spans:
+
+    with tracing.span('initialize_test', dns=dns):
+        ...
+
+    @tracing.traced('create_instance')
+    def create_instance(ami, sg_id):
+        ...
+
+Spans nest through contextvars, so a span opened inside another one, in
+the same thread or in an asyncio task, records it as its parent. AWS API
+calls made through utilities.aws and HTTP calls made through LGClient are
+recorded automatically, and phase() splits a script into consecutive
+stages. At exit the trace is written as one JSON object
+per line and summarised per span name.
+"""
+import contextvars
+import functools
+import itertools
+import json
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+from utilities.clock import get_clock
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+
+class Span:
+    """
+    One timed operation.
+    """
+
+    __slots__ = ('name', 'span_id', 'parent_id', 'start', 'duration',
+                 'thread', 'attributes', 'error')
+
+    def __init__(self, name, span_id, parent_id, start, attributes):
+        self.name = name
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.start = start
+        self.duration = None
+        self.thread = threading.current_thread().name
+        self.attributes = attributes
+        self.error = None
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'id': self.span_id,
+            'parent': self.parent_id,
+            'start': self.start,
+            'duration': self.duration,
+            'thread': self.thread,
+            'attributes': self.attributes,
+            'error': self.error
+        }
+
+
+class Tracer:
+    """
+    Collects finished spans in memory.
+    """
+
+    def __init__(self):
+        self.spans = []
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.current_phase = None
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """
+        Time the enclosed block
+        :param name: span name; spans with the same name are summarised together
+        :param attributes: extra JSON-serialisable fields stored with the span
+        :return: context manager yielding the Span
+        """
+        clock = get_clock()
+        parent = _current_span.get()
+        span = Span(name, next(self.ids), parent.span_id if parent else None,
+                    clock.time(), attributes)
+        token = _current_span.set(span)
+        started = clock.monotonic()
+        try:
+            yield span
+        except BaseException as e:
+            span.error = type(e).__name__
+            raise
+        finally:
+            span.duration = clock.monotonic() - started
+            _current_span.reset(token)
+            with self.lock:
+                self.spans.append(span)
+
+    def record(self, name, start, duration, error=None, **attributes):
+        """
+        Add a span that was timed by the caller
+        :param name: span name
+        :param start: clock time the operation started at
+        :param duration: seconds it took
+        :param error: error name if it failed
+        :return: None
+        """
+        parent = _current_span.get()
+        span = Span(name, next(self.ids), parent.span_id if parent else None,
+                    start, attributes)
+        span.duration = duration
+        span.error = error
+        with self.lock:
+            self.spans.append(span)
+
+    def phase(self, name):
+        """
+        End the current phase, if any, and start a new one. Phases are
+        consecutive top-level spans marking the stages of a script.
+        :param name: phase name
+        :return: None
+        """
+        self.end_phase()
+        clock = get_clock()
+        self.current_phase = (name, clock.time(), clock.monotonic())
+
+    def end_phase(self):
+        """
+        Record the current phase, if any
+        :return: None
+        """
+        if self.current_phase is None:
+            return
+        name, start, started = self.current_phase
+        self.current_phase = None
+        self.record('phase ' + name, start, get_clock().monotonic() - started)
+
+    def export_jsonl(self, path):
+        """
+        Write every finished span as one JSON object per line
+        :param path: output file
+        :return: None
+        """
+        with self.lock:
+            spans = sorted(self.spans, key=lambda s: s.start)
+        with open(path, 'w') as f:
+            for span in spans:
+                f.write(json.dumps(span.to_dict(), default=str))
+                f.write('\n')
+
+    def summary(self):
+        """
+        Aggregate spans by name
+        :return: list of (name, count, errors, total, mean, max) sorted by total time
+        """
+        grouped = defaultdict(list)
+        with self.lock:
+            for span in self.spans:
+                grouped[span.name].append(span)
+        rows = []
+        for name, spans in grouped.items():
+            durations = [s.duration for s in spans]
+            total = sum(durations)
+            rows.append((name, len(spans), sum(1 for s in spans if s.error),
+                         total, total / len(spans), max(durations)))
+        return sorted(rows, key=lambda row: row[3], reverse=True)
+
+    def print_summary(self):
+        """
+        Print the per-span-name timing table
+        :return: None
+        """
+        print('{:<50} {:>7} {:>7} {:>10} {:>10} {:>10}'.format(
+            'span', 'calls', 'errors', 'total s', 'mean s', 'max s'))
+        for name, count, errors, total, mean, longest in self.summary():
+            print('{:<50} {:>7} {:>7} {:>10.2f} {:>10.3f} {:>10.3f}'.format(
+                name[:50], count, errors, total, mean, longest))
+
+
+tracer = Tracer()
+
+
+def span(name, **attributes):
+    """
+    Open a span on the process-wide tracer
+    """
+    return tracer.span(name, **attributes)
+
+
+def phase(name):
+    """
+    Start a new phase on the process-wide tracer
+    """
+    tracer.phase(name)
+
+
+def traced(name=None):
+    """
+    Decorator wrapping every call of a function in a span
+    :param name: span name, the function name by default
+    """
+    def decorator(fn):
+        span_name = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with tracer.span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def finish(path=None):
+    """
+    Export the trace and print its summary, typically at the end of main()
+    :param path: JSONL file to write, None to only print the summary
+    :return: None
+    """
+    tracer.end_phase()
+    if path:
+        tracer.export_jsonl(path)
+        print('Trace written to {}'.format(path))
+    tracer.print_summary()
+
+
+########################################
+# botocore hooks
+########################################
+def instrument_client(client):
+    """
+    Record every API call of a botocore client as an 'aws <service>.<operation>' span
+    :param client: botocore client
+    :return: the same client
+    """
+    service = client.meta.service_model.service_name
+
+    def before_call(context, **kwargs):
+        context['trace_start'] = (get_clock().time(), get_clock().monotonic())
+
+    def after_call(context, model, http_response=None, parsed=None, **kwargs):
+        started = context.pop('trace_start', None)
+        if started is None:
+            return
+        error = None
+        if parsed and 'Error' in parsed:
+            error = parsed['Error'].get('Code')
+        tracer.record('aws {}.{}'.format(service, model.name), started[0],
+                      get_clock().monotonic() - started[1], error=error)
+
+    def after_call_error(context, model, exception=None, **kwargs):
+        started = context.pop('trace_start', None)
+        if started is not None:
+            tracer.record('aws {}.{}'.format(service, model.name), started[0],
+                          get_clock().monotonic() - started[1],
+                          error=type(exception).__name__)
+
+    client.meta.events.register('before-call.*.*', before_call)
+    client.meta.events.register('after-call.*.*', after_call)
+    client.meta.events.register('after-call-error.*.*', after_call_error)
+    return client
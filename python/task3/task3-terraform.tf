@@ -103,8 +103,8 @@ resource "aws_autoscaling_group" "asg" {
   max_size                  = 7
   min_size                  = 1
   desired_capacity          = 1
-  default_cooldown          = 60
-  health_check_grace_period = 60
+  default_cooldown          = 30
+  health_check_grace_period = 30
   health_check_type         = "EC2"
   launch_template {
     id = aws_launch_template.lt.id
@@ -168,7 +168,7 @@ resource "aws_lb_target_group" "tg" {
   health_check {
     enabled             = true
     healthy_threshold   = 2
-    unhealthy_threshold = 2
+    unhealthy_threshold = 3
     timeout             = 5
     interval            = 30
     path                = "/"
@@ -214,7 +214,7 @@ resource "aws_autoscaling_policy" "scale_out" {
   name                   = "scale-out-policy"
   scaling_adjustment     = 1
   adjustment_type        = "ChangeInCapacity"
-  cooldown              = 45
+  cooldown              = 30
   autoscaling_group_name = aws_autoscaling_group.asg.name
   policy_type           = "SimpleScaling"
 }
@@ -242,7 +242,7 @@ resource "aws_cloudwatch_metric_alarm" "cpu_high" {
   evaluation_periods  = "1"
   metric_name         = "CPUUtilization"
   namespace           = "AWS/EC2"
-  period              = "60"
+  period              = "30"
   statistic           = "Average"
   threshold           = "60"
   alarm_description   = "This metric monitors ec2 cpu utilization for scale out"
@@ -260,7 +260,7 @@ resource "aws_cloudwatch_metric_alarm" "cpu_low" {
   evaluation_periods  = "1"
   metric_name         = "CPUUtilization"
   namespace           = "AWS/EC2"
-  period              = "60"
+  period              = "30"
   statistic           = "Average"
   threshold           = "50"
   alarm_description   = "This metric monitors ec2 cpu utilization for scale in"